@@ -1,47 +1,76 @@
 import asyncio
+import contextvars
 import os
 import uuid
 import time
 import json
 import traceback
 from pathlib import Path
-from typing import Any, Dict
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
-from fastapi.responses import StreamingResponse, JSONResponse
+from typing import Any, Dict, List, Optional
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import base64
-import cv2
-import torch
-import shutil
-from model import VideoResNetLSTM
-from utils.frame_utils import extract_frames
-from utils.face_utils import detect_and_crop_faces
-from utils.inference import predict_from_faces, predict_image
+from collections import OrderedDict
+from utils.session_store import JobExists, create_session_store
+from utils.meta_store import MetaStore
+from utils.cleanup import Janitor, cleanup_session, DROP_INTERMEDIATE_FRAMES
+from utils import metrics, profiling
+from utils.watchdog import LoopWatchdog, HEALTH_FAIL_ON_LAG
+from utils.dispatcher import Dispatcher, QueueFull
+from utils.batcher import InferenceBatcher
+from utils.probe import probe_video, ThroughputModel, THROUGHPUT_FILENAME
+from utils.progress import ScanProgress
+from utils.runtime import ModelRuntime, STARTUP_MODE
 
 app = FastAPI()
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model = VideoResNetLSTM(pretrained=False).to(device)
-model.load_state_dict(torch.load("models/production1000_temporal_model.pth", map_location=device))
-model.eval()
+# torch, cv2, dlib and the model are loaded by the runtime (in the background unless STARTUP_MODE=eager);
+# the pipeline modules are imported inside the functions that need them
+runtime = ModelRuntime(on_ready=lambda rt: batcher.bind(rt.model, rt.device))
 
-progress_messages: Dict[str, Dict[str, Any]] = {}
 # Serve frontend at /ui
 FRONTEND_DIR = Path(__file__).resolve().parents[1] / "frontend"
 if FRONTEND_DIR.exists():
     app.mount("/ui", StaticFiles(directory=str(FRONTEND_DIR), html=True), name="ui")
 
+def _describe_task(task) -> Dict[str, Any]:
+    """Map the task blocking the loop back to its scan session and stage."""
+    for sid, t in list(dispatcher.tasks.items()):
+        if t is task:
+            s = store.get(sid)
+            return {"session_id": sid, "stage": s.stage if s else None}
+    return {}
+
+watchdog = LoopWatchdog(describe=_describe_task)
+
 @app.get("/health")
 async def health():
-    return {"ok": True}
+    """Liveness: answers as soon as the server runs, whether or not the model has loaded."""
+    h = watchdog.health()
+    h["ready"] = runtime.ready
+    if h["status"] == "degraded" and HEALTH_FAIL_ON_LAG:
+        return JSONResponse({"ok": False, **h}, status_code=503)
+    return {"ok": True, **h}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once the model is loaded and warmed, 503 while starting or after a failed load."""
+    st = runtime.status()
+    return JSONResponse(st, status_code=200 if st["ready"] else 503)
 
 # --- Reliability/UX additions ---
 SESSIONS_ROOT = Path(__file__).resolve().parent / "temp"
 META_FILENAME = "session.json"
 HEARTBEAT_SECONDS = 10
 
+# Live progress, cancel flags and the scan queue; shared between workers when SESSION_STORE=sqlite
+store = create_session_store(SESSIONS_ROOT)
+# Durable session metadata (status, stages, result), always SQLite so any worker can list/query it
+meta_store = MetaStore(os.environ.get("META_DB") or str(SESSIONS_ROOT / "sessions.db"))
+
 # Basic per-step soft timeouts (seconds). Faces will be dynamically scaled below.
 STEP_TIMEOUTS = {
     "frames": int(os.environ.get("FRAMES_TIMEOUT", "120")),
@@ -54,41 +83,61 @@ FACES_PER_FRAME_SEC = float(os.environ.get("FACES_PER_FRAME_SEC", "0.9"))
 FACES_RES_SCALE_BASE = float(os.environ.get("FACES_RES_SCALE_BASE", "1.0"))
 FACES_MAX_TIMEOUT = int(os.environ.get("FACES_MAX_TIMEOUT", "3600"))
 FACES_NO_PROGRESS_TIMEOUT = int(os.environ.get("FACES_NO_PROGRESS_TIMEOUT", "180"))
+# Stage timeouts allow this multiple of the upfront estimate (never less than STEP_TIMEOUTS)
+ESTIMATE_TIMEOUT_FACTOR = float(os.environ.get("ESTIMATE_TIMEOUT_FACTOR", "3.0"))
+
+# Per-stage seconds per unit measured on this host; feeds the upload-time estimates
+throughput = ThroughputModel(SESSIONS_ROOT / THROUGHPUT_FILENAME)
 
-def _estimate_faces_timeout(session: Dict[str, Any]) -> int:
+def _estimated_timeout(meta: Dict[str, Any], stage: str) -> int:
+    """Timeout for a stage from the upload-time estimate, or the static one without a probe."""
+    est = (meta.get("estimate") or {}).get(f"{stage}_s")
+    if not est:
+        return STEP_TIMEOUTS[stage]
+    return max(STEP_TIMEOUTS[stage], min(int(est * ESTIMATE_TIMEOUT_FACTOR) + 30, FACES_MAX_TIMEOUT))
+
+def _estimate_faces_timeout(session: ScanProgress, meta: Optional[Dict[str, Any]] = None) -> int:
     """Estimate a reasonable faces stage timeout based on number of frames and resolution.
     Returns seconds (int), clamped by base and max.
     """
+    meta = meta or {}
     try:
-        frames_dir = session["dirs"]["frames"]
-        total_frames = int(session.get("frames_count") or len([p for p in os.listdir(frames_dir) if p.lower().endswith((".jpg",".jpeg",".png"))]))
+        frames_dir = session.dirs["frames"]
+        total_frames = int(session.frames_count or len([p for p in os.listdir(frames_dir) if p.lower().endswith((".jpg",".jpeg",".png"))]))
     except Exception:
-        total_frames = int(session.get("frames_count", 0))
+        total_frames = int(session.frames_count)
 
     # Resolution factor from first frame if available
     res_factor = FACES_RES_SCALE_BASE
+    probe = meta.get("probe") or {}
     try:
         first_frame_path = None
-        if session.get("frames"):
-            first_frame_path = session["frames"][0]
+        if session.frames:
+            first_frame_path = session.frames[0]
         else:
             # fallback to any file in frames dir
-            fns = sorted(Path(session["dirs"]["frames"]).glob("*"))
+            fns = sorted(Path(session.dirs["frames"]).glob("*"))
             if fns:
                 first_frame_path = str(fns[0])
-        if first_frame_path and os.path.exists(first_frame_path):
+        if probe.get("width") and probe.get("height"):
+            # The upload probe already knows the resolution; no need to decode a frame for it
+            w, h = probe["width"], probe["height"]
+        elif first_frame_path and os.path.exists(first_frame_path):
+            import cv2
             img = cv2.imread(first_frame_path)
-            if img is not None:
-                h, w = img.shape[:2]
-                # Scale factor ~ proportional to megapixels (anchor ~720p ~ 0.9MP => ~1.0)
-                mp = max(0.1, (w * h) / 1_000_000.0)
-                res_factor = max(1.0, min(2.5, FACES_RES_SCALE_BASE * (mp / 0.9)))
+            h, w = img.shape[:2] if img is not None else (0, 0)
+        else:
+            w = h = 0
+        if w and h:
+            # Scale factor ~ proportional to megapixels (anchor ~720p ~ 0.9MP => ~1.0)
+            mp = max(0.1, (w * h) / 1_000_000.0)
+            res_factor = max(1.0, min(2.5, FACES_RES_SCALE_BASE * (mp / 0.9)))
     except Exception:
         pass
 
     # Compute timeout: base + per-frame cost scaled by resolution, add small buffer
     est = int(STEP_TIMEOUTS["faces"] + (total_frames * FACES_PER_FRAME_SEC * res_factor) + 30)
-    return max(STEP_TIMEOUTS["faces"], min(est, FACES_MAX_TIMEOUT))
+    return max(_estimated_timeout(meta, "faces"), min(est, FACES_MAX_TIMEOUT))
 
 def _session_dir(sid: str) -> Path:
     return SESSIONS_ROOT / sid
@@ -97,6 +146,10 @@ def _meta_path(sid: str) -> Path:
     return _session_dir(sid) / META_FILENAME
 
 def _load_meta(sid: str) -> Dict[str, Any]:
+    m = meta_store.load(sid)
+    if m:
+        return m
+    # Sessions created before the metadata store still carry a session.json
     p = _meta_path(sid)
     if not p.exists():
         return {}
@@ -105,86 +158,110 @@ def _load_meta(sid: str) -> Dict[str, Any]:
     except Exception:
         return {}
 
-def _save_meta(sid: str, data: Dict[str, Any]) -> None:
-    d = _session_dir(sid)
-    d.mkdir(parents=True, exist_ok=True)
-    p = _meta_path(sid)
-    tmp = p.with_suffix(".json.tmp")
-    tmp.write_text(json.dumps(data, indent=2))
-    tmp.replace(p)
+def _touch(sid: str) -> None:
+    """Mark a session as read so quota eviction (least recently used first) keeps it longer."""
+    try:
+        meta_store.touch(sid)
+    except Exception:
+        pass
 
 def _update_meta(sid: str, **updates) -> Dict[str, Any]:
-    m = _load_meta(sid)
-    m.update(updates)
-    # Always store the session_id field for convenience
-    m.setdefault("session_id", sid)
-    _save_meta(sid, m)
-    return m
-
-def _set_stage(sid: str, stage: str, status: str) -> None:
-    now = time.time()
-    m = _load_meta(sid)
-    stages = m.get("stages", {})
-    s = stages.get(stage, {})
-    if status == "running":
-        s["started_at"] = now
-    if status in ("done", "error", "canceled"):
-        s["ended_at"] = now
-    s["status"] = status
-    stages[stage] = s
-    m["stages"] = stages
-    m["stage"] = stage
-    if status in ("error", "canceled"):
-        m["status"] = status
-        m["ended_at"] = now
-    _save_meta(sid, m)
-
-def _ensure_app_state():
-    if not hasattr(app.state, "canceled"):
-        app.state.canceled = set()
-    if not hasattr(app.state, "tasks"):
-        app.state.tasks = {}
+    return meta_store.update(sid, **updates)
+
+def _set_stage(sid: str, stage: Optional[str], status: str) -> None:
+    """Record a stage transition; stage=None applies it to the session's current stage."""
+    meta_store.set_stage(sid, stage, status)
+
+def _forget_session(sid: str) -> None:
+    store.delete(sid)
+    meta_store.delete(sid)
+
+def _fail_lost_scans() -> int:
+    """Fail the scans whose worker stopped sending heartbeats; run by the janitor."""
+    lost = dispatcher.reap_stale()
+    for sid in lost:
+        detail = "Worker stopped during the scan"
+        session = store.get(sid)
+        if session is not None:
+            session.finish(f"Error: {detail}")
+            _publish(sid, session)
+        _set_stage(sid, None, "error")
+        _update_meta(sid, status="error", error=detail, ended_at=time.time())
+        metrics.SCANS_FINISHED.inc(status="error")
+    return len(lost)
+
+janitor = Janitor(SESSIONS_ROOT, _load_meta, _forget_session, reap=_fail_lost_scans)
+
+def _drop_consumed(session: ScanProgress, kind: str) -> None:
+    """Free a stage's intermediate files once the next stage has read them, keeping SSE previews."""
+    if not DROP_INTERMEDIATE_FRAMES:
+        return
+    try:
+        janitor.drop_intermediate(session.dirs[kind], keep=list(getattr(session, kind)))
+    except Exception:
+        pass
 
-@app.post("/upload")
-async def upload_video(file: UploadFile = File(...)):
-    session_id = str(uuid.uuid4())
-    session_dir = os.path.join("temp", session_id)
-    os.makedirs(session_dir, exist_ok=True)
-    video_path = os.path.join(session_dir, file.filename)
-    with open(video_path, "wb") as f:
-        f.write(await file.read())
+def _publish(sid: str, session: ScanProgress) -> None:
+    """Make the latest in-process session state visible to other workers."""
+    try:
+        store.put(sid, session)
+    except Exception:
+        pass
 
-    progress_messages[session_id] = {
-        "status": "Upload complete",
-        "stage": "uploaded",
-        "frames": [],
-        "faces": [],
-        "crops": [],
-        "frames_count": 0,
-        "faces_count": 0,
-        "crops_count": 0,
-        "prediction": None,
-        "done": False,
-        "video_path": video_path,
-        "dirs": {
+def _probe_session(video_path: str) -> Dict[str, Any]:
+    """Probe an uploaded video and estimate its scan cost; metadata fields for _create_session."""
+    try:
+        probe = probe_video(video_path)
+    except Exception as e:
+        return {"probe_error": str(e)}
+    return {"probe": probe, "estimate": throughput.estimate(probe)}
+
+async def _probe_session_async(video_path: str) -> Dict[str, Any]:
+    # ffprobe/cv2 open the container; keep that off the event loop
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _probe_session, video_path)
+
+def _create_session(session_id: str, session_dir: str, video_path: str, **meta) -> None:
+    """Register an uploaded (or server-local) video as a new session ready to scan."""
+    store.put(session_id, ScanProgress(
+        video_path=video_path,
+        dirs={
             "frames": os.path.join(session_dir, "frames"),
             "vis": os.path.join(session_dir, "vis"),
             "crops": os.path.join(session_dir, "crops")
-        }
-    }
+        },
+        status="Upload complete",
+        stage="uploaded",
+        estimate_seconds=(meta.get("estimate") or {}).get("total_s"),
+    ))
     # persist minimal metadata
     _update_meta(
         session_id,
         status="uploaded",
         stage="uploaded",
         started_at=time.time(),
-        stages={}
+        stages={},
+        **meta
     )
-    return {"session_id": session_id}
+
+@app.post("/upload")
+async def upload_video(file: UploadFile = File(...)):
+    session_id = str(uuid.uuid4())
+    session_dir = os.path.join("temp", session_id)
+    os.makedirs(session_dir, exist_ok=True)
+    video_path = os.path.join(session_dir, file.filename)
+    with open(video_path, "wb") as f:
+        f.write(await file.read())
+    # Unreadable videos are accepted like in /batch; probe_error is recorded and _run_scan fails them
+    info = await _probe_session_async(video_path)
+    _create_session(session_id, session_dir, video_path, **info)
+    return {"session_id": session_id, "probe": info.get("probe"), "estimate": info.get("estimate"),
+            "probe_error": info.get("probe_error")}
 
 @app.post("/scan/{session_id}")
 async def scan_video(session_id: str, request: Request):
-    _ensure_app_state()
+    if store.get(session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found")
     # Allow optional per-request overrides for debugging/tuning
     try:
         q = dict(request.query_params)
@@ -196,155 +273,468 @@ async def scan_video(session_id: str, request: Request):
                 meta_updates["frames_timeout_override"] = int(q.get("frames_timeout") or 0)
             if "inference_timeout" in q:
                 meta_updates["inference_timeout_override"] = int(q.get("inference_timeout") or 0)
+            if "dedup_threshold" in q:
+                # 0 keeps every sampled frame
+                meta_updates["dedup_threshold_override"] = int(q.get("dedup_threshold") or 0)
+            if "frame_budget" in q:
+                # 0 keeps every sampled frame regardless of length
+                meta_updates["frame_budget_override"] = int(q.get("frame_budget") or 0)
+            if "export" in q:
+                # export=1 also streams every annotated frame into annotated.mp4
+                meta_updates["export_video"] = str(q.get("export") or "").lower() not in ("", "0", "false", "no")
+            if "profile" in q:
+                # profile=1 records a Chrome trace; profile=torch also captures a torch.profiler summary
+                flag = str(q.get("profile") or "").lower()
+                meta_updates["profile"] = flag not in ("", "0", "false", "no")
+                meta_updates["profile_torch"] = flag == "torch"
             if meta_updates:
                 _update_meta(session_id, **meta_updates)
     except Exception:
         pass
 
-    task = asyncio.create_task(process_video(session_id))
-    app.state.tasks[session_id] = task
-    return {"message": "Scan started"}
+    try:
+        priority = int(request.query_params.get("priority") or 0)
+    except ValueError:
+        priority = 0
+    prev_status = _load_meta(session_id).get("status")
+    try:
+        dispatcher.submit(session_id, priority)
+    except JobExists:
+        # Re-POSTing a queued or running scan must not start a duplicate
+        return JSONResponse({"detail": "Scan already queued or running", **dispatcher.queue_info(session_id)},
+                            status_code=409)
+    except QueueFull as qf:
+        return JSONResponse(
+            {"detail": str(qf), "retry_after": qf.retry_after},
+            status_code=429,
+            headers={"Retry-After": str(max(1, qf.retry_after))},
+        )
+    # A worker may claim the job right away; never overwrite the state it already recorded
+    meta_store.update_if(session_id, (prev_status,), status="queued", stage="queued", queued_at=time.time())
+    info = dispatcher.queue_info(session_id)
+    session = store.get(session_id)
+    if session is not None and info["queue_position"] is not None:
+        session.set_status(f"Queued (position {info['queue_position']})", "queued")
+        store.put(session_id, session)
+    return {"message": "Scan started", **info}
+
+# Batch jobs: server-local videos are only accepted from under BATCH_LOCAL_ROOT (unset disables them)
+BATCH_LOCAL_ROOT = os.environ.get("BATCH_LOCAL_ROOT")
+MAX_BATCH_ITEMS = int(os.environ.get("MAX_BATCH_ITEMS", "100"))
+# Batch items queue behind interactive scans (priority 0); values >= 0 are clamped to -1
+BATCH_PRIORITY = int(os.environ.get("BATCH_PRIORITY", "-1"))
+
+def _resolve_local_video(path: str) -> str:
+    if not BATCH_LOCAL_ROOT:
+        raise HTTPException(status_code=400, detail="Server-local paths are disabled (set BATCH_LOCAL_ROOT)")
+    root = os.path.realpath(BATCH_LOCAL_ROOT)
+    real = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, real]) != root:
+        raise HTTPException(status_code=400, detail=f"Path outside BATCH_LOCAL_ROOT: {path}")
+    if not os.path.isfile(real):
+        raise HTTPException(status_code=404, detail=f"Video not found: {path}")
+    return real
+
+@app.post("/batch")
+async def create_batch(files: List[UploadFile] = File(None), paths: List[str] = Form(None), priority: int = BATCH_PRIORITY):
+    """Scan many videos as one job: uploaded files and/or paths under BATCH_LOCAL_ROOT."""
+    files = files or []
+    paths = [p for p in (paths or []) if p]
+    if not files and not paths:
+        raise HTTPException(status_code=400, detail="No videos given")
+    if len(files) + len(paths) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ITEMS} videos per batch")
+    local = [(p, _resolve_local_video(p)) for p in paths]  # validate everything before writing anything
+    # Batch items always queue in the background class, so they can never fill the interactive queue
+    priority = min(priority, -1)
+
+    batch_id = str(uuid.uuid4())
+    items = []
+    for f in files:
+        session_id = str(uuid.uuid4())
+        session_dir = os.path.join("temp", session_id)
+        os.makedirs(session_dir, exist_ok=True)
+        video_path = os.path.join(session_dir, os.path.basename(f.filename or "video"))
+        with open(video_path, "wb") as out:
+            out.write(await f.read())
+        items.append({"session_id": session_id, "name": f.filename, "source": "upload", "video_path": video_path})
+    for name, real in local:
+        session_id = str(uuid.uuid4())
+        session_dir = os.path.join("temp", session_id)
+        os.makedirs(session_dir, exist_ok=True)
+        # Scanned in place; only frames and crops are written under temp/
+        items.append({"session_id": session_id, "name": name, "source": "local", "video_path": real})
+
+    for it in items:
+        video_path = it.pop("video_path")
+        # Unreadable items stay in the batch and fail when scanned, as in /upload
+        info = await _probe_session_async(video_path)
+        it["estimate_seconds"] = (info.get("estimate") or {}).get("total_s")
+        _create_session(it["session_id"], os.path.join("temp", it["session_id"]), video_path, batch_id=batch_id, **info)
+    sids = [it["session_id"] for it in items]
+    try:
+        dispatcher.submit_many(sids, priority)
+    except QueueFull as qf:
+        for sid in sids:
+            _forget_session(sid)
+            cleanup_session(str(_session_dir(sid)))
+        return JSONResponse(
+            {"detail": str(qf), "retry_after": qf.retry_after},
+            status_code=429,
+            headers={"Retry-After": str(max(1, qf.retry_after))},
+        )
+    now = time.time()
+    for sid in sids:
+        meta_store.update_if(sid, ("uploaded",), status="queued", stage="queued", queued_at=now)
+    meta_store.save_batch(batch_id, {"batch_id": batch_id, "created_at": now, "priority": priority, "items": items})
+    return {"batch_id": batch_id, "items": items}
+
+def _batch_item(item: Dict[str, Any], m: Dict[str, Any]) -> Dict[str, Any]:
+    sid = item["session_id"]
+    s = store.get(sid)
+    out = {
+        **item,
+        "status": m.get("status", "unknown"),
+        "stage": m.get("stage"),
+        "frames_count": s.frames_count if s else 0,
+        "crops_count": s.crops_count if s else 0,
+        "result": m.get("result"),
+        "error": m.get("error"),
+    }
+    if out["status"] == "queued":
+        out.update(dispatcher.queue_info(sid))
+    return out
+
+@app.get("/batch/{batch_id}")
+async def get_batch(batch_id: str):
+    """Per-video progress of a batch plus an aggregate summary."""
+    batch = meta_store.load_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    metas = meta_store.load_many([it["session_id"] for it in batch["items"]])
+    items = [_batch_item(it, metas.get(it["session_id"], {})) for it in batch["items"]]
+
+    by_status: Dict[str, int] = {}
+    for it in items:
+        by_status[it["status"]] = by_status.get(it["status"], 0) + 1
+    # Only scans that analyzed frames have a verdict; older sessions may be "done" with none
+    results = [it["result"] for it in items
+               if it["status"] == "done" and it["result"] and metas.get(it["session_id"], {}).get("frames_kept") != 0]
+    errors = by_status.get("error", 0) + sum(1 for it in items if it["status"] == "done") - len(results)
+    finished = sum(by_status.get(k, 0) for k in ("done", "error", "canceled"))
+    ended = [metas[it["session_id"]].get("ended_at") for it in items if metas.get(it["session_id"], {}).get("ended_at")]
+    end = max(ended) if finished == len(items) and ended else time.time()
+    summary = {
+        "total": len(items),
+        "by_status": by_status,
+        "fake": sum(1 for r in results if r.get("prediction") == "FAKE"),
+        "real": sum(1 for r in results if r.get("prediction") == "REAL"),
+        "errors": errors,
+        "mean_confidence": round(sum(float(r.get("confidence") or 0.0) for r in results) / len(results), 4) if results else None,
+        "done": finished == len(items),
+        "elapsed_seconds": round(end - batch["created_at"], 2),
+    }
+    return {"batch_id": batch_id, "created_at": batch["created_at"], "summary": summary, "items": items}
+
+@app.post("/batch/{batch_id}/cancel")
+async def cancel_batch(batch_id: str):
+    batch = meta_store.load_batch(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    canceled = 0
+    metas = meta_store.load_many([it["session_id"] for it in batch["items"]])
+    for it in batch["items"]:
+        if metas.get(it["session_id"], {}).get("status") in ("done", "error", "canceled"):
+            continue
+        if (await cancel_scan(it["session_id"]))["canceled"]:
+            canceled += 1
+    return {"ok": True, "batch_id": batch_id, "canceled": canceled}
+
+def _stage_finished(stage: str, start_t: float, units: float = 0.0) -> None:
+    """Record a stage duration in metrics, the throughput model (per `units`) and, when profiling, as a trace span."""
+    now = time.time()
+    throughput.observe(stage, now - start_t, units)
+    metrics.STAGE_SECONDS.observe(now - start_t, stage=stage)
+    tracer = profiling.current()
+    if tracer is not None:
+        tracer.add(stage, "stage", start_t, now - start_t)
+
+# How often a blocking step running in the executor checks the cancel flag
+CANCEL_POLL_SECONDS = float(os.environ.get("CANCEL_POLL_SECONDS", "0.5"))
+
+async def _run_blocking(session_id: str, deadline: float, timeout_detail: str, fn, *args):
+    """
+    Run a blocking call in the default executor without stalling the event loop.
+    Returns (canceled, result); raises a 504 once `deadline` (a time.time()) passes.
+    A call given up on keeps running in its thread, but its result is ignored.
+    """
+    loop = asyncio.get_running_loop()
+    fut = loop.run_in_executor(None, contextvars.copy_context().run, fn, *args)
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+            raise HTTPException(status_code=504, detail=timeout_detail)
+        done, _ = await asyncio.wait({fut}, timeout=min(CANCEL_POLL_SECONDS, remaining))
+        if done:
+            return False, fut.result()
+        if store.is_canceled(session_id):
+            fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+            return True, None
 
 async def process_video(session_id):
+    """Run a scan, recording a trace next to the session files when profiling was requested."""
+    meta = _load_meta(session_id)
+    if not meta.get("profile"):
+        return await _run_scan(session_id, meta)
+    tracer = profiling.Tracer(session_id)
+    token = profiling.activate(tracer)
+    try:
+        with profiling.span("scan", cat="scan"):
+            await _run_scan(session_id, meta)
+    finally:
+        profiling.deactivate(token)
+        try:
+            path = tracer.write(_session_dir(session_id) / profiling.TRACE_FILENAME)
+            _update_meta(session_id, trace_path=path)
+        except Exception:
+            pass
+
+async def _run_scan(session_id: str, meta: Dict[str, Any]):
     """Main orchestration with cooperative cancel checks, soft timeouts, and metadata updates."""
-    session = progress_messages.get(session_id)
+    session = store.get(session_id)
     if not session:
         return
 
     try:
+        if meta.get("probe_error"):
+            # Fails like any other stage error; decoding it would just find no frames and report REAL
+            raise HTTPException(status_code=422, detail=f"Unreadable video: {meta['probe_error']}")
+        if not runtime.ready:
+            session.set_status("Waiting for the model to load...")
+            _publish(session_id, session)
+            await runtime.wait_ready()
+        # Loaded by the runtime already, so these are plain lookups
+        from utils.frame_utils import extract_frames, plan_frames, DEDUP_THRESHOLD, FRAME_BUDGET
+        from utils.face_utils import detect_and_crop_faces
+        from utils.inference import predict_from_faces
+        from utils.overlay import OverlayRenderer, AnnotatedVideoWriter, ANNOTATED_FILENAME
+
         # Stage: frames
         _update_meta(session_id, status="running", stage="frames")
         _set_stage(session_id, "frames", "running")
-        session["status"] = "Extracting frames..."
-        session["stage"] = "frames"
+        session.set_status("Extracting frames...", "frames")
+        _publish(session_id, session)
         start_t = time.time()
-        frames_timeout = _load_meta(session_id).get("frames_timeout_override") or STEP_TIMEOUTS["frames"]
-        for frame_path in extract_frames(session["video_path"], session["dirs"]["frames"]):
-            _ensure_app_state()
-            if session_id in app.state.canceled:
-                session["status"] = "Canceled"
-                _set_stage(session_id, "frames", "canceled")
-                _update_meta(session_id, status="canceled", ended_at=time.time())
-                session["done"] = True
-                return
-            session["frames_count"] = session.get("frames_count", 0) + 1
-            session.setdefault("frames", []).append(frame_path)
-            await asyncio.sleep(0.01)
-            if time.time() - start_t > frames_timeout:
-                raise HTTPException(status_code=504, detail="Frame extraction timeout")
+        frames_timeout = meta.get("frames_timeout_override") or _estimated_timeout(meta, "frames")
+        dedup_threshold = meta.get("dedup_threshold_override", DEDUP_THRESHOLD)
+        frame_budget = meta.get("frame_budget_override", FRAME_BUDGET)
+        deadline = start_t + frames_timeout
+        # Decoding runs in the executor: the scoring pass whole, extraction one kept frame at a time
+        canceled, plan = await _run_blocking(session_id, deadline, "Frame extraction timeout",
+                                             plan_frames, session.video_path, 5, frame_budget)
+        frame_stats: Dict[str, int] = {}
+        frames = extract_frames(session.video_path, session.dirs["frames"],
+                                dedup_threshold=dedup_threshold, plan=plan, stats=frame_stats)
+        try:
+            while not canceled:
+                canceled, frame_path = await _run_blocking(session_id, deadline, "Frame extraction timeout",
+                                                           next, frames, None)
+                if canceled or frame_path is None:
+                    break
+                if store.is_canceled(session_id):
+                    canceled = True
+                    break
+                session.add_frame(frame_path, frame_stats.get("skipped_duplicates", 0))
+                _publish(session_id, session)
+        finally:
+            try:
+                frames.close()
+            except ValueError:
+                # Still running in its thread (timeout or cancel); it is released once that step returns
+                pass
+        if canceled:
+            session.finish("Canceled")
+            _set_stage(session_id, "frames", "canceled")
+            _update_meta(session_id, status="canceled", ended_at=time.time())
+            _publish(session_id, session)
+            return
+
+        if session.frames_count == 0:
+            raise HTTPException(status_code=422, detail="No frames could be decoded from the video")
+
+        probe = meta.get("probe") or {}
+        frame_mp = probe.get("width", 0) * probe.get("height", 0) / 1_000_000.0
+        # Decoded frame-megapixels; plan_frames adds a second pass when it had to pick frames
+        _stage_finished("frames", start_t, (probe.get("frame_count") or 0) * (2 if plan[0] is not None else 1) * frame_mp)
+        session.frames_skipped = frame_stats.get("skipped_duplicates", 0)
+        _update_meta(session_id, frames_kept=session.frames_count,
+                     frames_skipped_duplicates=session.frames_skipped, dedup_threshold=dedup_threshold,
+                     frame_candidates=frame_stats.get("candidates"), frame_budget=frame_budget)
 
         # Stage: faces
-        session["status"] = "Frame extraction completed. Detecting faces..."
+        session.set_status("Frame extraction completed. Detecting faces...", "faces")
         _set_stage(session_id, "frames", "done")
         _set_stage(session_id, "faces", "running")
         _update_meta(session_id, stage="faces")
-        session["stage"] = "faces"
+        _publish(session_id, session)
 
         # Faces stage timeouts: dynamic overall and no-progress watchdog
-        faces_override = _load_meta(session_id).get("faces_timeout_override")
-        overall_timeout = faces_override or _estimate_faces_timeout(session)
+        faces_override = meta.get("faces_timeout_override")
+        overall_timeout = faces_override or _estimate_faces_timeout(session, meta)
         start_t = time.time()
         last_progress = start_t
-        for vis_path, crop_paths, boxes in detect_and_crop_faces(
-            session["dirs"]["frames"], session["dirs"]["vis"], session["dirs"]["crops"]
+        export = AnnotatedVideoWriter(str(_session_dir(session_id) / ANNOTATED_FILENAME)) if meta.get("export_video") else None
+        # Overlays are drawn once on the in-memory frame, and only written for previewed frames
+        renderer = OverlayRenderer(session.dirs["vis"], export=export)
+        frame_idx = 0
+        for _, crop_paths, boxes, frame in detect_and_crop_faces(
+            session.dirs["frames"], vis_dir=None, crop_dir=session.dirs["crops"], return_frame=True
         ):
-            _ensure_app_state()
-            if session_id in app.state.canceled:
-                session["status"] = "Canceled"
+            if store.is_canceled(session_id):
+                if export is not None:
+                    export.abort()
+                session.finish("Canceled")
                 _set_stage(session_id, "faces", "canceled")
                 _update_meta(session_id, status="canceled", ended_at=time.time())
-                session["done"] = True
+                _publish(session_id, session)
                 return
             # progress heartbeat
             last_progress = time.time()
-            # Per-face predictions and overlay on vis image
+            # Per-face predictions and overlay on the frame
+            vis_path = None
             try:
-                preds = []
-                for cp in crop_paths:
-                    try:
-                        preds.append(predict_image(model, cp, device))
-                    except Exception:
-                        preds.append({"prediction": "REAL", "confidence": 0.0})
-                if os.path.exists(vis_path):
-                    vis_img = cv2.imread(vis_path)
-                    if vis_img is not None:
-                        # Persist latest boxes/preds and frame size for UI overlay
-                        try:
-                            h, w = vis_img.shape[:2]
-                            session["frame_size"] = [h, w]
-                        except Exception:
-                            pass
-                        session["last_boxes"] = [(int(t), int(r), int(b), int(l)) for (t, r, b, l) in boxes]
-                        session["last_preds"] = [{
-                            "label": str(p.get("prediction", "")).upper(),
-                            "confidence": float(p.get("confidence", 0.0) or 0.0),
-                        } for p in preds]
-
-                        for (top, right, bottom, left), pred in zip(boxes, preds):
-                            label = str(pred.get("prediction", "")).upper()
-                            conf_val = float(pred.get("confidence", 0.0) or 0.0)
-                            color = (0, 0, 255) if label == "FAKE" else (0, 200, 0)
-                            # draw box and confidence value only
-                            cv2.rectangle(vis_img, (left, top), (right, bottom), color, 2)
-                            text = f"Conf {conf_val:.2f}"
-                            (tw, th), bl = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                            tx, ty = left, max(0, top - th - 6)
-                            cv2.rectangle(vis_img, (tx - 2, ty - th - 4), (tx + tw + 2, ty + 2), color, -1)
-                            cv2.putText(vis_img, text, (tx, ty), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2, cv2.LINE_AA)
-                        cv2.imwrite(vis_path, vis_img)
+                # Crops from every scan on this worker share forward passes
+                with metrics.timed("score_faces", faces=len(crop_paths)):
+                    preds = await batcher.score(crop_paths)
+                # Persist latest boxes/preds and frame size for UI overlay
+                session.frame_size = list(frame.shape[:2])
+                session.last_boxes = [(int(t), int(r), int(b), int(l)) for (t, r, b, l) in boxes]
+                session.last_preds = [{
+                    "label": str(p.get("prediction", "")).upper(),
+                    "confidence": float(p.get("confidence", 0.0) or 0.0),
+                } for p in preds]
+                vis_path = renderer.add(f"frame_{frame_idx:05d}.jpg", frame, boxes, preds)
             except Exception:
                 pass
+            frame_idx += 1
 
-            session["faces_count"] = session.get("faces_count", 0) + len(crop_paths)
-            session["crops_count"] = session.get("crops_count", 0) + len(crop_paths)
-            session.setdefault("faces", []).append(vis_path)
-            for cp in crop_paths:
-                session.setdefault("crops", []).append(cp)
+            session.add_faces(vis_path, crop_paths)
+            _publish(session_id, session)
             await asyncio.sleep(0.01)
             now = time.time()
             # Overall dynamic timeout
             if now - start_t > overall_timeout:
+                if export is not None:
+                    export.abort()
                 raise HTTPException(status_code=504, detail="Face detection timeout")
             # No-progress watchdog (e.g., stuck on a single heavy frame)
             if now - last_progress > FACES_NO_PROGRESS_TIMEOUT:
+                if export is not None:
+                    export.abort()
                 raise HTTPException(status_code=504, detail="Face detection stalled (no progress)")
 
+        # The last frame is always previewed, even if it came right after the previous preview
+        last_vis = renderer.flush()
+        if last_vis is not None:
+            session.add_preview(last_vis)
+            _publish(session_id, session)
+        if export is not None:
+            # Waits for the encoder to drain; keep that off the event loop
+            annotated = await asyncio.get_running_loop().run_in_executor(None, export.close)
+            _update_meta(session_id, annotated_path=annotated, annotated_frames=export.frames)
+        _stage_finished("faces", start_t, session.frames_count * frame_mp)
+        throughput.observe_crops(session.frames_count, session.crops_count)
+
         # Stage: inference
-        session["status"] = "Face detection completed. Cropping faces done. Predicting..."
+        _drop_consumed(session, "frames")
+        session.set_status("Face detection completed. Cropping faces done. Predicting...", "inference")
         _set_stage(session_id, "faces", "done")
         _set_stage(session_id, "inference", "running")
         _update_meta(session_id, stage="inference")
-        session["stage"] = "inference"
+        _publish(session_id, session)
+
+        def _infer():
+            if not meta.get("profile_torch"):
+                return predict_from_faces(runtime.model, session.dirs["crops"], runtime.device)
+            return profiling.run_with_torch_profiler(
+                lambda: predict_from_faces(runtime.model, session.dirs["crops"], runtime.device),
+                str(_session_dir(session_id) / profiling.TORCH_PROFILE_FILENAME),
+            )
 
         async def _run_inf():
             loop = asyncio.get_running_loop()
-            return await loop.run_in_executor(None, lambda: predict_from_faces(model, session["dirs"]["crops"], device))
-        infer_timeout = _load_meta(session_id).get("inference_timeout_override") or STEP_TIMEOUTS["inference"]
+            # Copy the context so the active tracer follows the call into the executor thread
+            return await loop.run_in_executor(None, contextvars.copy_context().run, _infer)
+        infer_timeout = meta.get("inference_timeout_override") or _estimated_timeout(meta, "inference")
+        start_t = time.time()
         try:
             result = await asyncio.wait_for(_run_inf(), timeout=infer_timeout)
         except asyncio.TimeoutError:
             raise HTTPException(status_code=504, detail="Inference timeout")
+        _stage_finished("inference", start_t, session.crops_count)
 
         # Do not annotate face previews after final result to avoid confusion on last frame
 
-        session["prediction"] = result
-        session["status"] = "Prediction completed"
-        session["done"] = True
+        # Cancel may have been requested from another worker while inference ran
+        if store.is_canceled(session_id):
+            session.finish("Canceled")
+            _set_stage(session_id, "inference", "canceled")
+            _update_meta(session_id, status="canceled", ended_at=time.time())
+            _publish(session_id, session)
+            return
+
+        _drop_consumed(session, "crops")
+        session.finish("Prediction completed", result)
         _set_stage(session_id, "inference", "done")
         _update_meta(session_id, status="done", ended_at=time.time(), result=result)
+        _publish(session_id, session)
+        metrics.SCANS_FINISHED.inc(status="done")
     except HTTPException as he:
-        session["status"] = f"Error: {he.detail}"
-        session["done"] = True
-        _set_stage(session_id, _load_meta(session_id).get("stage", "unknown"), "error")
+        if he.status_code == 504:
+            metrics.STAGE_TIMEOUTS.inc(stage=session.stage or "unknown")
+        metrics.SCANS_FINISHED.inc(status="error")
+        session.finish(f"Error: {he.detail}")
+        _set_stage(session_id, None, "error")
         _update_meta(session_id, status="error", error=he.detail, ended_at=time.time())
+        _publish(session_id, session)
     except Exception as e:
-        session["status"] = "Internal error"
-        session["done"] = True
-        _set_stage(session_id, _load_meta(session_id).get("stage", "unknown"), "error")
+        metrics.SCANS_FINISHED.inc(status="error")
+        session.finish("Internal error")
+        _set_stage(session_id, None, "error")
         _update_meta(session_id, status="error", error=str(e), traceback=traceback.format_exc(), ended_at=time.time())
+        _publish(session_id, session)
+
+
+# Queued batch items are bounded separately from interactive scans, by MAX_QUEUED_BACKGROUND (see Dispatcher)
+dispatcher = Dispatcher(store, process_video,
+                        cost=lambda sid: (_load_meta(sid).get("estimate") or {}).get("total_s"))
+batcher = InferenceBatcher(None, None)
+if STARTUP_MODE == "eager":
+    runtime.load()
+    if not runtime.ready:
+        raise RuntimeError(runtime.error)
+
+
+@app.on_event("startup")
+async def _start_dispatcher():
+    watchdog.start()
+    runtime.start()
+    batcher.start()
+    dispatcher.start()
+    janitor.start()
+
+
+@app.on_event("shutdown")
+async def _stop_dispatcher():
+    await watchdog.stop()
+    await janitor.stop()
+    await dispatcher.stop()
+    await batcher.stop()
 
 @app.get("/stream/{session_id}")
 async def stream(session_id: str, request: Request):
+    _touch(session_id)
     async def event_generator():
         last_sig = None
         last_heartbeat = 0.0
@@ -357,19 +747,15 @@ async def stream(session_id: str, request: Request):
             except Exception:
                 pass
 
-            session = progress_messages.get(session_id)
+            session = store.get(session_id)
             if not session:
                 break
+            if session.stage == "queued":
+                info = dispatcher.queue_info(session_id)
+                session.queue_position, session.eta_seconds = info["queue_position"], info["eta_seconds"]
 
-            # signature based on a few fields to avoid shallow-copy pitfalls
-            sig = (
-                session.get("status"),
-                len(session.get("frames", [])),
-                len(session.get("faces", [])),
-                len(session.get("crops", [])),
-                bool(session.get("prediction")),
-                bool(session.get("done")),
-            )
+            # Every progress change bumps the version; queue moves are tracked separately
+            sig = (session.version, session.queue_position)
             if sig != last_sig:
                 last_sig = sig
                 payload = await encode_session(session)
@@ -381,83 +767,160 @@ async def stream(session_id: str, request: Request):
                 last_heartbeat = now
                 yield "event: keep-alive\n\n"
 
-            if session.get("done"):
+            if session.done:
                 break
             await asyncio.sleep(0.25)
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
-async def encode_session(session):
-    def to_b64(path):
-        if os.path.exists(path):
-            with open(path, "rb") as f:
-                return base64.b64encode(f.read()).decode()
+# Base64 of recently sent previews; consecutive events mostly resend the same ring buffer items.
+# Keyed by (path, mtime, size) so a rescan rewriting frame_0001.jpg etc. is never served stale.
+_B64_CACHE: "OrderedDict[tuple, str]" = OrderedDict()
+_B64_CACHE_SIZE = 256
+
+def _b64_file(path: str) -> Optional[str]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    key = (path, st.st_mtime_ns, st.st_size)
+    if key in _B64_CACHE:
+        _B64_CACHE.move_to_end(key)
+        return _B64_CACHE[key]
+    try:
+        with open(path, "rb") as f:
+            data = base64.b64encode(f.read()).decode()
+    except OSError:
+        # Removed by /clear or the janitor between stat and open
         return None
+    _B64_CACHE[key] = data
+    if len(_B64_CACHE) > _B64_CACHE_SIZE:
+        _B64_CACHE.popitem(last=False)
+    return data
+
+async def encode_session(session: ScanProgress):
+    # Only the ring buffers (at most PREVIEW_ITEMS per kind) are encoded, whatever the video length
+    with metrics.timed("encode_session", metrics.SSE_ENCODE_SECONDS):
+        payload = JSONResponse(content={
+            "type": "status",
+            "status": session.status,
+            "stage": session.stage,
+            "frames": [_b64_file(p) for p in session.frames],
+            "faces": [_b64_file(p) for p in session.faces],
+            "crops": [_b64_file(p) for p in session.crops],
+            "frames_count": session.frames_count,
+            "frames_skipped": session.frames_skipped,
+            "faces_count": session.faces_count,
+            "crops_count": session.crops_count,
+            "boxes": session.last_boxes,
+            "box_preds": session.last_preds,
+            "frame_size": session.frame_size,
+            "queue_position": session.queue_position,
+            "eta_seconds": session.eta_seconds,
+            "estimate_seconds": session.estimate_seconds,
+            "prediction": session.prediction,
+            "done": session.done
+        }).body.decode()
+    metrics.SSE_EVENTS.inc()
+    metrics.SSE_BYTES.inc(len(payload))
+    return payload
+
+
+@app.get("/trace/{session_id}")
+async def download_trace(session_id: str, kind: str = "chrome"):
+    """Download a profiled scan's Chrome/Perfetto trace, or kind=torch for the torch.profiler summary."""
+    name = profiling.TORCH_PROFILE_FILENAME if kind == "torch" else profiling.TRACE_FILENAME
+    p = _session_dir(session_id) / name
+    if not p.exists():
+        raise HTTPException(status_code=404, detail="Trace not found (scan with ?profile=1)")
+    _touch(session_id)
+    media_type = "text/plain" if kind == "torch" else "application/json"
+    return FileResponse(str(p), media_type=media_type, filename=f"{session_id}-{name}")
+
 
-    # Limit to last N media items to control payload size
-    max_items = 8
-    return JSONResponse(content={
-        "type": "status",
-        "status": session.get("status"),
-        "stage": session.get("stage"),
-        "frames": [to_b64(p) for p in session.get("frames", [])][-max_items:],
-        "faces": [to_b64(p) for p in session.get("faces", [])][-max_items:],
-        "crops": [to_b64(p) for p in session.get("crops", [])][-max_items:],
-        "frames_count": session.get("frames_count", 0),
-        "faces_count": session.get("faces_count", 0),
-        "crops_count": session.get("crops_count", 0),
-        "boxes": session.get("last_boxes"),
-        "box_preds": session.get("last_preds"),
-        "frame_size": session.get("frame_size"),
-        "prediction": session.get("prediction"),
-        "done": session.get("done")
-    }).body.decode()
+@app.get("/annotated/{session_id}")
+async def download_annotated(session_id: str):
+    """Download the annotated MP4 of a scan started with ?export=1."""
+    from utils.overlay import ANNOTATED_FILENAME
+    p = _session_dir(session_id) / ANNOTATED_FILENAME
+    if not p.exists():
+        raise HTTPException(status_code=404, detail="Annotated video not found (scan with ?export=1)")
+    _touch(session_id)
+    return FileResponse(str(p), media_type="video/mp4", filename=f"{session_id}-{ANNOTATED_FILENAME}")
 
 
 @app.get("/status/{session_id}")
 async def get_status(session_id: str):
     m = _load_meta(session_id)
+    _touch(session_id)
     if not m:
-        session = progress_messages.get(session_id)
+        session = store.get(session_id)
         if not session:
             raise HTTPException(status_code=404, detail="Session not found")
         # derive a minimal status
         m = {
             "session_id": session_id,
-            "status": "done" if session.get("done") else "running",
-            "stage": _load_meta(session_id).get("stage", "unknown"),
-            "stages": _load_meta(session_id).get("stages", {}),
+            "status": "done" if session.done else "running",
+            "stage": session.stage or "unknown",
+            "stages": {},
         }
+    if m.get("status") == "queued":
+        m.update(dispatcher.queue_info(session_id))
     return JSONResponse(m)
 
 
+metrics.REGISTRY.register(metrics.Gauge("dfscan_queue_depth", "Scans waiting in the shared queue", fn=lambda: len(store.queued())))
+metrics.REGISTRY.register(metrics.Gauge("dfscan_active_scans", "Scans running on this worker", fn=lambda: dispatcher.active))
+metrics.REGISTRY.register(metrics.Gauge("dfscan_temp_usage_bytes", "backend/temp usage at the last janitor sweep", fn=lambda: janitor.stats["usage_bytes"]))
+metrics.REGISTRY.register(metrics.Gauge("dfscan_temp_reclaimed_bytes", "Bytes freed by the janitor, /clear and intermediate drops", fn=lambda: janitor.stats["bytes_reclaimed"]))
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition of this worker's metrics."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/storage")
+async def storage_stats():
+    """Temp storage usage and janitor counters as of the last sweep."""
+    return {"quota_bytes": janitor.quota_bytes, "ttls": janitor.ttls, **janitor.stats}
+
+
+@app.get("/sessions")
+async def list_sessions(status: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+                        limit: int = 100, offset: int = 0):
+    """List session metadata newest first, optionally filtered by status and start time (epoch seconds)."""
+    limit = max(1, min(limit, 1000))
+    sessions = meta_store.list(status=status, since=since, until=until, limit=limit, offset=max(0, offset))
+    return {"sessions": sessions, "count": len(sessions)}
+
+
 @app.post("/cancel/{session_id}")
 async def cancel_scan(session_id: str):
-    _ensure_app_state()
-    app.state.canceled.add(session_id)
-    t = getattr(app.state, "tasks", {}).get(session_id)
-    if t and not t.done():
-        t.cancel()
-    # update in-memory session if exists
-    s = progress_messages.get(session_id)
+    # The flag reaches the owning worker through the store; the local task (if any) is cancelled directly
+    if store.request_cancel(session_id) is None:
+        # Finished or never queued: nothing to stop, and its status and result stay as they are
+        return {"ok": True, "session_id": session_id, "canceled": False}
+    metrics.SCANS_CANCELED.inc()
+    dispatcher.cancel_local(session_id)
+    s = store.get(session_id)
     if s:
-        s["status"] = "Canceled"
-        s["done"] = True
-    _set_stage(session_id, _load_meta(session_id).get("stage", "unknown"), "canceled")
+        s.finish("Canceled")
+        store.put(session_id, s)
+    _set_stage(session_id, None, "canceled")
     _update_meta(session_id, status="canceled", ended_at=time.time())
-    return {"ok": True, "session_id": session_id}
+    return {"ok": True, "session_id": session_id, "canceled": True}
 
 
 @app.post("/clear/{session_id}")
 async def clear_session(session_id: str):
     """Delete temp files, metadata, and in-memory state for a session."""
-    _ensure_app_state()
-    # Cancel any running task
-    t = getattr(app.state, "tasks", {}).get(session_id)
-    if t and not t.done():
-        try:
-            t.cancel()
-        except Exception:
-            pass
+    # Cancel any running task, here or on another worker
+    try:
+        store.request_cancel(session_id)
+    except Exception:
+        pass
+    if dispatcher.cancel_local(session_id):
         try:
             await asyncio.sleep(0)
         except Exception:
@@ -466,20 +929,16 @@ async def clear_session(session_id: str):
         # Remove temp directory and meta
         d = _session_dir(session_id)
         if d.exists():
-            shutil.rmtree(d, ignore_errors=True)
-    except Exception:
-        pass
-    # Cleanup memory state
-    try:
-        progress_messages.pop(session_id, None)
+            janitor.stats["bytes_reclaimed"] += cleanup_session(str(d))
     except Exception:
         pass
+    # Cleanup shared session state (a running job keeps its cancel flag so a remote scan still stops)
     try:
-        app.state.tasks.pop(session_id, None)
+        store.delete(session_id)
     except Exception:
         pass
     try:
-        app.state.canceled.discard(session_id)
+        meta_store.delete(session_id)
     except Exception:
         pass
     return {"ok": True, "session_id": session_id}
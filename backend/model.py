@@ -33,3 +33,26 @@ class VideoResNetLSTM(nn.Module):
         lstm_out, (h_n, _) = self.lstm(features)
         final_feat = torch.cat((h_n[-2], h_n[-1]), dim=1) if self.lstm.bidirectional else h_n[-1]
         return self.classifier(final_feat)
+
+
+def load_model(weights_path, device, mmap=True):
+    """Build the inference model and load a checkpoint onto `device`, in eval mode.
+
+    With mmap the checkpoint is memory-mapped and its tensors become the
+    weights of a model built on the meta device (no random init, no copy), so
+    CPU workers share the weight pages through the page cache. Falls back to a
+    plain load on torch < 2.1 or legacy (non-zip) checkpoints.
+    """
+    if mmap:
+        try:
+            state = torch.load(weights_path, map_location="cpu", mmap=True, weights_only=True)
+            with torch.device("meta"):
+                model = VideoResNetLSTM(pretrained=False)
+            model.load_state_dict(state, assign=True)
+            return model.to(device).eval()
+        except (TypeError, RuntimeError, AttributeError):
+            pass
+    model = VideoResNetLSTM(pretrained=False).to(device)
+    model.load_state_dict(torch.load(weights_path, map_location=device))
+    model.eval()
+    return model
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import time
+import unittest
+
+from utils.dispatcher import Dispatcher, QueueFull
+from utils.session_store import JobExists, MemorySessionStore, SQLiteSessionStore
+
+
+async def _noop(sid):
+    pass
+
+
+class AdmissionTest(unittest.TestCase):
+    """Run from backend/: python -m unittest discover tests"""
+
+    def setUp(self):
+        self.store = MemorySessionStore()
+        self.dispatcher = Dispatcher(self.store, _noop, max_queue=2, max_background=100)
+
+    def test_full_batch_does_not_block_scan(self):
+        self.dispatcher.submit_many([f"batch-{i}" for i in range(100)], priority=-1)
+        self.dispatcher.submit("interactive")
+        self.assertEqual(self.store.queued()[0], "interactive")
+
+    def test_second_batch_fits_under_the_background_bound(self):
+        dispatcher = Dispatcher(self.store, _noop, max_queue=2, max_background=250)
+        dispatcher.submit_many([f"first-{i}" for i in range(100)], priority=-1)
+        dispatcher.submit_many([f"second-{i}" for i in range(100)], priority=-1)
+        with self.assertRaises(QueueFull):
+            dispatcher.submit_many([f"third-{i}" for i in range(100)], priority=-1)
+
+    def test_batch_over_its_bound_is_rejected(self):
+        self.dispatcher.submit_many([f"batch-{i}" for i in range(100)], priority=-1)
+        with self.assertRaises(QueueFull):
+            self.dispatcher.submit_many(["one-more"], priority=-1)
+        self.assertNotIn("one-more", self.store.queued())
+
+    def test_interactive_bound(self):
+        self.dispatcher.submit("a")
+        self.dispatcher.submit("b")
+        with self.assertRaises(QueueFull):
+            self.dispatcher.submit("c")
+        # Background room is unaffected by a full interactive queue
+        self.dispatcher.submit("d", priority=-1)
+
+    def test_duplicate_scan_is_refused(self):
+        self.dispatcher.submit("a")
+        with self.assertRaises(JobExists):
+            self.dispatcher.submit("a")
+        self.assertEqual(self.store.claim_next("w"), "a")
+        with self.assertRaises(JobExists):
+            self.dispatcher.submit("a")
+        self.store.finish("a")
+        self.dispatcher.submit("a")
+
+    def test_finish_clears_cancel_flag(self):
+        self.dispatcher.submit("a")
+        self.store.claim_next("w")
+        self.store.request_cancel("a")
+        self.store.finish("a")
+        self.assertFalse(self.store.is_canceled("a"))
+
+    def test_cancel_without_running_job_leaves_no_flag(self):
+        # Never queued, or already finished: nothing to cancel
+        self.assertIsNone(self.store.request_cancel("idle"))
+        self.assertFalse(self.store.is_canceled("idle"))
+        # A queued job is dropped without a flag
+        self.dispatcher.submit("queued")
+        self.assertEqual(self.store.request_cancel("queued"), "queued")
+        self.assertFalse(self.store.is_canceled("queued"))
+        self.assertNotIn("queued", self.store.queued())
+
+    def test_delete_keeps_flag_only_while_the_job_runs(self):
+        self.dispatcher.submit("a")
+        self.store.claim_next("w")
+        self.assertEqual(self.store.request_cancel("a"), "running")
+        self.store.delete("a")
+        self.assertTrue(self.store.is_canceled("a"))
+        self.store.finish("a")
+        self.assertFalse(self.store.is_canceled("a"))
+
+    def test_jobs_of_dead_workers_are_reaped(self):
+        self.dispatcher.submit("a")
+        self.dispatcher.submit("b")
+        self.store.heartbeat("dead")
+        self.store.claim_next("dead")
+        self.store.claim_next(self.dispatcher.worker_id)
+        time.sleep(0.02)
+        self.assertEqual(self.store.reap_stale(0.01, exclude=self.dispatcher.worker_id), ["a"])
+        # The reaped session can be scanned again; the live worker's job is untouched
+        self.dispatcher.submit("a")
+        with self.assertRaises(JobExists):
+            self.dispatcher.submit("b")
+
+
+class SQLiteAdmissionTest(AdmissionTest):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SQLiteSessionStore(os.path.join(self.tmp.name, "sessions.db"))
+        self.dispatcher = Dispatcher(self.store, _noop, max_queue=2, max_background=100)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+
+
+def _write_video(path, frames, fps=10):
+    import cv2
+
+    h, w = frames[0].shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (w, h))
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def _gradient(reverse=False, width=90, height=64):
+    import numpy as np
+
+    row = np.linspace(0, 255, width).astype(np.uint8)
+    if reverse:
+        row = row[::-1]
+    return np.repeat(np.repeat(row[None, :, None], height, axis=0), 3, axis=2).copy()
+
+
+def _flat(value, width=90, height=64):
+    import numpy as np
+
+    return np.full((height, width, 3), value, dtype=np.uint8)
+
+
+@unittest.skipUnless(importlib.util.find_spec("cv2") and importlib.util.find_spec("numpy"), "needs opencv and numpy")
+class DedupTest(unittest.TestCase):
+    """Run from backend/: python -m unittest discover tests"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _extract(self, frames, **kwargs):
+        from utils.frame_utils import extract_frames
+
+        video = _write_video(os.path.join(self.tmp.name, "v.avi"), frames)
+        stats = {}
+        saved = list(extract_frames(video, os.path.join(self.tmp.name, "frames"), step=1, budget=0,
+                                    stats=stats, **kwargs))
+        return saved, stats
+
+    def test_dhash(self):
+        from utils.frame_utils import dhash
+
+        self.assertEqual(dhash(_gradient()), dhash(_gradient()))
+        self.assertEqual(dhash(_gradient()), 2 ** 64 - 1)
+        self.assertEqual(dhash(_gradient(reverse=True)), 0)
+
+    def test_duplicates_are_skipped(self):
+        frames = [_gradient()] * 10 + [_gradient(reverse=True)] * 10
+        saved, stats = self._extract(frames, dedup_threshold=5, max_run=100)
+        self.assertEqual(len(saved), 2)
+        self.assertEqual(stats["skipped_duplicates"], 18)
+
+    def test_max_run_keeps_coverage(self):
+        saved, stats = self._extract([_gradient()] * 20, dedup_threshold=5, max_run=5)
+        # Kept: 0, 6, 12, 18
+        self.assertEqual(len(saved), 4)
+        self.assertEqual(stats["skipped_duplicates"], 16)
+
+    def test_off_by_default_threshold(self):
+        saved, stats = self._extract([_gradient()] * 5, dedup_threshold=0)
+        self.assertEqual(len(saved), 5)
+        self.assertEqual(stats["skipped_duplicates"], 0)
+
+
+@unittest.skipUnless(importlib.util.find_spec("cv2") and importlib.util.find_spec("numpy"), "needs opencv and numpy")
+class FrameBudgetTest(unittest.TestCase):
+    def test_short_video_keeps_everything(self):
+        from utils.frame_utils import select_frames
+
+        self.assertEqual(select_frames([0, 5, 10], [0.0, 1.0, 1.0], [True, False, False], budget=5), {0, 5, 10})
+
+    def test_budget_favours_change_and_scene_starts(self):
+        from utils.frame_utils import select_frames
+
+        indices = list(range(0, 500, 5))
+        scores = [0.01] * 50 + [1.0] * 50
+        cuts = [i in (0, 30, 70) for i in range(100)]
+        keep = select_frames(indices, scores, cuts, budget=20, uniform_share=0.3)
+        self.assertEqual(len(keep), 20)
+        self.assertTrue({0, 150, 350} <= keep)
+        self.assertGreater(sum(i >= 250 for i in keep), sum(i < 250 for i in keep))
+        # The uniform share still covers the static half
+        self.assertTrue(any(0 < i < 250 and i != 150 for i in keep))
+
+    def test_zero_budget_skips_planning(self):
+        from utils.frame_utils import plan_frames
+
+        self.assertEqual(plan_frames("does-not-exist.mp4", step=5, budget=0), (None, None))
+
+    def test_plan_limits_extracted_frames(self):
+        from utils.frame_utils import extract_frames, plan_frames
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # A gradient, then a flat dark scene: different histograms, so frame 30 is a scene cut
+            frames = [_gradient()] * 30 + [_flat(20)] * 30
+            video = _write_video(os.path.join(tmp, "v.avi"), frames)
+            # Within budget: no scoring pass, every sampled frame is kept
+            self.assertEqual(plan_frames(video, step=2, budget=100), (None, 30))
+            plan = plan_frames(video, step=2, budget=8)
+            self.assertEqual(len(plan[0]), 8)
+            self.assertEqual(plan[1], 30)
+            # The scene cut at frame 30 is always sampled
+            self.assertIn(30, plan[0])
+            saved = list(extract_frames(video, os.path.join(tmp, "frames"), step=2, dedup_threshold=0, plan=plan))
+            self.assertEqual(len(saved), 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import time
+import unittest
+
+from utils.cleanup import Janitor
+
+TTLS = {"uploaded": 100, "queued": 0, "running": 1000, "done": 100, "error": 100, "canceled": 10, "unknown": 100}
+
+
+class JanitorTest(unittest.TestCase):
+    """Run from backend/: python -m unittest discover tests"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.meta = {}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _session(self, sid, status, age, size=1000, **meta):
+        d = os.path.join(self.root, sid)
+        os.makedirs(d)
+        with open(os.path.join(d, "blob"), "wb") as f:
+            f.write(b"x" * size)
+        # Directory mtime counts as use too, so age it with the metadata
+        then = time.time() - age
+        os.utime(d, (then, then))
+        self.meta[sid] = dict({"status": status, "started_at": then, "ended_at": then}, **meta)
+
+    def _janitor(self, quota_bytes=0):
+        return Janitor(self.root, lambda sid: self.meta.get(sid, {}), lambda sid: self.meta.pop(sid, None),
+                       ttls=TTLS, quota_bytes=quota_bytes, interval=0)
+
+    def _left(self):
+        return sorted(os.listdir(self.root))
+
+    def test_ttl_per_status(self):
+        self._session("done-old", "done", 200)
+        self._session("done-new", "done", 50)
+        self._session("canceled", "canceled", 50)
+        self._session("running", "running", 200)
+        self._session("queued", "queued", 10 ** 6)
+        stats = self._janitor().sweep()
+        self.assertEqual(self._left(), ["done-new", "queued", "running"])
+        self.assertEqual(stats["sessions_expired"], 2)
+        self.assertNotIn("done-old", self.meta)
+
+    def test_quota_evicts_least_recently_used(self):
+        self._session("a", "done", 50)
+        self._session("b", "done", 40)
+        # Oldest by end time, but read just now
+        self._session("c", "done", 60, last_accessed_at=time.time())
+        stats = self._janitor(quota_bytes=2000).sweep()
+        self.assertEqual(self._left(), ["b", "c"])
+        self.assertEqual(stats["sessions_evicted"], 1)
+        self.assertLessEqual(stats["usage_bytes"], 2000)
+
+    def test_quota_never_evicts_running_sessions(self):
+        self._session("running", "running", 90, size=5000)
+        self._session("queued", "queued", 80, size=5000)
+        self._session("done", "done", 10)
+        stats = self._janitor(quota_bytes=1000).sweep()
+        self.assertEqual(self._left(), ["queued", "running"])
+        self.assertEqual(stats["sessions_evicted"], 1)
+
+    def test_reap_callback_runs_first(self):
+        janitor = Janitor(self.root, lambda sid: {}, lambda sid: None, ttls=TTLS, interval=0, reap=lambda: 2)
+        self.assertEqual(janitor.sweep()["jobs_reaped"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import time
+import unittest
+
+from utils.meta_store import MetaStore
+
+
+class MetaStoreTest(unittest.TestCase):
+    """Run from backend/: python -m unittest discover tests"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = MetaStore(os.path.join(self.tmp.name, "meta.db"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_updates_merge(self):
+        self.store.update("a", status="queued", started_at=1.0)
+        self.store.update("a", stage="frames")
+        m = self.store.load("a")
+        self.assertEqual((m["status"], m["stage"], m["session_id"]), ("queued", "frames", "a"))
+        self.assertEqual(self.store.load("missing"), {})
+
+    def test_update_if_checks_status(self):
+        self.store.update("a", status="done")
+        self.assertFalse(self.store.update_if("a", ("queued", "running"), status="canceled"))
+        self.assertEqual(self.store.load("a")["status"], "done")
+        self.store.update("b", status="running")
+        self.assertTrue(self.store.update_if("b", ("queued", "running"), status="canceled"))
+        self.assertEqual(self.store.load("b")["status"], "canceled")
+
+    def test_touch_is_rate_limited(self):
+        self.store.update("a", status="done")
+        self.store.touch("a", min_interval=60)
+        first = self.store.load("a")["last_accessed_at"]
+        self.store.touch("a", min_interval=60)
+        self.assertEqual(self.store.load("a")["last_accessed_at"], first)
+        time.sleep(0.01)
+        self.store.touch("a", min_interval=0)
+        self.assertGreater(self.store.load("a")["last_accessed_at"], first)
+        # Unknown sessions are not created by a read
+        self.store.touch("missing")
+        self.assertEqual(self.store.load("missing"), {})
+
+    def test_list_filters(self):
+        for i, status in enumerate(["done", "error", "done", "running"]):
+            self.store.update(f"s{i}", status=status, started_at=100.0 + i)
+        self.assertEqual([m["session_id"] for m in self.store.list()], ["s3", "s2", "s1", "s0"])
+        self.assertEqual([m["session_id"] for m in self.store.list(status="done")], ["s2", "s0"])
+        self.assertEqual([m["session_id"] for m in self.store.list(since=101, until=103)], ["s2", "s1"])
+        self.assertEqual([m["session_id"] for m in self.store.list(limit=2, offset=1)], ["s2", "s1"])
+
+    def test_save_batch(self):
+        self.store.save_batch("b1", {"batch_id": "b1", "sessions": ["a", "b"]})
+        self.assertEqual(self.store.load_batch("b1")["sessions"], ["a", "b"])
+        self.store.save_batch("b1", {"batch_id": "b1", "sessions": ["c"]})
+        self.assertEqual(self.store.load_batch("b1")["sessions"], ["c"])
+        self.assertEqual(self.store.load_batch("missing"), {})
+
+    def test_load_many(self):
+        self.store.update("a", status="done")
+        self.store.update("b", status="error")
+        self.assertEqual(sorted(self.store.load_many(["a", "b", "missing"])), ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
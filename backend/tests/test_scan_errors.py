@@ -0,0 +1,35 @@
+import importlib.util
+import time
+import unittest
+
+
+@unittest.skipUnless(importlib.util.find_spec("fastapi") and importlib.util.find_spec("httpx"),
+                     "needs fastapi and httpx (TestClient)")
+class UnreadableVideoTest(unittest.TestCase):
+    """Run from backend/: python -m unittest discover tests"""
+
+    def test_garbage_upload_fails_the_scan(self):
+        from fastapi.testclient import TestClient
+        import app
+
+        with TestClient(app.app) as client:
+            r = client.post("/upload", files={"file": ("garbage.mp4", b"not a video" * 1000, "video/mp4")})
+            self.assertEqual(r.status_code, 200)
+            sid = r.json()["session_id"]
+            self.assertTrue(r.json()["probe_error"])
+            self.assertEqual(client.post(f"/scan/{sid}").status_code, 200)
+            status = {}
+            deadline = time.time() + 30
+            while time.time() < deadline:
+                status = client.get(f"/status/{sid}").json()
+                if status.get("status") in ("done", "error", "canceled"):
+                    break
+                time.sleep(0.1)
+            client.post(f"/clear/{sid}")
+        self.assertEqual(status.get("status"), "error")
+        self.assertIn("Unreadable video", status.get("error", ""))
+        self.assertNotIn("result", status)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import asyncio
+import contextvars
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+# Crops per shared forward pass and how long to wait for more requests to join one
+BATCH_MAX_CROPS = int(os.environ.get("BATCH_MAX_CROPS", "32"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+
+_FALLBACK = {"prediction": "REAL", "confidence": 0.0}
+
+
+class InferenceBatcher:
+    """Micro-batches per-crop scoring across all scans running on this worker.
+
+    Concurrent scans call `score()`; requests arriving within BATCH_MAX_WAIT_MS
+    are merged into one predict_images() forward of up to BATCH_MAX_CROPS
+    crops, run in the default executor so the event loop stays free.
+    `model` may be bound after construction, once it has loaded.
+    """
+
+    def __init__(self, model, device, max_crops: int = BATCH_MAX_CROPS, max_wait_ms: float = BATCH_MAX_WAIT_MS):
+        self.model = model
+        self.device = device
+        self.max_crops = max(1, max_crops)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def bind(self, model, device) -> None:
+        self.model = model
+        self.device = device
+
+    def start(self) -> None:
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def score(self, crop_paths: List[str]) -> List[Dict[str, Any]]:
+        if not crop_paths:
+            return []
+        self.start()
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((list(crop_paths), fut, contextvars.copy_context()))
+        return await fut
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            pending: List[Tuple[List[str], asyncio.Future, contextvars.Context]] = [await self._queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_crops:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+            paths = [p for req, _, _ in pending for p in req]
+            # Run under the first request's context so a profiling tracer (if any) sees the forward
+            ctx = pending[0][2]
+            try:
+                preds = await loop.run_in_executor(None, ctx.run, self._predict, paths)
+            except Exception:
+                preds = await loop.run_in_executor(None, ctx.run, self._score_one_by_one, paths)
+            i = 0
+            for req, fut, _ in pending:
+                if not fut.done():
+                    fut.set_result(preds[i:i + len(req)])
+                i += len(req)
+
+    def _predict(self, paths: List[str]) -> List[Dict[str, Any]]:
+        # Imported here so the app can start serving before torch is loaded
+        from utils.inference import predict_images
+        return predict_images(self.model, paths, self.device)
+
+    def _score_one_by_one(self, paths: List[str]) -> List[Dict[str, Any]]:
+        """Fallback when a merged batch fails (e.g. one unreadable crop)."""
+        out = []
+        for p in paths:
+            try:
+                out.extend(self._predict([p]))
+            except Exception:
+                out.append(dict(_FALLBACK))
+        return out
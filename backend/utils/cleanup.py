@@ -1,6 +1,177 @@
+import asyncio
 import shutil
 import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Seconds a session directory is kept after reaching a state (0 = never expire by TTL)
+SESSION_TTLS = {
+    "uploaded": int(os.environ.get("TTL_UPLOADED_SECONDS", "3600")),
+    "queued": int(os.environ.get("TTL_QUEUED_SECONDS", "0")),
+    "running": int(os.environ.get("TTL_RUNNING_SECONDS", "21600")),
+    "done": int(os.environ.get("TTL_DONE_SECONDS", "3600")),
+    "error": int(os.environ.get("TTL_ERROR_SECONDS", "3600")),
+    "canceled": int(os.environ.get("TTL_CANCELED_SECONDS", "600")),
+    # directories without metadata (crashed uploads, pre-metadata sessions)
+    "unknown": int(os.environ.get("TTL_UNKNOWN_SECONDS", "86400")),
+}
+# Global cap on backend/temp; finished sessions are evicted least recently used first, by the
+# later of their end and their last read (0 = no quota)
+TEMP_QUOTA_BYTES = int(float(os.environ.get("TEMP_QUOTA_MB", "0")) * 1024 * 1024)
+JANITOR_INTERVAL_SECONDS = int(os.environ.get("JANITOR_INTERVAL_SECONDS", "60"))
+# Delete frames once face detection consumed them and crops once inference did
+DROP_INTERMEDIATE_FRAMES = os.environ.get("DROP_INTERMEDIATE_FRAMES", "0") == "1"
+
+FINISHED_STATES = ("done", "error", "canceled")
+
+
+def dir_size(path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
 
 def cleanup_session(session_dir):
-    if os.path.exists(session_dir):
-        shutil.rmtree(session_dir)
+    """Remove a session directory and return the number of bytes freed."""
+    if not os.path.exists(session_dir):
+        return 0
+    size = dir_size(session_dir)
+    shutil.rmtree(session_dir, ignore_errors=True)
+    return size
+
+
+class Janitor:
+    """Background GC for per-session temp directories.
+
+    Every sweep expires sessions whose state TTL has elapsed, then evicts
+    finished sessions (least recently used first) until the temp root fits in the
+    quota. Running and queued sessions are never evicted for quota. With a
+    `reap` callback, each sweep first fails the scans of workers that died
+    (see Dispatcher.reap_stale), so their sessions can expire normally.
+    """
+
+    def __init__(self, root, load_meta: Callable[[str], Dict[str, Any]], forget: Callable[[str], None],
+                 ttls: Optional[Dict[str, int]] = None, quota_bytes: int = TEMP_QUOTA_BYTES,
+                 interval: int = JANITOR_INTERVAL_SECONDS, reap: Optional[Callable[[], int]] = None):
+        self.root = Path(root)
+        self.load_meta = load_meta
+        self.forget = forget
+        self.reap = reap
+        self.ttls = dict(SESSION_TTLS if ttls is None else ttls)
+        self.quota_bytes = quota_bytes
+        self.interval = interval
+        self.stats = {
+            "bytes_reclaimed": 0,
+            "intermediate_bytes_reclaimed": 0,
+            "sessions_expired": 0,
+            "sessions_evicted": 0,
+            "jobs_reaped": 0,
+            "usage_bytes": 0,
+            "sessions": 0,
+            "last_sweep_at": None,
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    def _remove(self, sid: str) -> int:
+        freed = cleanup_session(str(self.root / sid))
+        try:
+            self.forget(sid)
+        except Exception:
+            pass
+        self.stats["bytes_reclaimed"] += freed
+        return freed
+
+    def drop_intermediate(self, directory, keep: Iterable[str] = ()) -> int:
+        """Delete files in a consumed stage directory, sparing paths still used as previews."""
+        keep = {os.path.abspath(p) for p in keep}
+        freed = 0
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            return 0
+        for e in entries:
+            if not e.is_file() or os.path.abspath(e.path) in keep:
+                continue
+            try:
+                size = e.stat().st_size
+                os.remove(e.path)
+                freed += size
+            except OSError:
+                pass
+        self.stats["intermediate_bytes_reclaimed"] += freed
+        self.stats["bytes_reclaimed"] += freed
+        return freed
+
+    def sweep(self) -> Dict[str, Any]:
+        if self.reap is not None:
+            try:
+                self.stats["jobs_reaped"] += self.reap()
+            except Exception:
+                pass
+        now = time.time()
+        sessions = []
+        if self.root.exists():
+            for d in self.root.iterdir():
+                if not d.is_dir():
+                    continue
+                m = self.load_meta(d.name) or {}
+                status = m.get("status") or "unknown"
+                try:
+                    mtime = d.stat().st_mtime
+                except OSError:
+                    continue
+                # Reads of results (/status, /stream, /annotated, /trace) count as use
+                last_used = max(m.get("ended_at") or 0, m.get("started_at") or 0, m.get("last_accessed_at") or 0, mtime)
+                sessions.append({"sid": d.name, "status": status, "last_used": last_used, "size": dir_size(d)})
+
+        kept = []
+        for s in sessions:
+            ttl = self.ttls.get(s["status"], self.ttls.get("unknown", 0))
+            if ttl and now - s["last_used"] > ttl:
+                self._remove(s["sid"])
+                self.stats["sessions_expired"] += 1
+            else:
+                kept.append(s)
+
+        usage = sum(s["size"] for s in kept)
+        if self.quota_bytes and usage > self.quota_bytes:
+            for s in sorted((s for s in kept if s["status"] in FINISHED_STATES), key=lambda s: s["last_used"]):
+                if usage <= self.quota_bytes:
+                    break
+                self._remove(s["sid"])
+                usage -= s["size"]
+                kept.remove(s)
+                self.stats["sessions_evicted"] += 1
+
+        self.stats["usage_bytes"] = usage
+        self.stats["sessions"] = len(kept)
+        self.stats["last_sweep_at"] = now
+        return dict(self.stats)
+
+    async def run_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.sweep)
+            except Exception:
+                pass
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
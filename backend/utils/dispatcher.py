@@ -0,0 +1,183 @@
+import asyncio
+import math
+import os
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from utils.session_store import QueueLimit, SessionStore
+
+DISPATCH_POLL_SECONDS = float(os.environ.get("DISPATCH_POLL_SECONDS", "0.25"))
+# Scans run concurrently on one worker; HOG + ResNet are CPU bound so more than ~cores/2 only thrashes
+MAX_CONCURRENT_SCANS = int(os.environ.get("MAX_CONCURRENT_SCANS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Interactive jobs (priority >= 0) waiting across all workers before /scan answers 429
+MAX_QUEUED_SCANS = int(os.environ.get("MAX_QUEUED_SCANS", "20"))
+# Background jobs (priority < 0, e.g. batch items) have their own bound so they never crowd out /scan;
+# several batches of up to MAX_BATCH_ITEMS each can wait at once
+MAX_QUEUED_BACKGROUND = int(os.environ.get("MAX_QUEUED_BACKGROUND", "500"))
+# Worker processes sharing the queue (uvicorn/gunicorn convention), used for ETAs only
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+# Workers record a heartbeat this often; a running job whose owner missed WORKER_STALE_SECONDS of them is failed
+HEARTBEAT_SECONDS = float(os.environ.get("HEARTBEAT_SECONDS", "10"))
+WORKER_STALE_SECONDS = float(os.environ.get("WORKER_STALE_SECONDS", "120"))
+# Initial guess for one scan's duration until real scans have been timed
+SCAN_ETA_SECONDS = float(os.environ.get("SCAN_ETA_SECONDS", "60"))
+
+
+class QueueFull(Exception):
+    """Raised by Dispatcher.submit when the shared queue is at capacity."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Scan queue is full")
+        self.retry_after = retry_after
+
+
+class Dispatcher:
+    """Runs queued scans on this worker.
+
+    `/scan` only enqueues a job in the shared store; every worker runs one
+    dispatcher that claims jobs and executes them locally, so a scan lands on
+    whichever worker picks it up first. A worker never runs more than
+    `max_concurrent` scans; the rest wait in a priority/FIFO queue. Admission
+    is bounded per class: interactive jobs (priority >= 0) against `max_queue`,
+    background jobs (priority < 0) against `max_background`.
+    `cost(sid)` may return a scan's estimated seconds; queue ETAs then add up
+    the estimates of the scans ahead instead of assuming average scans.
+    """
+
+    def __init__(self, store: SessionStore, run: Callable[[str], Awaitable[None]], poll_interval: float = DISPATCH_POLL_SECONDS,
+                 max_concurrent: int = MAX_CONCURRENT_SCANS, max_queue: int = MAX_QUEUED_SCANS,
+                 max_background: int = MAX_QUEUED_BACKGROUND, cost: Optional[Callable[[str], Optional[float]]] = None):
+        self.store = store
+        self.run = run
+        self.poll_interval = poll_interval
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_background = max(0, max_background)
+        self.avg_scan_seconds = SCAN_ETA_SECONDS
+        self.cost = cost
+        self._costs: Dict[str, float] = {}
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._loop_task is None:
+            self._wakeup = asyncio.Event()
+            self._loop_task = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self) -> None:
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        for t in list(self.tasks.values()):
+            t.cancel()
+
+    def submit(self, sid: str, priority: int = 0) -> None:
+        """Queue a scan; higher priority runs first, FIFO within a priority.
+
+        Raises JobExists (from the store) if the scan is already queued or running.
+        """
+        self.submit_many([sid], priority)
+
+    def submit_many(self, sids: List[str], priority: int = 0) -> None:
+        """Queue several scans at once; all are admitted or QueueFull is raised."""
+        limit = self.max_background if priority < 0 else self.max_queue
+        try:
+            self.store.enqueue(sids, priority, limit)
+        except QueueLimit:
+            raise QueueFull(self._eta_for_position(len(self.store.queued()) + len(sids))) from None
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _cost_of(self, sid: str) -> float:
+        if sid not in self._costs:
+            est = None
+            try:
+                est = self.cost(sid) if self.cost is not None else None
+            except Exception:
+                pass
+            self._costs[sid] = float(est) if est else self.avg_scan_seconds
+        return self._costs[sid]
+
+    def _eta_for_position(self, position: int, ahead: Optional[List[str]] = None) -> int:
+        slots = self.max_concurrent * max(1, WEB_CONCURRENCY)
+        if ahead is None or self.cost is None:
+            return int(math.ceil(position / slots) * self.avg_scan_seconds)
+        # The scans already running are assumed average; queued ones contribute their own estimate
+        return int(math.ceil(self.avg_scan_seconds + sum(self._cost_of(s) for s in ahead) / slots))
+
+    def queue_info(self, sid: str) -> Dict[str, Any]:
+        """1-based queue position and a rough start ETA, or Nones once the scan left the queue."""
+        try:
+            queued = self.store.queued()
+        except Exception:
+            queued = []
+        # Scans claimed by any worker drop out of the cost cache
+        for other in [k for k in self._costs if k not in queued]:
+            self._costs.pop(other, None)
+        if sid not in queued:
+            return {"queue_position": None, "eta_seconds": None}
+        position = queued.index(sid) + 1
+        return {"queue_position": position, "eta_seconds": self._eta_for_position(position, queued[:position - 1])}
+
+    @property
+    def active(self) -> int:
+        return len(self.tasks)
+
+    def cancel_local(self, sid: str) -> bool:
+        """Cancel the asyncio task if the scan runs on this worker."""
+        t = self.tasks.get(sid)
+        if t and not t.done():
+            t.cancel()
+            return True
+        return False
+
+    def reap_stale(self) -> List[str]:
+        """Drop running jobs of workers that stopped sending heartbeats (crashed or killed); returns their ids."""
+        return self.store.reap_stale(WORKER_STALE_SECONDS, exclude=self.worker_id)
+
+    async def _dispatch_loop(self) -> None:
+        last_heartbeat = 0.0
+        while True:
+            if time.monotonic() - last_heartbeat >= HEARTBEAT_SECONDS:
+                try:
+                    self.store.heartbeat(self.worker_id)
+                    last_heartbeat = time.monotonic()
+                except Exception:
+                    pass
+            sid = None
+            if len(self.tasks) < self.max_concurrent:
+                try:
+                    sid = self.store.claim_next(self.worker_id)
+                except Exception:
+                    sid = None
+            if sid:
+                self.tasks[sid] = asyncio.create_task(self._run_job(sid), name=f"scan-{sid}")
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _run_job(self, sid: str) -> None:
+        started = time.monotonic()
+        try:
+            await self.run(sid)
+            # Exponential moving average of scan duration feeds the queue ETAs
+            self.avg_scan_seconds = 0.8 * self.avg_scan_seconds + 0.2 * (time.monotonic() - started)
+        finally:
+            try:
+                self.store.finish(sid)
+            except Exception:
+                pass
+            self.tasks.pop(sid, None)
+            self._costs.pop(sid, None)
+            if self._wakeup is not None:
+                self._wakeup.set()
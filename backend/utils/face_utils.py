@@ -2,26 +2,43 @@ import os
 import cv2
 import face_recognition
 import os
+import time
+from utils.metrics import timed, HOG_SECONDS, HOG_SECONDS_PER_MP
 
 
 MAX_DETECT_DIM = int(os.environ.get("MAX_DETECT_DIM", "960"))
 
-def detect_and_crop_faces(frames_dir, vis_dir, crop_dir, max_preview=8):
+def _hog_locations(rgb):
+  """HOG face detection with per-frame and per-megapixel timing."""
+  h, w = rgb.shape[:2]
+  t0 = time.perf_counter()
+  with timed("hog_detect", HOG_SECONDS):
+    boxes = face_recognition.face_locations(rgb, model="hog")
+  HOG_SECONDS_PER_MP.observe((time.perf_counter() - t0) / max(1e-6, (w * h) / 1_000_000.0))
+  return boxes
+
+
+def detect_and_crop_faces(frames_dir, vis_dir, crop_dir, max_preview=8, return_frame=False):
   """
   Detect faces on frames and crop them.
   Yields three things per frame:
-    - vis_path: frame image with bounding boxes
+    - vis_path: frame image with bounding boxes, or None with vis_dir=None
+      (nothing is drawn or written)
     - cropped_faces: list of saved crop image paths
     - boxes: list of (top, right, bottom, left) for each face
+  With return_frame=True a fourth item follows: the undrawn BGR frame (for
+  utils.overlay.OverlayRenderer).
   """
-  os.makedirs(vis_dir, exist_ok=True)
+  if vis_dir is not None:
+    os.makedirs(vis_dir, exist_ok=True)
   os.makedirs(crop_dir, exist_ok=True)
 
   frame_files = sorted([f for f in os.listdir(frames_dir) if f.endswith(".jpg")])
 
   for f in frame_files:
     frame_path = os.path.join(frames_dir, f)
-    img = cv2.imread(frame_path)
+    with timed("read_frame"):
+      img = cv2.imread(frame_path)
     if img is None:
       continue
     rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
@@ -33,27 +50,34 @@ def detect_and_crop_faces(frames_dir, vis_dir, crop_dir, max_preview=8):
       new_w = max(1, int(w * scale))
       new_h = max(1, int(h * scale))
       small = cv2.resize(rgb, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
-      boxes_small = face_recognition.face_locations(small, model="hog")
+      boxes_small = _hog_locations(small)
       # Map boxes back to original coordinates
       boxes = []
       inv = 1.0 / scale
       for (top, right, bottom, left) in boxes_small:
         boxes.append((int(top * inv), int(right * inv), int(bottom * inv), int(left * inv)))
     else:
-      boxes = face_recognition.face_locations(rgb, model="hog")
+      boxes = _hog_locations(rgb)
 
-    vis_img = img.copy()
+    vis_img = img.copy() if vis_dir is not None else None
     cropped_faces = []
 
     for i, (top, right, bottom, left) in enumerate(boxes):
-      cv2.rectangle(vis_img, (left, top), (right, bottom), (0, 255, 0), 2)
+      if vis_img is not None:
+        cv2.rectangle(vis_img, (left, top), (right, bottom), (0, 255, 0), 2)
       face_crop = img[top:bottom, left:right]
       crop_path = os.path.join(crop_dir, f"{os.path.splitext(f)[0]}_face_{i}.jpg")
       cv2.imwrite(crop_path, face_crop)
       cropped_faces.append(crop_path)
 
-    vis_path = os.path.join(vis_dir, f)
-    cv2.imwrite(vis_path, vis_img)
+    vis_path = None
+    if vis_img is not None:
+      vis_path = os.path.join(vis_dir, f)
+      with timed("write_vis"):
+        cv2.imwrite(vis_path, vis_img)
 
     # Return also bounding boxes for this frame for potential overlay with scores
-    yield vis_path, cropped_faces, boxes
+    if return_frame:
+      yield vis_path, cropped_faces, boxes, img
+    else:
+      yield vis_path, cropped_faces, boxes
@@ -1,24 +1,157 @@
 import os
 import cv2
+import numpy as np
+from utils.metrics import timed, FRAMES_DECODED, FRAMES_SAVED, FRAMES_SKIPPED_DUPLICATE, FRAME_DECODE_SECONDS
 
-def extract_frames(video_path, output_dir, step=5, max_preview=8):
+# Sampled frames whose 64-bit difference hash is fewer than DEDUP_THRESHOLD bits away from
+# the last kept frame are dropped; at most DEDUP_MAX_RUN in a row, to keep temporal coverage.
+# Off (0) by default: dropping frames changes which faces the verdict averages over
+DEDUP_THRESHOLD = int(os.environ.get("DEDUP_THRESHOLD", "0"))
+DEDUP_MAX_RUN = int(os.environ.get("DEDUP_MAX_RUN", "10"))
+# Adaptive sampling: at most FRAME_BUDGET frames per video (0 keeps every `step`-th frame), spent
+# mostly where the picture changes; SAMPLE_UNIFORM_SHARE of it is spread evenly as a floor.
+# Opt-in like DEDUP_THRESHOLD, since it also changes the frames behind a verdict
+FRAME_BUDGET = int(os.environ.get("FRAME_BUDGET", "0"))
+SAMPLE_UNIFORM_SHARE = float(os.environ.get("SAMPLE_UNIFORM_SHARE", "0.3"))
+# Histogram (Bhattacharyya) distance between consecutive samples that counts as a scene cut
+SCENE_CUT_THRESHOLD = float(os.environ.get("SCENE_CUT_THRESHOLD", "0.4"))
+
+def dhash(frame):
+    """64-bit difference hash of a BGR frame (grayscale 9x8, left/right neighbour comparisons)."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+def _change_scores(cap, step):
+    """
+    First pass: for every `step`-th frame, how much it differs from the previous
+    sample (mean absolute difference of a 64x36 thumbnail, plus the grayscale
+    histogram distance), and whether that difference is a scene cut.
+    """
+    indices, scores, cuts = [], [], []
+    prev_small = prev_hist = None
+    idx = 0
+    while cap.grab():
+        if idx % step == 0:
+            ok, frame = cap.retrieve()
+            if not ok:
+                break
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            small = cv2.resize(gray, (64, 36), interpolation=cv2.INTER_AREA)
+            hist = cv2.calcHist([small], [0], None, [32], [0, 256])
+            cv2.normalize(hist, hist)
+            if prev_small is None:
+                motion, hist_dist = 0.0, 1.0
+            else:
+                motion = float(cv2.absdiff(small, prev_small).mean()) / 255.0
+                hist_dist = float(cv2.compareHist(prev_hist, hist, cv2.HISTCMP_BHATTACHARYYA))
+            indices.append(idx)
+            scores.append(motion + hist_dist)
+            cuts.append(hist_dist >= SCENE_CUT_THRESHOLD)
+            prev_small, prev_hist = small, hist
+        idx += 1
+    return indices, scores, cuts
+
+def select_frames(indices, scores, cuts, budget, uniform_share=SAMPLE_UNIFORM_SHARE):
+    """
+    Pick `budget` of the candidate frame indices: the first frame of every scene
+    (while the budget allows), then frames at evenly spaced quantiles of the
+    cumulative change, so changing stretches are sampled densely and static ones
+    sparsely. `uniform_share` of the weight is spread evenly to keep coverage.
+    """
+    n = len(indices)
+    if n <= budget:
+        return set(indices)
+    keep = set()
+    for i in np.flatnonzero(cuts)[:budget // 2]:
+        keep.add(indices[i])
+    scores = np.asarray(scores, dtype=np.float64)
+    total = scores.sum()
+    weights = uniform_share / n + (1.0 - uniform_share) * (scores / total if total > 0 else 1.0 / n)
+    cum = np.cumsum(weights)
+    remaining = budget - len(keep)
+    targets = (np.arange(remaining) + 0.5) / remaining * cum[-1]
+    for i in np.searchsorted(cum, targets):
+        keep.add(indices[min(int(i), n - 1)])
+    # Quantiles can land on a scene start already kept; top up with the most changed frames left
+    for i in np.argsort(-scores):
+        if len(keep) >= budget:
+            break
+        keep.add(indices[i])
+    return keep
+
+def plan_frames(video_path, step=5, budget=FRAME_BUDGET):
+    """
+    Decide which of the every-`step`-th frames to keep under `budget`.
+    Returns (keep, candidates): keep is a set of frame indices, or None when the
+    video has no more candidates than the budget (or budget is 0) and every
+    sampled frame is kept. Costs one extra decode pass for long videos.
+    """
+    if budget <= 0:
+        return None, None
+    cap = cv2.VideoCapture(video_path)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    candidates = (total_frames + step - 1) // step if total_frames > 0 else None
+    # The container's frame count can be missing or wrong, so it only decides whether to skip the pass
+    if candidates is not None and candidates <= budget:
+        cap.release()
+        return None, candidates
+    with timed("score_changes"):
+        indices, scores, cuts = _change_scores(cap, step)
+    cap.release()
+    if len(indices) <= budget:
+        return None, len(indices)
+    return select_frames(indices, scores, cuts, budget), len(indices)
+
+def extract_frames(video_path, output_dir, step=5, max_preview=8, dedup_threshold=DEDUP_THRESHOLD,
+                   max_run=DEDUP_MAX_RUN, budget=FRAME_BUDGET, plan=None, stats=None):
     """
     Extract frames from a video at every `step` frames.
     Yields the saved frame path for live preview.
+    Long videos keep at most `budget` of those frames, chosen by plan_frames;
+    pass its result as `plan` to run the scoring pass elsewhere (e.g. off the
+    event loop). Near-duplicates of the last kept frame are skipped before they
+    reach face detection. When a `stats` dict is passed it receives
+    skipped_duplicates and candidates.
     """
     os.makedirs(output_dir, exist_ok=True)
+    keep, candidates = plan if plan is not None else plan_frames(video_path, step, budget)
     cap = cv2.VideoCapture(video_path)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
     idx = 0
     saved = 0
+    last_hash = None
+    run = 0
+    if stats is not None:
+        stats.setdefault("skipped_duplicates", 0)
+        stats["candidates"] = candidates
 
     while True:
-        ret, frame = cap.read()
+        with timed("decode_frame", FRAME_DECODE_SECONDS):
+            ret = cap.grab()
         if not ret:
             break
-        if idx % step == 0:
+        FRAMES_DECODED.inc()
+        if idx % step == 0 and (keep is None or idx in keep):
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            if dedup_threshold > 0:
+                h = dhash(frame)
+                if last_hash is not None and run < max_run and bin(h ^ last_hash).count("1") < dedup_threshold:
+                    run += 1
+                    FRAMES_SKIPPED_DUPLICATE.inc()
+                    if stats is not None:
+                        stats["skipped_duplicates"] += 1
+                    idx += 1
+                    continue
+                last_hash = h
+                run = 0
             path = os.path.join(output_dir, f"frame_{saved:05d}.jpg")
-            cv2.imwrite(path, frame)
+            with timed("write_frame"):
+                cv2.imwrite(path, frame)
+            FRAMES_SAVED.inc()
             saved += 1
             yield path  # <-- yield for streaming
         idx += 1
@@ -1,7 +1,9 @@
 import os
+import time
 import torch
 from torchvision import transforms
 from PIL import Image
+from utils.metrics import timed, batch_bucket, CROPS_SCORED, CROP_SCORE_SECONDS, MODEL_FORWARD_SECONDS
 
 val_transform = transforms.Compose([
     transforms.Resize((224, 224)),
@@ -9,6 +11,16 @@ val_transform = transforms.Compose([
     transforms.Normalize(mean=[0.485,0.456,0.406], std=[0.229,0.224,0.225])
 ])
 
+# Calibration (temperature scaling + FAKE probability threshold), see the README and scripts/evaluate.py
+TEMPERATURE = float(os.environ.get("MODEL_TEMPERATURE", "1.58"))
+FAKE_THRESHOLD = float(os.environ.get("FAKE_THRESHOLD", "0.58"))
+
+def label_from_probs(real_prob, fake_prob):
+    """Declare FAKE at or above FAKE_THRESHOLD, otherwise REAL, with that class's probability."""
+    if fake_prob >= FAKE_THRESHOLD:
+        return {"prediction": "FAKE", "confidence": float(fake_prob)}
+    return {"prediction": "REAL", "confidence": float(real_prob)}
+
 def predict_from_faces(model, faces_dir, device):
     faces = [os.path.join(faces_dir,f) for f in os.listdir(faces_dir) if f.endswith(".jpg")]
     if not faces:
@@ -16,49 +28,56 @@ def predict_from_faces(model, faces_dir, device):
 
     model.eval()
     inputs = []
-    for fpath in faces:
-        img = Image.open(fpath).convert("RGB")
-        inputs.append(val_transform(img))
-    inputs = torch.stack(inputs).to(device)
-    # Temperature scaling and thresholding
-    T = 1.58
-    FAKE_THRESHOLD = 0.58
-    with torch.no_grad():
+    with timed("load_crops", n=len(faces)):
+        for fpath in faces:
+            img = Image.open(fpath).convert("RGB")
+            inputs.append(val_transform(img))
+        inputs = torch.stack(inputs).to(device)
+    with torch.no_grad(), timed("model_forward", MODEL_FORWARD_SECONDS, batch_size=batch_bucket(len(faces))):
         outputs = model(inputs.unsqueeze(0))  # batch_size=1, logits
         # apply temperature scaling: divide logits by T before softmax
-        logits_scaled = outputs / T
-        probs = torch.softmax(logits_scaled, dim=1)
+        probs = torch.softmax(outputs / TEMPERATURE, dim=1)
         # compute per-class probabilities
         real_prob = probs[0, 0].item()
         fake_prob = probs[0, 1].item()
-        # Use threshold for declaring FAKE, otherwise REAL
-        if fake_prob >= FAKE_THRESHOLD:
-            label = "FAKE"
-            conf = fake_prob
-        else:
-            label = "REAL"
-            conf = real_prob
-    return {"prediction": label, "confidence": float(conf)}
+    return label_from_probs(real_prob, fake_prob)
 
 
 def predict_image(model, image_path, device):
     """Predict a single face crop using the video model with sequence length 1."""
     model.eval()
+    t0 = time.perf_counter()
     img = Image.open(image_path).convert("RGB")
     x = val_transform(img).unsqueeze(0).unsqueeze(0).to(device)  # [1,1,3,224,224]
     with torch.no_grad():
-        logits = model(x)
+        with timed("model_forward", MODEL_FORWARD_SECONDS, batch_size="1"):
+            logits = model(x)
         # Temperature scaling and thresholding
-        T = 1.58
-        FAKE_THRESHOLD = 0.58
-        logits_scaled = logits / T
-        probs = torch.softmax(logits_scaled, dim=1)
+        probs = torch.softmax(logits / TEMPERATURE, dim=1)
         real_prob = probs[0, 0].item()
         fake_prob = probs[0, 1].item()
-        if fake_prob >= FAKE_THRESHOLD:
-            label = "FAKE"
-            conf = fake_prob
-        else:
-            label = "REAL"
-            conf = real_prob
-    return {"prediction": label, "confidence": float(conf)}
+    CROPS_SCORED.inc()
+    CROP_SCORE_SECONDS.observe(time.perf_counter() - t0)
+    return label_from_probs(real_prob, fake_prob)
+
+
+def predict_images(model, image_paths, device):
+    """Score many face crops in one forward pass ([N,1,3,224,224], sequence length 1 each)."""
+    if not image_paths:
+        return []
+    model.eval()
+    t0 = time.perf_counter()
+    with timed("load_crops", n=len(image_paths)):
+        x = torch.stack([val_transform(Image.open(p).convert("RGB")) for p in image_paths])
+        x = x.unsqueeze(1).to(device)
+    with torch.no_grad():
+        with timed("model_forward", MODEL_FORWARD_SECONDS, batch_size=batch_bucket(len(image_paths))):
+            logits = model(x)
+        # Temperature scaling and thresholding
+        probs = torch.softmax(logits / TEMPERATURE, dim=1).cpu().tolist()
+    preds = [label_from_probs(real_prob, fake_prob) for real_prob, fake_prob in probs]
+    CROPS_SCORED.inc(len(image_paths))
+    elapsed = time.perf_counter() - t0
+    for _ in image_paths:
+        CROP_SCORE_SECONDS.observe(elapsed / len(image_paths))
+    return preds
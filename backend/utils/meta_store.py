@@ -0,0 +1,188 @@
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from utils.session_store import connect_sqlite
+
+# Indexed copies of the most queried fields; everything else lives in `data`
+_COLUMNS = ("status", "stage", "started_at", "ended_at")
+
+
+class MetaStore:
+    """Durable per-session metadata (status, stages, timings, result) in SQLite.
+
+    Each update is a single IMMEDIATE transaction, so partial updates from
+    several workers never lose each other's fields.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        with self._lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS session_meta (
+                    session_id TEXT PRIMARY KEY,
+                    status TEXT,
+                    stage TEXT,
+                    started_at REAL,
+                    ended_at REAL,
+                    updated_at REAL NOT NULL,
+                    data TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS session_meta_status ON session_meta(status, started_at);
+                CREATE INDEX IF NOT EXISTS session_meta_started ON session_meta(started_at);
+                CREATE TABLE IF NOT EXISTS batches (
+                    batch_id TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    data TEXT NOT NULL
+                );
+                """
+            )
+
+    def _read(self, sid: str) -> Dict[str, Any]:
+        row = self._conn.execute("SELECT data FROM session_meta WHERE session_id = ?", (sid,)).fetchone()
+        if not row:
+            return {}
+        try:
+            return json.loads(row[0])
+        except Exception:
+            return {}
+
+    def _write(self, sid: str, m: Dict[str, Any]) -> None:
+        self._conn.execute(
+            "INSERT INTO session_meta(session_id, status, stage, started_at, ended_at, updated_at, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(session_id) DO UPDATE SET "
+            "status = excluded.status, stage = excluded.stage, started_at = excluded.started_at, "
+            "ended_at = excluded.ended_at, updated_at = excluded.updated_at, data = excluded.data",
+            (sid, *[m.get(c) for c in _COLUMNS], time.time(), json.dumps(m, default=str)),
+        )
+
+    def _transaction(self, sid: str, mutate) -> Dict[str, Any]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                m = self._read(sid)
+                mutate(m)
+                m.setdefault("session_id", sid)
+                self._write(sid, m)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return m
+
+    def load(self, sid: str) -> Dict[str, Any]:
+        with self._lock:
+            return self._read(sid)
+
+    def update(self, sid: str, **updates) -> Dict[str, Any]:
+        return self._transaction(sid, lambda m: m.update(updates))
+
+    def update_if(self, sid: str, statuses, **updates) -> bool:
+        """Apply `updates` only while the session's status is one of `statuses`; returns whether it did."""
+        applied = []
+
+        def mutate(m):
+            if m.get("status") in statuses:
+                m.update(updates)
+                applied.append(True)
+        self._transaction(sid, mutate)
+        return bool(applied)
+
+    def touch(self, sid: str, min_interval: float = 60.0) -> None:
+        """Record a read of the session (last_accessed_at) for LRU eviction; at most one write per `min_interval`."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE session_meta SET data = json_set(data, '$.last_accessed_at', ?) "
+                "WHERE session_id = ? AND COALESCE(json_extract(data, '$.last_accessed_at'), 0) < ?",
+                (now, sid, now - min_interval),
+            )
+
+    def set_stage(self, sid: str, stage: Optional[str], status: str) -> Dict[str, Any]:
+        """Record a stage transition; stage=None applies it to the current stage."""
+        def mutate(m):
+            now = time.time()
+            name = stage or m.get("stage", "unknown")
+            stages = m.get("stages", {})
+            s = stages.get(name, {})
+            if status == "running":
+                s["started_at"] = now
+            if status in ("done", "error", "canceled"):
+                s["ended_at"] = now
+            s["status"] = status
+            stages[name] = s
+            m["stages"] = stages
+            m["stage"] = name
+            if status in ("error", "canceled"):
+                m["status"] = status
+                m["ended_at"] = now
+        return self._transaction(sid, mutate)
+
+    def delete(self, sid: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM session_meta WHERE session_id = ?", (sid,))
+
+    def list(self, status: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+             limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
+        """Sessions ordered newest first, filtered on the indexed columns."""
+        where, args = [], []
+        if status:
+            where.append("status = ?")
+            args.append(status)
+        if since is not None:
+            where.append("started_at >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("started_at < ?")
+            args.append(until)
+        sql = "SELECT data FROM session_meta"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY started_at DESC LIMIT ? OFFSET ?"
+        args += [int(limit), int(offset)]
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        out = []
+        for (data,) in rows:
+            try:
+                out.append(json.loads(data))
+            except Exception:
+                continue
+        return out
+
+    def save_batch(self, batch_id: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO batches(batch_id, created_at, data) VALUES (?, ?, ?)",
+                (batch_id, data.get("created_at") or time.time(), json.dumps(data, default=str)),
+            )
+
+    def load_batch(self, batch_id: str) -> Dict[str, Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+        if not row:
+            return {}
+        try:
+            return json.loads(row[0])
+        except Exception:
+            return {}
+
+    def load_many(self, sids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Metadata for several sessions in one query."""
+        out: Dict[str, Dict[str, Any]] = {}
+        for i in range(0, len(sids), 500):
+            chunk = sids[i:i + 500]
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT session_id, data FROM session_meta WHERE session_id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+            for sid, data in rows:
+                try:
+                    out[sid] = json.loads(data)
+                except Exception:
+                    continue
+        return out
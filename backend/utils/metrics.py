@@ -0,0 +1,214 @@
+"""Minimal Prometheus-style metrics (text exposition format 0.0.4).
+
+Metrics are per process; with several workers each one reports its own view.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    body = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in items)
+    return "{" + body + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help):
+        super().__init__(name, help)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Gauge set explicitly or read from `fn` at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name, help, fn: Optional[Callable[[], float]] = None):
+        super().__init__(name, help)
+        self.fn = fn
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def samples(self):
+        if self.fn is not None:
+            try:
+                return [f"{self.name} {_fmt_value(self.fn())}"]
+            except Exception:
+                return []
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                # per-bucket counts, then sum and count
+                s = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[i] += 1
+                    break
+            s[-2] += value
+            s[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(s)) for k, s in self._series.items()]
+        out = []
+        for key, s in items:
+            cumulative = 0.0
+            for b, c in zip(self.buckets, s):
+                cumulative += c
+                out.append(f"{self.name}_bucket{_fmt_labels(key, ('le', _fmt_value(b)))} {_fmt_value(cumulative)}")
+            out.append(f"{self.name}_bucket{_fmt_labels(key, ('le', '+Inf'))} {_fmt_value(s[-1])}")
+            out.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(s[-2])}")
+            out.append(f"{self.name}_count{_fmt_labels(key)} {_fmt_value(s[-1])}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+# Callbacks run after every timed() block: hook(name, labels, start, wall_seconds, cpu_seconds)
+_timing_hooks: List[Callable] = []
+
+
+def add_timing_hook(fn: Callable) -> None:
+    _timing_hooks.append(fn)
+
+
+@contextmanager
+def timed(name: str, histogram: Optional[Histogram] = None, **labels):
+    """Time a block (wall and thread CPU), feed `histogram` and the timing hooks."""
+    start = time.time()
+    t0 = time.perf_counter()
+    c0 = time.thread_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - t0
+        cpu = time.thread_time() - c0
+        if histogram is not None:
+            histogram.observe(wall, **labels)
+        for hook in _timing_hooks:
+            try:
+                hook(name, labels, start, wall, cpu)
+            except Exception:
+                pass
+
+
+def batch_bucket(n: int) -> str:
+    """Collapse a batch size to the next power of two to keep label cardinality low."""
+    b = 1
+    while b < n:
+        b *= 2
+    return str(b)
+
+
+def _rss_bytes() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return float(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    # ru_maxrss is peak, not current, but it is all macOS offers
+    return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+# --- Pipeline metrics ---
+FRAMES_DECODED = REGISTRY.register(Counter("dfscan_frames_decoded_total", "Video frames decoded by extract_frames"))
+FRAMES_SAVED = REGISTRY.register(Counter("dfscan_frames_saved_total", "Sampled frames written to disk"))
+FRAMES_SKIPPED_DUPLICATE = REGISTRY.register(Counter("dfscan_frames_skipped_duplicate_total", "Sampled frames dropped as near-duplicates"))
+FRAME_DECODE_SECONDS = REGISTRY.register(Histogram("dfscan_frame_decode_seconds", "Time to decode one video frame"))
+HOG_SECONDS = REGISTRY.register(Histogram("dfscan_hog_detect_seconds", "HOG face detection time per frame"))
+HOG_SECONDS_PER_MP = REGISTRY.register(Histogram(
+    "dfscan_hog_detect_seconds_per_megapixel", "HOG face detection time per megapixel of the detection image"))
+CROPS_SCORED = REGISTRY.register(Counter("dfscan_crops_scored_total", "Face crops scored by predict_image"))
+CROP_SCORE_SECONDS = REGISTRY.register(Histogram("dfscan_crop_score_seconds", "Load, transform and forward time per crop"))
+MODEL_FORWARD_SECONDS = REGISTRY.register(Histogram(
+    "dfscan_model_forward_seconds", "Model forward latency, labelled by frames per forward (rounded up to a power of two)"))
+SSE_ENCODE_SECONDS = REGISTRY.register(Histogram("dfscan_sse_encode_seconds", "Time to encode one SSE status event"))
+SSE_BYTES = REGISTRY.register(Counter("dfscan_sse_bytes_total", "Bytes of SSE status payload sent"))
+SSE_EVENTS = REGISTRY.register(Counter("dfscan_sse_events_total", "SSE status events sent"))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "dfscan_stage_seconds", "Wall time per scan stage", buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)))
+STAGE_TIMEOUTS = REGISTRY.register(Counter("dfscan_stage_timeouts_total", "Scans aborted by a stage timeout"))
+SCANS_CANCELED = REGISTRY.register(Counter("dfscan_scans_canceled_total", "Cancel requests received"))
+SCANS_FINISHED = REGISTRY.register(Counter("dfscan_scans_finished_total", "Scans finished, by final status"))
+PROCESS_RSS = REGISTRY.register(Gauge("process_resident_memory_bytes", "Resident memory of this worker", fn=_rss_bytes))
+PROCESS_START = REGISTRY.register(Gauge("process_start_time_seconds", "Start time of this worker since the epoch"))
+PROCESS_START.set(time.time())
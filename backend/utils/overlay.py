@@ -0,0 +1,157 @@
+import os
+import shutil
+import subprocess
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import cv2
+
+from utils.metrics import timed
+
+# Minimum gap between rendered previews; the SSE stream polls every 0.25s and only shows the latest
+PREVIEW_INTERVAL_SECONDS = float(os.environ.get("PREVIEW_INTERVAL_SECONDS", "0.25"))
+ANNOTATED_FPS = float(os.environ.get("ANNOTATED_FPS", "5"))
+ANNOTATED_CRF = int(os.environ.get("ANNOTATED_CRF", "28"))
+ANNOTATED_FILENAME = "annotated.mp4"
+
+Box = Tuple[int, int, int, int]
+
+
+def draw_overlay(img, boxes: Sequence[Box], preds: Sequence[Dict[str, Any]]):
+    """Draw each face box with its confidence (red FAKE, green REAL) onto `img` in place."""
+    for (top, right, bottom, left), pred in zip(boxes, preds):
+        label = str(pred.get("prediction", "")).upper()
+        conf_val = float(pred.get("confidence", 0.0) or 0.0)
+        color = (0, 0, 255) if label == "FAKE" else (0, 200, 0)
+        cv2.rectangle(img, (left, top), (right, bottom), color, 2)
+        text = f"Conf {conf_val:.2f}"
+        (tw, th), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+        tx, ty = left, max(0, top - th - 6)
+        cv2.rectangle(img, (tx - 2, ty - th - 4), (tx + tw + 2, ty + 2), color, -1)
+        cv2.putText(img, text, (tx, ty), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2, cv2.LINE_AA)
+    return img
+
+
+class AnnotatedVideoWriter:
+    """Streams frames into an MP4: ffmpeg (libx264 over a rawvideo pipe) when installed, cv2 mp4v otherwise.
+
+    The size is fixed by the first frame; later frames of another size are
+    resized. The file is written under a temporary name and only renamed to
+    `path` by close(), so a failed scan never leaves a truncated video.
+    """
+
+    def __init__(self, path: str, fps: float = ANNOTATED_FPS, crf: int = ANNOTATED_CRF):
+        self.path = path
+        self.fps = fps
+        self.crf = crf
+        self.frames = 0
+        self._tmp = os.path.splitext(path)[0] + ".part.mp4"
+        self._size: Optional[Tuple[int, int]] = None
+        self._proc: Optional[subprocess.Popen] = None
+        self._writer = None
+
+    def _open(self, w: int, h: int) -> None:
+        # yuv420p needs even dimensions
+        w, h = w - w % 2 or 2, h - h % 2 or 2
+        self._size = (w, h)
+        if shutil.which("ffmpeg"):
+            cmd = [
+                "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+                "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{w}x{h}", "-r", str(self.fps), "-i", "-",
+                "-c:v", "libx264", "-preset", "veryfast", "-crf", str(self.crf), "-pix_fmt", "yuv420p",
+                "-movflags", "+faststart", "-f", "mp4", self._tmp,
+            ]
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        else:
+            self._writer = cv2.VideoWriter(self._tmp, cv2.VideoWriter_fourcc(*"mp4v"), self.fps, (w, h))
+
+    def write(self, img) -> None:
+        h, w = img.shape[:2]
+        if self._size is None:
+            self._open(w, h)
+        if (w, h) != self._size:
+            img = cv2.resize(img, self._size, interpolation=cv2.INTER_AREA)
+        with timed("encode_annotated"):
+            if self._proc is not None:
+                self._proc.stdin.write(img.tobytes())
+            else:
+                self._writer.write(img)
+        self.frames += 1
+
+    def close(self) -> Optional[str]:
+        """Finish the file; returns its path, or None if nothing was written or encoding failed."""
+        ok = True
+        if self._proc is not None:
+            try:
+                self._proc.stdin.close()
+            except OSError:
+                ok = False
+            ok = self._proc.wait() == 0 and ok
+        elif self._writer is not None:
+            self._writer.release()
+        if not self.frames or not ok:
+            self.abort()
+            return None
+        os.replace(self._tmp, self.path)
+        return self.path
+
+    def abort(self) -> None:
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        elif self._writer is not None:
+            self._writer.release()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+
+class OverlayRenderer:
+    """Draws prediction overlays once per frame, on the in-memory frame.
+
+    Only frames that will be previewed are drawn and written to `vis_dir`:
+    at most one per `interval` seconds, plus the last frame of the scan
+    (flush). With an `export` writer every frame is drawn once and streamed
+    into the annotated video as well.
+    """
+
+    def __init__(self, vis_dir: str, interval: float = PREVIEW_INTERVAL_SECONDS,
+                 export: Optional[AnnotatedVideoWriter] = None):
+        self.vis_dir = vis_dir
+        self.interval = interval
+        self.export = export
+        self.rendered = 0
+        self._last = 0.0
+        self._pending = None
+        os.makedirs(vis_dir, exist_ok=True)
+
+    def add(self, name: str, img, boxes: Sequence[Box], preds: Sequence[Dict[str, Any]]) -> Optional[str]:
+        """Overlay one frame; returns the preview path when it was written, else None."""
+        drawn = False
+        if self.export is not None:
+            draw_overlay(img, boxes, preds)
+            drawn = True
+            self.export.write(img)
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            # Keep the latest skipped frame so the scan can still end on it
+            self._pending = (name, img, boxes, preds, drawn)
+            return None
+        self._last = now
+        self._pending = None
+        return self._write(name, img, boxes, preds, drawn)
+
+    def flush(self) -> Optional[str]:
+        """Write the last frame if it was skipped, so the final preview matches the end of the scan."""
+        if self._pending is None:
+            return None
+        pending, self._pending = self._pending, None
+        return self._write(*pending)
+
+    def _write(self, name, img, boxes, preds, drawn) -> str:
+        if not drawn:
+            draw_overlay(img, boxes, preds)
+        path = os.path.join(self.vis_dir, name)
+        with timed("write_vis"):
+            cv2.imwrite(path, img)
+        self.rendered += 1
+        return path
@@ -0,0 +1,58 @@
+import os
+import shutil
+import time
+
+from utils.frame_utils import extract_frames
+from utils.face_utils import detect_and_crop_faces
+from utils.inference import predict_from_faces, predict_image
+
+
+def scan_video_file(model, video_path, work_dir, device, step=5, score_crops=False, keep_files=False):
+    """
+    Run the scan pipeline on one video without the web server.
+    Frames, previews and crops go to work_dir (removed afterwards unless
+    keep_files). Returns the verdict with counts and per-stage timings.
+    Raises ValueError when no frame could be decoded.
+    """
+    frames_dir = os.path.join(work_dir, "frames")
+    vis_dir = os.path.join(work_dir, "vis")
+    crops_dir = os.path.join(work_dir, "crops")
+    timings = {}
+    try:
+        t0 = time.perf_counter()
+        frames = sum(1 for _ in extract_frames(video_path, frames_dir, step=step))
+        timings["frames_s"] = time.perf_counter() - t0
+        if frames == 0:
+            # Same rule as the API: no frames means no verdict, not a REAL at confidence 0
+            raise ValueError("No frames could be decoded from the video")
+
+        t0 = time.perf_counter()
+        crops = []
+        # Box previews are only worth drawing when the files are kept for inspection
+        for _, crop_paths, _ in detect_and_crop_faces(frames_dir, vis_dir if keep_files else None, crops_dir):
+            crops.extend(crop_paths)
+        timings["faces_s"] = time.perf_counter() - t0
+
+        fake_crops = None
+        if score_crops:
+            t0 = time.perf_counter()
+            fake_crops = sum(1 for cp in crops if predict_image(model, cp, device)["prediction"] == "FAKE")
+            timings["scoring_s"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        result = predict_from_faces(model, crops_dir, device)
+        timings["inference_s"] = time.perf_counter() - t0
+    finally:
+        if not keep_files:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    out = {
+        "prediction": result["prediction"],
+        "confidence": result["confidence"],
+        "frames": frames,
+        "crops": len(crops),
+        **{k: round(v, 4) for k, v in timings.items()},
+    }
+    if fake_crops is not None:
+        out["fake_crops"] = fake_crops
+    return out
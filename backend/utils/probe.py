@@ -0,0 +1,199 @@
+import json
+import math
+import os
+import shutil
+import subprocess
+import threading
+import time
+from typing import Any, Dict, Optional
+
+FFPROBE_BIN = os.environ.get("FFPROBE_BIN", "ffprobe")
+PROBE_TIMEOUT_SECONDS = float(os.environ.get("PROBE_TIMEOUT_SECONDS", "10"))
+THROUGHPUT_FILENAME = "throughput.json"
+# Seconds per unit until this host has timed real scans:
+# decode per decoded frame-megapixel, faces per sampled frame-megapixel, inference per crop
+DEFAULT_COSTS = {
+    "frames": float(os.environ.get("COST_DECODE_SEC_PER_MP", "0.004")),
+    "faces": float(os.environ.get("COST_FACES_SEC_PER_MP", "0.35")),
+    "inference": float(os.environ.get("COST_INFERENCE_SEC_PER_CROP", "0.03")),
+}
+DEFAULT_CROPS_PER_FRAME = 1.0
+# Weight of the newest scan in the moving averages
+THROUGHPUT_ALPHA = float(os.environ.get("THROUGHPUT_ALPHA", "0.3"))
+
+
+def _fraction(value) -> float:
+    """ffprobe rates look like "30000/1001"; "0/0" means unknown."""
+    try:
+        num, _, den = str(value).partition("/")
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def _ffprobe(path: str) -> Optional[Dict[str, Any]]:
+    cmd = [
+        FFPROBE_BIN, "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=codec_name,width,height,avg_frame_rate,r_frame_rate,nb_frames,duration"
+                         ":stream_tags=rotate:stream_side_data=rotation:format=duration,bit_rate",
+        "-of", "json", path,
+    ]
+    try:
+        out = subprocess.run(cmd, capture_output=True, timeout=PROBE_TIMEOUT_SECONDS, check=True).stdout
+        data = json.loads(out or b"{}")
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return None
+    streams = data.get("streams") or []
+    if not streams:
+        return None
+    st, fmt = streams[0], data.get("format") or {}
+    fps = _fraction(st.get("avg_frame_rate")) or _fraction(st.get("r_frame_rate"))
+    duration = float(st.get("duration") or fmt.get("duration") or 0.0)
+    rotation = int(float((st.get("tags") or {}).get("rotate") or 0))
+    for sd in st.get("side_data_list") or []:
+        if "rotation" in sd:
+            rotation = int(float(sd["rotation"]))
+    frame_count = int(st.get("nb_frames") or 0) or int(round(duration * fps))
+    return {
+        "source": "ffprobe",
+        "codec": st.get("codec_name"),
+        "width": int(st.get("width") or 0),
+        "height": int(st.get("height") or 0),
+        "fps": round(fps, 3),
+        "duration": round(duration, 3),
+        "frame_count": frame_count,
+        "rotation": rotation % 360,
+        "bit_rate": int(fmt.get("bit_rate") or 0) or None,
+    }
+
+
+def _cv2_probe(path: str) -> Optional[Dict[str, Any]]:
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return None
+        fps = float(cap.get(cv2.CAP_PROP_FPS) or 0.0)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC) or 0)
+        codec = "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ").lower() or None
+        rotation = int(cap.get(cv2.CAP_PROP_ORIENTATION_META) or 0) if hasattr(cv2, "CAP_PROP_ORIENTATION_META") else 0
+        return {
+            "source": "cv2",
+            "codec": codec,
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0),
+            "fps": round(fps, 3),
+            "duration": round(frame_count / fps, 3) if fps > 0 else 0.0,
+            "frame_count": frame_count,
+            "rotation": rotation % 360,
+            "bit_rate": None,
+        }
+    finally:
+        cap.release()
+
+
+def probe_video(path: str) -> Dict[str, Any]:
+    """
+    Container metadata of a video without decoding it: codec, width/height
+    (as displayed, i.e. swapped for 90/270 rotation), fps, duration,
+    frame_count, rotation. Uses ffprobe when installed, cv2 otherwise.
+    Raises ValueError when the file has no readable video stream.
+    """
+    t0 = time.perf_counter()
+    info = _ffprobe(path) if shutil.which(FFPROBE_BIN) else None
+    info = info or _cv2_probe(path)
+    if not info or not info["width"] or not info["height"]:
+        raise ValueError("No readable video stream")
+    if info["rotation"] in (90, 270):
+        info["width"], info["height"] = info["height"], info["width"]
+    info["size_bytes"] = os.path.getsize(path)
+    info["probe_seconds"] = round(time.perf_counter() - t0, 4)
+    return info
+
+
+class ThroughputModel:
+    """Per-stage cost of a scan on this host, learned from finished scans.
+
+    Each stage has a moving average of seconds per unit (see DEFAULT_COSTS),
+    plus the average number of crops per sampled frame. The averages are
+    saved to a JSON file so a restarted worker keeps its calibration.
+    """
+
+    def __init__(self, path=None, alpha: float = THROUGHPUT_ALPHA):
+        self.path = str(path) if path else None
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self.costs = dict(DEFAULT_COSTS)
+        self.crops_per_frame = DEFAULT_CROPS_PER_FRAME
+        self.samples = {stage: 0 for stage in DEFAULT_COSTS}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    saved = json.load(f)
+                self.costs.update({k: float(v) for k, v in saved.get("costs", {}).items() if k in self.costs})
+                self.samples.update({k: int(v) for k, v in saved.get("samples", {}).items() if k in self.samples})
+                self.crops_per_frame = float(saved.get("crops_per_frame", self.crops_per_frame))
+            except (OSError, ValueError, TypeError, AttributeError):
+                pass
+
+    def observe(self, stage: str, seconds: float, units: float) -> None:
+        """Record that `stage` took `seconds` for `units` (frame-megapixels or crops)."""
+        if stage not in self.costs or units <= 0 or seconds <= 0:
+            return
+        with self._lock:
+            rate = seconds / units
+            # The first real measurement replaces the built-in guess outright
+            a = 1.0 if self.samples[stage] == 0 else self.alpha
+            self.costs[stage] = (1 - a) * self.costs[stage] + a * rate
+            self.samples[stage] += 1
+        self._save()
+
+    def observe_crops(self, frames: int, crops: int) -> None:
+        if frames <= 0:
+            return
+        with self._lock:
+            self.crops_per_frame = (1 - self.alpha) * self.crops_per_frame + self.alpha * (crops / frames)
+        self._save()
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            data = {"costs": dict(self.costs), "samples": dict(self.samples), "crops_per_frame": self.crops_per_frame}
+        try:
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+    def estimate(self, probe: Dict[str, Any], step: int = 5, budget: Optional[int] = None) -> Dict[str, Any]:
+        """Predicted seconds per stage for a probed video, with the frame counts they assume (budget: FRAME_BUDGET)."""
+        if budget is None:
+            from utils.frame_utils import FRAME_BUDGET
+            budget = FRAME_BUDGET
+        mp = probe["width"] * probe["height"] / 1_000_000.0
+        decoded = int(probe.get("frame_count") or 0)
+        candidates = int(math.ceil(decoded / step))
+        sampled = min(candidates, budget) if budget > 0 else candidates
+        # Over budget, plan_frames decodes the video once more to score changes
+        passes = 2 if budget > 0 and candidates > budget else 1
+        crops = sampled * self.crops_per_frame
+        with self._lock:
+            frames_s = decoded * passes * mp * self.costs["frames"]
+            faces_s = sampled * mp * self.costs["faces"]
+            inference_s = crops * self.costs["inference"]
+            calibrated = all(self.samples.values())
+        return {
+            "frames_s": round(frames_s, 2),
+            "faces_s": round(faces_s, 2),
+            "inference_s": round(inference_s, 2),
+            "total_s": round(frames_s + faces_s + inference_s, 2),
+            "decoded_frames": decoded * passes,
+            "sampled_frames": sampled,
+            "expected_crops": int(round(crops)),
+            "calibrated": calibrated,
+        }
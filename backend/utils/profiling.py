@@ -0,0 +1,123 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from utils.metrics import add_timing_hook
+
+TRACE_FILENAME = "trace.json"
+TORCH_PROFILE_FILENAME = "torch_profile.txt"
+
+_current: contextvars.ContextVar[Optional["Tracer"]] = contextvars.ContextVar("dfscan_tracer", default=None)
+
+
+class Tracer:
+    """Collects spans for one scan and writes them as a Chrome-trace / Perfetto JSON.
+
+    Spans come from every utils.metrics.timed() block executed while the
+    tracer is active in the current context, plus explicit span() blocks.
+    """
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.pid = os.getpid()
+        self._events: List[Dict[str, Any]] = []
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, cat: str, start: float, wall: float, cpu: Optional[float] = None, **args) -> None:
+        t = threading.current_thread()
+        if cpu is not None:
+            args["cpu_ms"] = round(cpu * 1000.0, 3)
+        ev = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": int(start * 1e6),
+            "dur": max(1, int(wall * 1e6)),
+            "pid": self.pid,
+            "tid": t.ident,
+            "args": {k: v if isinstance(v, (int, float, bool)) else str(v) for k, v in args.items()},
+        }
+        with self._lock:
+            self._events.append(ev)
+            self._threads.setdefault(t.ident, t.name)
+
+    def to_json(self) -> Dict[str, Any]:
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        meta = [{"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": f"df-scan {self.session_id}"}}]
+        meta += [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                 for tid, name in threads.items()]
+        return {"traceEvents": meta + events, "displayTimeUnit": "ms", "otherData": {"session_id": self.session_id}}
+
+    def write(self, path) -> str:
+        path = str(path)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.to_json(), f)
+        os.replace(tmp, path)
+        return path
+
+
+def activate(tracer: Optional[Tracer]) -> contextvars.Token:
+    return _current.set(tracer)
+
+
+def deactivate(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+
+def current() -> Optional[Tracer]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, cat: str = "stage", **args):
+    """Explicit span; a no-op unless a tracer is active.
+
+    CPU time is measured on the calling thread, so for spans that await it
+    also includes other coroutines that ran in between.
+    """
+    tracer = _current.get()
+    if tracer is None:
+        yield
+        return
+    start = time.time()
+    t0 = time.perf_counter()
+    c0 = time.thread_time()
+    try:
+        yield
+    finally:
+        tracer.add(name, cat, start, time.perf_counter() - t0, time.thread_time() - c0, **args)
+
+
+def _timing_hook(name, labels, start, wall, cpu):
+    tracer = _current.get()
+    if tracer is not None:
+        tracer.add(name, "pipeline", start, wall, cpu, **labels)
+
+
+add_timing_hook(_timing_hook)
+
+
+def run_with_torch_profiler(fn, out_path, row_limit: int = 30):
+    """Call fn() under torch.profiler and write the operator summary table to out_path."""
+    import torch
+
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    with torch.profiler.profile(activities=activities, record_shapes=True) as prof:
+        result = fn()
+    try:
+        table = prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=row_limit)
+        with open(out_path, "w") as f:
+            f.write(table)
+    except Exception:
+        pass
+    return result
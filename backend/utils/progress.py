@@ -0,0 +1,97 @@
+import os
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional
+
+# Recent preview items kept per kind; the SSE payload never shows more
+PREVIEW_ITEMS = int(os.environ.get("PREVIEW_ITEMS", "8"))
+
+
+class ScanProgress:
+    """Live progress of one scan, as published to the session store and SSE.
+
+    Sizes stay constant however long the video is: frames, previews and
+    crops are counted, and only the last PREVIEW_ITEMS paths of each are
+    kept in ring buffers for the live preview. `version` increases on every
+    change so the stream can tell whether anything new happened.
+    """
+
+    __slots__ = (
+        "status", "stage", "done", "prediction", "video_path", "dirs",
+        "frames", "faces", "crops", "frames_count", "frames_skipped", "faces_count", "crops_count",
+        "last_boxes", "last_preds", "frame_size", "queue_position", "eta_seconds", "estimate_seconds",
+        "version",
+    )
+
+    def __init__(self, video_path: str = "", dirs: Optional[Dict[str, str]] = None, status: str = "",
+                 stage: str = "", estimate_seconds: Optional[float] = None):
+        self.status = status
+        self.stage = stage
+        self.done = False
+        self.prediction: Optional[Dict[str, Any]] = None
+        self.video_path = video_path
+        self.dirs = dirs or {}
+        self.frames: deque = deque(maxlen=PREVIEW_ITEMS)
+        self.faces: deque = deque(maxlen=PREVIEW_ITEMS)
+        self.crops: deque = deque(maxlen=PREVIEW_ITEMS)
+        self.frames_count = 0
+        self.frames_skipped = 0
+        self.faces_count = 0
+        self.crops_count = 0
+        self.last_boxes: Optional[List] = None
+        self.last_preds: Optional[List[Dict[str, Any]]] = None
+        self.frame_size: Optional[List[int]] = None
+        self.queue_position: Optional[int] = None
+        self.eta_seconds: Optional[int] = None
+        self.estimate_seconds = estimate_seconds
+        self.version = 0
+
+    def set_status(self, status: str, stage: Optional[str] = None) -> None:
+        self.status = status
+        if stage is not None:
+            self.stage = stage
+        self.version += 1
+
+    def finish(self, status: str, prediction: Optional[Dict[str, Any]] = None) -> None:
+        self.status = status
+        if prediction is not None:
+            self.prediction = prediction
+        self.done = True
+        self.version += 1
+
+    def add_frame(self, path: str, skipped: int = 0) -> None:
+        self.frames.append(path)
+        self.frames_count += 1
+        self.frames_skipped = skipped
+        self.version += 1
+
+    def add_faces(self, vis_path: Optional[str], crop_paths: Iterable[str]) -> None:
+        """Count one analyzed frame's crops; vis_path is None when the frame was not previewed."""
+        n = 0
+        for cp in crop_paths:
+            self.crops.append(cp)
+            n += 1
+        self.faces_count += n
+        self.crops_count += n
+        if vis_path is not None:
+            self.faces.append(vis_path)
+        self.version += 1
+
+    def add_preview(self, vis_path: str) -> None:
+        self.faces.append(vis_path)
+        self.version += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {k: getattr(self, k) for k in self.__slots__}
+        for k in ("frames", "faces", "crops"):
+            d[k] = list(d[k])
+        return d
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "ScanProgress":
+        p = cls()
+        for k in cls.__slots__:
+            if k in d and k not in ("frames", "faces", "crops"):
+                setattr(p, k, d[k])
+        for k in ("frames", "faces", "crops"):
+            getattr(p, k).extend(d.get(k) or [])
+        return p
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# lazy: serve immediately and load the model in a background thread; eager: load while importing the app
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "lazy")
+MODEL_WEIGHTS = os.environ.get("MODEL_WEIGHTS", "models/production1000_temporal_model.pth")
+# Memory-map the checkpoint so worker processes share its pages (MODEL_MMAP=0 reads it into memory)
+MODEL_MMAP = os.environ.get("MODEL_MMAP", "1") == "1"
+# Warmup clip length; one forward pass allocates the kernels and buffers the first scan would otherwise pay for
+WARMUP_SEQ_LEN = int(os.environ.get("WARMUP_SEQ_LEN", "2"))
+
+log = logging.getLogger("dfscan.runtime")
+
+
+class ModelRuntime:
+    """The model and the heavy imports (torch, torchvision, cv2, dlib), loaded off the import path.
+
+    start() runs load() in a background thread so the server answers
+    /health right away; the state goes cold -> importing -> loading ->
+    warming -> ready, or failed. Scans call wait_ready() before touching the
+    model. `on_ready(runtime)` runs in the loading thread once ready.
+    """
+
+    def __init__(self, weights_path: str = MODEL_WEIGHTS, device: Optional[str] = None, mmap: bool = MODEL_MMAP,
+                 on_ready: Optional[Callable[["ModelRuntime"], None]] = None):
+        self.weights_path = weights_path
+        self.device = device
+        self.mmap = mmap
+        self.on_ready = on_ready
+        self.model = None
+        self.state = "cold"
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self._started = time.time()
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def start(self) -> None:
+        if self._thread is None and self.state == "cold":
+            self._thread = threading.Thread(target=self.load, name="model-loader", daemon=True)
+            self._thread.start()
+
+    def load(self) -> None:
+        try:
+            t0 = time.perf_counter()
+            self.state = "importing"
+            import torch
+            # Importing the pipeline modules pulls in cv2, torchvision and face_recognition/dlib
+            import utils.frame_utils, utils.face_utils, utils.inference, utils.overlay  # noqa: F401
+            self.device = self.device or ("cuda" if torch.cuda.is_available() else "cpu")
+            t1 = time.perf_counter()
+            self.timings["imports_s"] = round(t1 - t0, 3)
+
+            self.state = "loading"
+            from model import load_model
+            self.model = load_model(self.weights_path, self.device, mmap=self.mmap)
+            t2 = time.perf_counter()
+            self.timings["model_s"] = round(t2 - t1, 3)
+
+            self.state = "warming"
+            self._warmup()
+            self.timings["warmup_s"] = round(time.perf_counter() - t2, 3)
+            self.timings["total_s"] = round(time.perf_counter() - t0, 3)
+
+            if self.on_ready is not None:
+                self.on_ready(self)
+            self.state = "ready"
+            self._ready.set()
+            log.info("model ready on %s in %.2fs", self.device, self.timings["total_s"])
+        except Exception as e:
+            self.state = "failed"
+            self.error = f"{type(e).__name__}: {e}"
+            log.exception("model loading failed")
+
+    def _warmup(self) -> None:
+        import numpy as np
+        import torch
+        import face_recognition
+
+        with torch.no_grad():
+            self.model(torch.zeros(1, WARMUP_SEQ_LEN, 3, 224, 224, device=self.device))
+        # dlib builds its HOG detector on the first call
+        face_recognition.face_locations(np.zeros((64, 64, 3), dtype=np.uint8), model="hog")
+
+    async def wait_ready(self, poll: float = 0.1) -> None:
+        """Wait until the model is ready; raises RuntimeError if loading failed."""
+        while not self._ready.is_set():
+            if self.state == "failed":
+                raise RuntimeError(f"Model failed to load: {self.error}")
+            await asyncio.sleep(poll)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "state": self.state,
+            "device": self.device,
+            "mmap": self.mmap,
+            "uptime_seconds": round(time.time() - self._started, 1),
+            "timings": dict(self.timings),
+            "error": self.error,
+        }
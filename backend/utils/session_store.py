@@ -0,0 +1,372 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from utils.progress import ScanProgress
+
+# "memory" keeps everything in this process (single worker only);
+# "sqlite" shares sessions, cancel flags and the job queue between workers.
+SESSION_STORE = os.environ.get("SESSION_STORE", "memory")
+SESSION_DB = os.environ.get("SESSION_DB", "")
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", "30"))
+
+
+class JobExists(Exception):
+    """Raised by enqueue when a session already has a queued or running job."""
+
+    def __init__(self, sid: str):
+        super().__init__(f"Session {sid} is already queued or running")
+        self.sid = sid
+
+
+class QueueLimit(Exception):
+    """Raised by enqueue when the jobs do not fit under the limit of their class."""
+
+    def __init__(self, depth: int):
+        super().__init__("Queue limit reached")
+        self.depth = depth
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """Open a WAL-mode connection usable from any thread (callers serialise access)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SessionStore:
+    """Live scan progress, cancel flags and the pending-scan queue.
+
+    Implementations must be safe to call from the event loop; every method is
+    short and synchronous.
+    """
+
+    def get(self, sid: str) -> Optional[ScanProgress]:
+        raise NotImplementedError
+
+    def put(self, sid: str, session: ScanProgress) -> None:
+        raise NotImplementedError
+
+    def delete(self, sid: str) -> None:
+        """Drop the session and any queued job. A running job and its cancel
+        flag stay until the owning worker notices, stops and calls finish()."""
+        raise NotImplementedError
+
+    def request_cancel(self, sid: str) -> Optional[str]:
+        """Cancel the session's job: a queued job is dropped, a running one is
+        flagged for its worker. Returns the job's state, or None (nothing to cancel)."""
+        raise NotImplementedError
+
+    def is_canceled(self, sid: str) -> bool:
+        raise NotImplementedError
+
+    def enqueue(self, sids: List[str], priority: int = 0, limit: Optional[int] = None) -> None:
+        """Queue all of `sids` or none of them, atomically.
+
+        Raises JobExists if one already has a queued or running job, and
+        QueueLimit if the jobs already queued in the same class as `priority`
+        (see count_queued) plus these would exceed `limit`.
+        """
+        raise NotImplementedError
+
+    def claim_next(self, owner: str) -> Optional[str]:
+        """Atomically move the next queued job to running and return its id."""
+        raise NotImplementedError
+
+    def finish(self, sid: str) -> None:
+        """Drop a finished job and its cancel flag (the scan has stopped, so nobody needs it)."""
+        raise NotImplementedError
+
+    def heartbeat(self, owner: str) -> None:
+        """Record that the worker `owner` is alive."""
+        raise NotImplementedError
+
+    def reap_stale(self, max_age: float, exclude: Optional[str] = None) -> List[str]:
+        """Drop running jobs whose owner sent no heartbeat for `max_age` seconds; returns their ids."""
+        raise NotImplementedError
+
+    def queued(self) -> List[str]:
+        """Queued session ids in dispatch order."""
+        raise NotImplementedError
+
+    def count_queued(self, background: bool = False) -> int:
+        """Queued jobs of one admission class: background (priority < 0) or interactive."""
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self):
+        self._sessions: Dict[str, ScanProgress] = {}
+        self._canceled = set()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._workers: Dict[str, float] = {}
+
+    def get(self, sid):
+        return self._sessions.get(sid)
+
+    def put(self, sid, session):
+        self._sessions[sid] = session
+
+    def delete(self, sid):
+        self._sessions.pop(sid, None)
+        job = self._jobs.get(sid)
+        if job is None or job["state"] == "queued":
+            self._jobs.pop(sid, None)
+            self._canceled.discard(sid)
+
+    def request_cancel(self, sid):
+        job = self._jobs.get(sid)
+        if job is None:
+            return None
+        if job["state"] == "queued":
+            self._jobs.pop(sid, None)
+        else:
+            self._canceled.add(sid)
+        return job["state"]
+
+    def is_canceled(self, sid):
+        return sid in self._canceled
+
+    def enqueue(self, sids, priority=0, limit=None):
+        for sid in sids:
+            if sid in self._jobs:
+                raise JobExists(sid)
+        depth = self.count_queued(priority < 0)
+        if limit is not None and depth + len(sids) > limit:
+            raise QueueLimit(depth)
+        now = time.time()
+        for sid in sids:
+            self._canceled.discard(sid)
+            self._jobs[sid] = {"state": "queued", "priority": int(priority), "enqueued_at": now,
+                               "owner": None, "claimed_at": None}
+
+    def claim_next(self, owner):
+        queued = self.queued()
+        if not queued:
+            return None
+        job = self._jobs[queued[0]]
+        job["state"] = "running"
+        job["owner"] = owner
+        job["claimed_at"] = time.time()
+        return queued[0]
+
+    def finish(self, sid):
+        self._jobs.pop(sid, None)
+        self._canceled.discard(sid)
+
+    def heartbeat(self, owner):
+        self._workers[owner] = time.time()
+
+    def reap_stale(self, max_age, exclude=None):
+        cutoff = time.time() - max_age
+        stale = [sid for sid, j in self._jobs.items()
+                 if j["state"] == "running" and j["owner"] != exclude
+                 and self._workers.get(j["owner"], j["claimed_at"]) < cutoff]
+        for sid in stale:
+            self.finish(sid)
+        return stale
+
+    def queued(self):
+        items = [(sid, j) for sid, j in self._jobs.items() if j["state"] == "queued"]
+        items.sort(key=lambda kv: (-kv[1]["priority"], kv[1]["enqueued_at"]))
+        return [sid for sid, _ in items]
+
+    def count_queued(self, background=False):
+        return sum(1 for j in self._jobs.values() if j["state"] == "queued" and (j["priority"] < 0) == background)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store backed by a SQLite file shared by all workers on the host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        with self._lock:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS live_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS cancels (
+                    session_id TEXT PRIMARY KEY,
+                    requested_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS jobs (
+                    session_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    enqueued_at REAL NOT NULL,
+                    owner TEXT,
+                    claimed_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_queue ON jobs(state, priority DESC, enqueued_at);
+                CREATE TABLE IF NOT EXISTS workers (
+                    owner TEXT PRIMARY KEY,
+                    seen_at REAL NOT NULL
+                );
+                """
+            )
+
+    def get(self, sid):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM live_sessions WHERE session_id = ?", (sid,)).fetchone()
+        if not row:
+            return None
+        try:
+            return ScanProgress.from_dict(json.loads(row[0]))
+        except Exception:
+            return None
+
+    def put(self, sid, session):
+        data = json.dumps(session.to_dict(), default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO live_sessions(session_id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                (sid, data, time.time()),
+            )
+
+    def delete(self, sid):
+        with self._lock:
+            cur = self._conn
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                cur.execute("DELETE FROM live_sessions WHERE session_id = ?", (sid,))
+                cur.execute("DELETE FROM jobs WHERE session_id = ? AND state = 'queued'", (sid,))
+                if not cur.execute("SELECT 1 FROM jobs WHERE session_id = ?", (sid,)).fetchone():
+                    cur.execute("DELETE FROM cancels WHERE session_id = ?", (sid,))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def request_cancel(self, sid):
+        with self._lock:
+            cur = self._conn
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                row = cur.execute("SELECT state FROM jobs WHERE session_id = ?", (sid,)).fetchone()
+                if row and row[0] == "queued":
+                    cur.execute("DELETE FROM jobs WHERE session_id = ?", (sid,))
+                elif row:
+                    cur.execute("INSERT OR REPLACE INTO cancels(session_id, requested_at) VALUES (?, ?)",
+                                (sid, time.time()))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return row[0] if row else None
+
+    def is_canceled(self, sid):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM cancels WHERE session_id = ?", (sid,)).fetchone()
+        return row is not None
+
+    def enqueue(self, sids, priority=0, limit=None):
+        with self._lock:
+            cur = self._conn
+            # Count and insert in one write transaction so concurrent workers cannot both take the last slot
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                for i in range(0, len(sids), 500):
+                    chunk = sids[i:i + 500]
+                    row = cur.execute(
+                        f"SELECT session_id FROM jobs WHERE session_id IN ({','.join('?' * len(chunk))}) LIMIT 1", chunk
+                    ).fetchone()
+                    if row:
+                        raise JobExists(row[0])
+                op = "<" if priority < 0 else ">="
+                depth = cur.execute(f"SELECT COUNT(*) FROM jobs WHERE state = 'queued' AND priority {op} 0").fetchone()[0]
+                if limit is not None and depth + len(sids) > limit:
+                    raise QueueLimit(depth)
+                now = time.time()
+                for sid in sids:
+                    cur.execute("DELETE FROM cancels WHERE session_id = ?", (sid,))
+                    cur.execute(
+                        "INSERT INTO jobs(session_id, state, priority, enqueued_at) VALUES (?, 'queued', ?, ?)",
+                        (sid, int(priority), now),
+                    )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def claim_next(self, owner):
+        with self._lock:
+            cur = self._conn
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                row = cur.execute(
+                    "SELECT session_id FROM jobs WHERE state = 'queued' ORDER BY priority DESC, enqueued_at LIMIT 1"
+                ).fetchone()
+                if row:
+                    cur.execute(
+                        "UPDATE jobs SET state = 'running', owner = ?, claimed_at = ? WHERE session_id = ?",
+                        (owner, time.time(), row[0]),
+                    )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return row[0] if row else None
+
+    def finish(self, sid):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE session_id = ?", (sid,))
+            self._conn.execute("DELETE FROM cancels WHERE session_id = ?", (sid,))
+
+    def heartbeat(self, owner):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO workers(owner, seen_at) VALUES (?, ?)", (owner, time.time()))
+
+    def reap_stale(self, max_age, exclude=None):
+        cutoff = time.time() - max_age
+        with self._lock:
+            cur = self._conn
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                # A job claimed by a worker that never sent a heartbeat ages from its claim time
+                rows = cur.execute(
+                    "SELECT j.session_id FROM jobs j LEFT JOIN workers w ON w.owner = j.owner "
+                    "WHERE j.state = 'running' AND j.owner IS NOT ? AND COALESCE(w.seen_at, j.claimed_at) < ?",
+                    (exclude, cutoff),
+                ).fetchall()
+                for (sid,) in rows:
+                    cur.execute("DELETE FROM jobs WHERE session_id = ?", (sid,))
+                    cur.execute("DELETE FROM cancels WHERE session_id = ?", (sid,))
+                cur.execute("DELETE FROM workers WHERE seen_at < ?", (cutoff,))
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        return [r[0] for r in rows]
+
+    def queued(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT session_id FROM jobs WHERE state = 'queued' ORDER BY priority DESC, enqueued_at"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def count_queued(self, background=False):
+        op = "<" if background else ">="
+        with self._lock:
+            row = self._conn.execute(f"SELECT COUNT(*) FROM jobs WHERE state = 'queued' AND priority {op} 0").fetchone()
+        return row[0]
+
+
+def create_session_store(root) -> SessionStore:
+    """Build the store selected by SESSION_STORE; the SQLite file defaults to <root>/sessions.db."""
+    if SESSION_STORE == "sqlite":
+        return SQLiteSessionStore(SESSION_DB or os.path.join(str(root), "sessions.db"))
+    if SESSION_STORE != "memory":
+        raise ValueError(f"Unknown SESSION_STORE: {SESSION_STORE}")
+    return MemorySessionStore()
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Optional
+
+from utils.metrics import REGISTRY, Counter, Gauge, Histogram
+
+LOOP_LAG_INTERVAL = float(os.environ.get("LOOP_LAG_INTERVAL", "0.5"))
+# Lag (seconds) above which the loop counts as blocked and a stack is captured
+LOOP_BLOCK_THRESHOLD = float(os.environ.get("LOOP_BLOCK_THRESHOLD", "1.0"))
+# How long /health stays degraded after the last block
+HEALTH_DEGRADED_WINDOW = float(os.environ.get("HEALTH_DEGRADED_WINDOW", "60"))
+# Report degraded in /health at all, and whether degraded answers 503 instead of 200
+HEALTH_DEGRADE_ON_LAG = os.environ.get("HEALTH_DEGRADE_ON_LAG", "1") == "1"
+HEALTH_FAIL_ON_LAG = os.environ.get("HEALTH_FAIL_ON_LAG", "0") == "1"
+
+log = logging.getLogger("dfscan.watchdog")
+
+LOOP_LAG = REGISTRY.register(Gauge("dfscan_event_loop_lag_seconds", "Most recent event loop scheduling lag"))
+LOOP_LAG_HIST = REGISTRY.register(Histogram(
+    "dfscan_event_loop_lag_observed_seconds", "Distribution of event loop scheduling lag",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)))
+LOOP_BLOCKS = REGISTRY.register(Counter("dfscan_event_loop_blocks_total", "Times the event loop stayed blocked past the threshold"))
+
+
+class LoopWatchdog:
+    """Measures asyncio loop lag and catches whoever blocks the loop.
+
+    A coroutine on the loop sleeps `interval` and records how late it woke up.
+    A separate thread watches that heartbeat; when it goes stale for longer
+    than `threshold` it snapshots the loop thread's stack while the block is
+    still happening and asks `describe` which session/stage owns the task.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_BLOCK_THRESHOLD,
+                 describe: Optional[Callable[[Optional[asyncio.Task]], Dict[str, Any]]] = None):
+        self.interval = interval
+        self.threshold = threshold
+        self.describe = describe
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.blocks = 0
+        self.last_block: Optional[Dict[str, Any]] = None
+        self._beat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._measure())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _measure(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - t0 - self.interval)
+            self._beat = time.monotonic()
+            self.lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG.set(lag)
+            LOOP_LAG_HIST.observe(lag)
+            if lag > self.threshold and self.last_block is not None and self.last_block.get("lag_seconds") is None:
+                self.last_block["lag_seconds"] = round(lag, 3)
+
+    def _watch(self) -> None:
+        captured_for = None
+        while not self._stop.wait(min(0.1, self.interval / 2)):
+            stalled = time.monotonic() - self._beat - self.interval
+            if stalled <= self.threshold:
+                continue
+            if captured_for == self._beat:
+                continue  # one capture per block
+            captured_for = self._beat
+            self._capture(stalled)
+
+    def _capture(self, stalled: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame) if frame is not None else []
+        task = None
+        try:
+            task = asyncio.current_task(self._loop)
+        except Exception:
+            pass
+        owner: Dict[str, Any] = {}
+        if self.describe is not None:
+            try:
+                owner = self.describe(task) or {}
+            except Exception:
+                owner = {}
+        self.blocks += 1
+        LOOP_BLOCKS.inc()
+        self.last_block = {
+            "at": time.time(),
+            "blocked_for_seconds": round(stalled, 3),
+            "lag_seconds": None,  # filled in once the loop wakes up
+            "task": task.get_name() if task is not None else None,
+            **owner,
+            "stack": [line.rstrip() for line in stack[-25:]],
+        }
+        log.warning(
+            "Event loop blocked for %.2fs (session=%s stage=%s task=%s)\n%s",
+            stalled, owner.get("session_id"), owner.get("stage"), self.last_block["task"], "".join(stack[-12:]),
+        )
+
+    def health(self) -> Dict[str, Any]:
+        recent = self.last_block is not None and time.time() - self.last_block["at"] < HEALTH_DEGRADED_WINDOW
+        degraded = HEALTH_DEGRADE_ON_LAG and (recent or self.lag > self.threshold)
+        out: Dict[str, Any] = {
+            "status": "degraded" if degraded else "ok",
+            "loop_lag_seconds": round(self.lag, 4),
+            "loop_lag_max_seconds": round(self.max_lag, 4),
+            "loop_blocks": self.blocks,
+        }
+        if degraded and self.last_block is not None:
+            out["last_block"] = {k: v for k, v in self.last_block.items() if k != "stack"}
+            out["last_block"]["stack_tail"] = self.last_block["stack"][-5:]
+        return out
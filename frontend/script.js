@@ -301,6 +301,13 @@ async function startScan() {
 
   try {
     const startRes = await apiFetch(`${API.base}${API.scan(session_id)}`, { method: "POST" }, 15000)
+    if (startRes.status === 429) {
+      const retryAfter = Number(startRes.headers.get("Retry-After") || 0)
+      showError(`Server is busy. Please retry${retryAfter ? ` in about ${retryAfter}s` : " later"}.`)
+      els.retryBtn.hidden = false
+      els.startBtn.disabled = false
+      return
+    }
     if (!startRes.ok) {
       showError(`Failed to start scan (${startRes.status})`)
       els.retryBtn.hidden = false
@@ -383,12 +390,21 @@ function handleEvent(data) {
 
   if (data.stage) {
     const stage = String(data.stage)
-    if (stage === "frames") {
+    if (stage === "queued") {
+      const pos = Number(data.queue_position || 0)
+      const eta = Number(data.eta_seconds || 0)
+      setProgress(5, pos ? `Queued #${pos}${eta ? ` (~${eta}s)` : ""}` : "Queued...")
+    } else if (stage === "frames") {
       setStage("frames", "active")
       setStage("faces", "pending")
       setStage("inference", "pending")
       const n = Number(data.frames_count || 0)
-      setProgress(25, `Extracting frames... (${n})`)
+      const skipped = Number(data.frames_skipped || 0)
+      const est = Math.round(Number(data.estimate_seconds || 0))
+      setProgress(
+        25,
+        `Extracting frames... (${n}${skipped ? `, ${skipped} duplicates skipped` : ""})${est ? ` ~${est}s total` : ""}`
+      )
     } else if (stage === "faces") {
       setStage("frames", "done")
       setStage("faces", "active")
@@ -1,6 +1,204 @@
+"""
+main.py — Headless batch scanner
+
+Scans whole directories of videos offline with the same pipeline as the API
+(extract_frames -> detect_and_crop_faces -> predict_from_faces) without
+starting FastAPI. Videos are spread over a process pool; each worker loads
+VideoResNetLSTM once. Results stream to JSONL or CSV as they finish, and a
+rerun skips videos that already have a result in the output file.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+DEFAULT_WEIGHTS = os.path.join(BACKEND_DIR, "models", "production1000_temporal_model.pth")
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv", ".webm", ".m4v")
+CSV_FIELDS = ["video", "status", "prediction", "confidence", "frames", "crops", "fake_crops",
+              "frames_s", "faces_s", "scoring_s", "inference_s", "total_s", "size", "mtime", "worker", "error"]
+
+# Per-worker state, set once by _init_worker
+_worker = {}
+
+
+def _init_worker(weights, device, threads, work_root, step, score_crops):
+    sys.path.insert(0, BACKEND_DIR)
+    import torch
+    from model import load_model
+
+    if threads:
+        torch.set_num_threads(threads)
+    if device == "auto":
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    _worker.update(
+        model=load_model(weights, device),
+        device=device,
+        work_root=work_root,
+        step=step,
+        score_crops=score_crops,
+    )
+
+
+def _scan_one(video_path):
+    from utils.pipeline import scan_video_file
+
+    rec = {"video": video_path, "worker": os.getpid()}
+    t0 = time.perf_counter()
+    try:
+        # Inside the try: the file may be gone or unreadable by the time a worker gets to it
+        st = os.stat(video_path)
+        rec.update(size=st.st_size, mtime=int(st.st_mtime))
+        work_dir = tempfile.mkdtemp(prefix="scan-", dir=_worker["work_root"])
+        rec.update(scan_video_file(_worker["model"], video_path, work_dir, _worker["device"],
+                                   step=_worker["step"], score_crops=_worker["score_crops"]))
+        rec["status"] = "done"
+    except Exception as e:
+        rec["status"] = "error"
+        rec["error"] = f"{type(e).__name__}: {e}"
+    rec["total_s"] = round(time.perf_counter() - t0, 4)
+    return rec
+
+
+def find_videos(inputs):
+    videos = []
+    for path in inputs:
+        path = os.path.expanduser(path)
+        if os.path.isfile(path):
+            videos.append(os.path.abspath(path))
+            continue
+        for root, _, files in os.walk(path):
+            for f in files:
+                if f.lower().endswith(VIDEO_EXTS):
+                    videos.append(os.path.abspath(os.path.join(root, f)))
+    return sorted(set(videos))
+
+
+def _output_format(path, fmt):
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def _jsonl_rows(f):
+    for line in f:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # A run killed mid-write leaves a truncated last line; that video is simply scanned again
+            continue
+
+
+def load_done(output, fmt, retry_errors=False):
+    """Return {video: (size, mtime)} for videos already scored in an existing output file."""
+    done = {}
+    if not os.path.exists(output):
+        return done
+    with open(output, newline="") as f:
+        rows = csv.DictReader(f) if fmt == "csv" else _jsonl_rows(f)
+        for r in rows:
+            if r.get("status") == "done" and str(r.get("frames")) == "0":
+                continue  # recorded as done before frameless videos counted as errors; rescan
+            if r.get("status") == "done" or (r.get("status") == "error" and not retry_errors):
+                try:
+                    done[r["video"]] = (int(r.get("size") or 0), int(r.get("mtime") or 0))
+                except (KeyError, ValueError):
+                    continue
+    return done
+
+
+def run_batch(inputs, output, weights=DEFAULT_WEIGHTS, workers=None, threads=None, device="auto",
+              fmt=None, step=5, score_crops=False, retry_errors=False, work_root=None):
+    fmt = _output_format(output, fmt)
+    videos = find_videos(inputs)
+    done = load_done(output, fmt, retry_errors)
+
+    todo = []
+    for v in videos:
+        try:
+            st = os.stat(v)
+        except OSError:
+            todo.append(v)  # _scan_one records the error
+            continue
+        if done.get(v) == (st.st_size, int(st.st_mtime)):
+            continue  # unchanged and already scored
+        todo.append(v)
+    print(f"FOUND {len(videos)} VIDEOS; {len(videos) - len(todo)} ALREADY SCORED; {len(todo)} TO SCAN")
+    if not todo:
+        return
+
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    # Split cores between workers so torch threads don't oversubscribe
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    work_root = work_root or tempfile.gettempdir()
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    print(f"USING {workers} WORKERS x {threads} TORCH THREADS\n")
+
+    new_file = not os.path.exists(output) or os.path.getsize(output) == 0
+    t0 = time.perf_counter()
+    counts = {"done": 0, "error": 0}
+    with open(output, "a", newline="") as out, ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(weights, device, threads, work_root, step, score_crops),
+    ) as pool:
+        writer = None
+        if fmt == "csv":
+            writer = csv.DictWriter(out, fieldnames=CSV_FIELDS, extrasaction="ignore")
+            if new_file:
+                writer.writeheader()
+        futures = {pool.submit(_scan_one, v): v for v in todo}
+        for i, fut in enumerate(as_completed(futures), 1):
+            try:
+                rec = fut.result()
+            except Exception as e:
+                # A worker that died (BrokenProcessPool) or a result that failed to unpickle only costs this video
+                rec = {"video": futures[fut], "status": "error", "error": f"{type(e).__name__}: {e}", "total_s": 0.0}
+            counts[rec["status"]] = counts.get(rec["status"], 0) + 1
+            if writer is not None:
+                writer.writerow(rec)
+            else:
+                out.write(json.dumps(rec) + "\n")
+            out.flush()
+            label = rec.get("prediction") or rec.get("error")
+            print(f"[{i}/{len(todo)}] {os.path.basename(rec['video'])}: {label} ({rec['total_s']:.1f}s)")
+
+    wall = time.perf_counter() - t0
+    print(f"\nSCANNED {len(todo)} VIDEOS IN {wall:.1f}s ({len(todo) / wall * 60:.1f}/min); "
+          f"{counts['done']} DONE, {counts['error']} ERRORS. RESULTS IN {output}")
+
+
 def main():
-    print("Hello from df-scan!")
+    import argparse
+
+    parser = argparse.ArgumentParser(description="DF-SCAN headless batch scanner")
+    parser.add_argument("inputs", nargs="+", help="Video files or directories (searched recursively)")
+    parser.add_argument("--output", type=str, default="scan_results.jsonl", help="Results file (.jsonl or .csv)")
+    parser.add_argument("--format", type=str, choices=["jsonl", "csv"], default=None,
+                        help="Output format (default: from the output extension)")
+    parser.add_argument("--weights", type=str, default=DEFAULT_WEIGHTS, help="Model checkpoint")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: half the cores)")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads per worker")
+    parser.add_argument("--device", type=str, default="auto", help="cpu, cuda or auto")
+    parser.add_argument("--step", type=int, default=5, help="Frame sampling step")
+    parser.add_argument("--score_crops", action="store_true", help="Also score every crop (fake_crops column)")
+    parser.add_argument("--retry_errors", action="store_true", help="Rescan videos that previously errored")
+    parser.add_argument("--work_root", type=str, default=None, help="Scratch directory for frames and crops")
+    args = parser.parse_args()
+
+    run_batch(args.inputs, args.output, args.weights, args.workers, args.threads, args.device,
+              args.format, args.step, args.score_crops, args.retry_errors, args.work_root)
 
 
 if __name__ == "__main__":
     main()
+
+
+# python main.py ~/moderation/backlog --output results.jsonl --workers 4
+# python main.py videos/ clips/extra.mp4 --output results.csv --score_crops
@@ -0,0 +1,319 @@
+"""
+benchmark_pipeline.py — End-to-end benchmark of the backend scan pipeline
+on deterministic synthetic videos.
+
+Runs extract_frames -> detect_and_crop_faces -> predict_images (crops
+batched like the server's InferenceBatcher) -> predict_from_faces for every (resolution, length, face count) combination
+and writes per-stage throughput, peak RSS and end-to-end latency as JSON.
+A compare mode diffs two result files and flags regressions.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import threading
+import statistics
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+
+DEFAULT_WEIGHTS = os.path.join(os.path.abspath(BACKEND_DIR), "models", "production1000_temporal_model.pth")
+
+
+def generate_synthetic_video(path, width, height, seconds, fps=25, faces=1, seed=0, face_image=None):
+    """
+    Write a deterministic test video: a textured background with `faces`
+    moving faces. Faces are drawn as simple cartoon heads unless `face_image`
+    is given, in which case that photo is pasted instead (HOG finds real faces
+    far more reliably than drawings).
+    """
+    import cv2
+    import numpy as np
+
+    rng = np.random.RandomState(seed)
+    ys, xs = np.mgrid[0:height, 0:width]
+    background = np.stack([
+        (xs * 255 // max(1, width - 1)),
+        (ys * 255 // max(1, height - 1)),
+        np.full_like(xs, 96),
+    ], axis=-1).astype(np.uint8)
+    background = cv2.add(background, rng.randint(0, 24, size=background.shape, dtype=np.uint8))
+
+    face_size = max(48, min(width, height) // 4)
+    sprite = None
+    if face_image:
+        sprite = cv2.imread(face_image)
+        if sprite is not None:
+            sprite = cv2.resize(sprite, (face_size, face_size))
+
+    starts = rng.randint(0, max(1, width - face_size), size=faces)
+    rows = [int((i + 0.5) * height / max(1, faces)) - face_size // 2 for i in range(faces)]
+    speeds = rng.uniform(1.0, 4.0, size=faces)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    total = int(seconds * fps)
+    for n in range(total):
+        frame = background.copy()
+        for i in range(faces):
+            x = int((starts[i] + speeds[i] * n) % max(1, width - face_size))
+            y = max(0, min(height - face_size, rows[i]))
+            if sprite is not None:
+                frame[y:y + face_size, x:x + face_size] = sprite
+                continue
+            cx, cy, r = x + face_size // 2, y + face_size // 2, face_size // 2
+            cv2.ellipse(frame, (cx, cy), (int(r * 0.8), r), 0, 0, 360, (150, 180, 225), -1)
+            for ex in (cx - r // 3, cx + r // 3):
+                cv2.circle(frame, (ex, cy - r // 4), max(2, r // 8), (40, 40, 40), -1)
+            cv2.line(frame, (cx, cy - r // 8), (cx, cy + r // 6), (90, 110, 160), max(1, r // 16))
+            cv2.ellipse(frame, (cx, cy + r // 2), (r // 3, r // 8), 0, 0, 180, (60, 60, 140), max(1, r // 12))
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+class RSSSampler:
+    """Samples resident memory in a background thread to get a per-run peak."""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current():
+        from utils.metrics import _rss_bytes
+
+        return _rss_bytes()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def build_model(weights, device, seed=0):
+    """The server's model.load_model (mmap path included); seeded random init if the checkpoint is missing."""
+    import torch
+    from model import VideoResNetLSTM, load_model
+
+    if weights and os.path.exists(weights):
+        return load_model(weights, device), True
+    torch.manual_seed(seed)
+    return VideoResNetLSTM(pretrained=False).to(device).eval(), False
+
+
+def _stage(seconds, items):
+    return {"seconds": round(seconds, 4), "items": items, "per_sec": round(items / seconds, 3) if seconds > 0 else None}
+
+
+def run_pipeline_once(model, device, video_path, work_dir, step=5):
+    """Run the backend stages on one video and time each of them."""
+    from utils.frame_utils import extract_frames
+    from utils.face_utils import detect_and_crop_faces
+    from utils.inference import predict_from_faces, predict_images
+    from utils.batcher import BATCH_MAX_CROPS
+
+    frames_dir = os.path.join(work_dir, "frames")
+    vis_dir = os.path.join(work_dir, "vis")
+    crops_dir = os.path.join(work_dir, "crops")
+
+    stages = {}
+    with RSSSampler() as rss:
+        t_all = time.perf_counter()
+
+        t0 = time.perf_counter()
+        frames = sum(1 for _ in extract_frames(video_path, frames_dir, step=step))
+        stages["frames"] = _stage(time.perf_counter() - t0, frames)
+
+        t0 = time.perf_counter()
+        crop_paths = []
+        detected = 0
+        for _, crops, _ in detect_and_crop_faces(frames_dir, vis_dir, crops_dir):
+            detected += 1
+            crop_paths.extend(crops)
+        stages["faces"] = _stage(time.perf_counter() - t0, detected)
+        stages["faces"]["crops"] = len(crop_paths)
+
+        t0 = time.perf_counter()
+        for i in range(0, len(crop_paths), BATCH_MAX_CROPS):
+            predict_images(model, crop_paths[i:i + BATCH_MAX_CROPS], device)
+        stages["scoring"] = _stage(time.perf_counter() - t0, len(crop_paths))
+
+        t0 = time.perf_counter()
+        result = predict_from_faces(model, crops_dir, device)
+        stages["inference"] = _stage(time.perf_counter() - t0, len(crop_paths))
+
+        e2e = time.perf_counter() - t_all
+    return {
+        "stages": stages,
+        "e2e_seconds": round(e2e, 4),
+        "peak_rss_mb": round(rss.peak / (1024 * 1024), 1),
+        "prediction": result,
+    }
+
+
+def _median_run(runs):
+    """Collapse repeated runs to the median per stage / e2e, keeping the max RSS."""
+    out = json.loads(json.dumps(runs[0]))
+    for name in out["stages"]:
+        secs = statistics.median(r["stages"][name]["seconds"] for r in runs)
+        out["stages"][name]["seconds"] = round(secs, 4)
+        items = out["stages"][name]["items"]
+        out["stages"][name]["per_sec"] = round(items / secs, 3) if secs > 0 else None
+    out["e2e_seconds"] = round(statistics.median(r["e2e_seconds"] for r in runs), 4)
+    out["peak_rss_mb"] = max(r["peak_rss_mb"] for r in runs)
+    out["repeats"] = len(runs)
+    return out
+
+
+def run_benchmark(resolutions, lengths, face_counts, fps=25, step=5, repeat=1, weights=DEFAULT_WEIGHTS,
+                  work_dir=None, face_image=None, seed=0, keep=False):
+    import torch
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    model, loaded = build_model(weights, device, seed)
+    work_dir = work_dir or tempfile.mkdtemp(prefix="dfscan-bench-")
+    videos_dir = os.path.join(work_dir, "videos")
+    print(f"USING DEVICE {device}; WEIGHTS {'LOADED' if loaded else 'RANDOM INIT'}; WORK DIR {work_dir}")
+
+    results = []
+    for (w, h) in resolutions:
+        for seconds in lengths:
+            for faces in face_counts:
+                name = f"synthetic_{w}x{h}_{seconds:g}s_{faces}faces_seed{seed}.mp4"
+                video = os.path.join(videos_dir, name)
+                if not os.path.exists(video):
+                    generate_synthetic_video(video, w, h, seconds, fps, faces, seed, face_image)
+                runs = []
+                for r in range(repeat):
+                    run_dir = os.path.join(work_dir, "runs", os.path.splitext(name)[0], str(r))
+                    shutil.rmtree(run_dir, ignore_errors=True)
+                    runs.append(run_pipeline_once(model, device, video, run_dir, step=step))
+                    if not keep:
+                        shutil.rmtree(run_dir, ignore_errors=True)
+                res = _median_run(runs)
+                res["video"] = {"name": name, "width": w, "height": h, "seconds": seconds, "fps": fps, "faces": faces}
+                results.append(res)
+                print(f"{name}: E2E {res['e2e_seconds']:.2f}s, "
+                      + ", ".join(f"{k} {v['per_sec']}/s" for k, v in res["stages"].items())
+                      + f", PEAK RSS {res['peak_rss_mb']} MB")
+
+    if not keep:
+        shutil.rmtree(os.path.join(work_dir, "runs"), ignore_errors=True)
+
+    return {
+        "created_at": time.time(),
+        "env": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "device": device,
+            "weights_loaded": loaded,
+        },
+        "config": {"fps": fps, "step": step, "repeat": repeat, "seed": seed},
+        "results": results,
+    }
+
+
+def compare_runs(base_path, new_path, threshold=10.0):
+    """
+    Print per-video, per-stage throughput and latency deltas between two
+    result files. Returns the number of regressions worse than `threshold`%.
+    """
+    with open(base_path) as f:
+        base = {r["video"]["name"]: r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = {r["video"]["name"]: r for r in json.load(f)["results"]}
+
+    regressions = 0
+    for name in sorted(set(base) & set(new)):
+        b, n = base[name], new[name]
+        print(f"\n{name}")
+        rows = [("e2e_seconds", b["e2e_seconds"], n["e2e_seconds"], False),
+                ("peak_rss_mb", b["peak_rss_mb"], n["peak_rss_mb"], False)]
+        for stage in b["stages"]:
+            if stage in n["stages"]:
+                rows.append((f"{stage} per_sec", b["stages"][stage]["per_sec"], n["stages"][stage]["per_sec"], True))
+        for label, bv, nv, higher_is_better in rows:
+            if not bv or nv is None:
+                print(f"  {label:<22} {bv!s:>10} -> {nv!s:>10}")
+                continue
+            delta = (nv - bv) / bv * 100.0
+            worse = -delta if higher_is_better else delta
+            flag = "  REGRESSION" if worse > threshold else ""
+            regressions += bool(flag)
+            print(f"  {label:<22} {bv:>10} -> {nv:>10} ({delta:+.1f}%){flag}")
+
+    for name in sorted(set(base) ^ set(new)):
+        print(f"\n{name}: ONLY IN {'BASE' if name in base else 'NEW'}")
+    print(f"\n{regressions} REGRESSION(S) ABOVE {threshold}%")
+    return regressions
+
+
+def _parse_resolutions(s):
+    out = []
+    for item in s.split(","):
+        w, h = item.lower().split("x")
+        out.append((int(w), int(h)))
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the DF-SCAN backend pipeline on synthetic videos")
+    parser.add_argument("--resolutions", type=str, default="640x360,1280x720,1920x1080",
+                        help="Comma separated WxH list")
+    parser.add_argument("--seconds", type=str, default="2,6", help="Comma separated video lengths in seconds")
+    parser.add_argument("--faces", type=str, default="0,1,3", help="Comma separated face counts")
+    parser.add_argument("--fps", type=int, default=25, help="Synthetic video frame rate")
+    parser.add_argument("--step", type=int, default=5, help="extract_frames sampling step")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per video (median reported)")
+    parser.add_argument("--weights", type=str, default=DEFAULT_WEIGHTS,
+                        help="Model checkpoint; random init if missing")
+    parser.add_argument("--face_image", type=str, default=None,
+                        help="Optional face photo pasted into the videos instead of drawn faces")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work_dir", type=str, default=None, help="Where videos and run outputs go")
+    parser.add_argument("--keep", action="store_true", help="Keep per-run frames/crops")
+    parser.add_argument("--output", type=str, default="bench_results.json", help="Result JSON path")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Diff two result files and exit")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare_runs(args.compare[0], args.compare[1], args.threshold) else 0)
+
+    report = run_benchmark(
+        _parse_resolutions(args.resolutions),
+        [float(s) for s in args.seconds.split(",")],
+        [int(f) for f in args.faces.split(",")],
+        fps=args.fps, step=args.step, repeat=args.repeat, weights=args.weights,
+        work_dir=args.work_dir, face_image=args.face_image, seed=args.seed, keep=args.keep,
+    )
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nRESULTS WRITTEN TO {args.output}")
+
+
+# python scripts/benchmark_pipeline.py --resolutions 640x360,1280x720 --seconds 2,6 --faces 0,1,3 --output bench_base.json
+# python scripts/benchmark_pipeline.py --compare bench_base.json bench_new.json --threshold 10
@@ -1,60 +1,111 @@
 import os
+import time
+from collections import defaultdict
 from PIL import Image
 from tqdm import tqdm
 from multiprocessing import Pool, cpu_count
+from manifest import Manifest, params_hash, file_signature, default_manifest_path
 
-def detect_and_crop_face(frame_path, faces_root, margin=20, image_size=224):
-    """
-    Detect faces in a frame and save cropped face(s).
-    """
-    try:
-        import torch
-        from facenet_pytorch import MTCNN
-
-        device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-        mtcnn = MTCNN(keep_all=True, device=device)
+# One MTCNN per pool worker, built by _init_worker instead of once per frame
+_mtcnn = None
 
-        img = Image.open(frame_path).convert("RGB")
-        boxes, _ = mtcnn.detect(img)
 
-        if boxes is None:
-            return 0
+def _init_worker():
+    global _mtcnn
+    import torch
+    from facenet_pytorch import MTCNN
 
-        # Determine label
-        label = "fake" if "fake" in frame_path.lower() else "real"
-        # Include method name to avoid collisions
-        method_name = os.path.basename(os.path.dirname(os.path.dirname(frame_path)))
-        video_name = os.path.basename(os.path.dirname(frame_path))
-        unique_video_id = f"{method_name}_{video_name}"
-        output_dir = os.path.join(faces_root, label, unique_video_id)
-        os.makedirs(output_dir, exist_ok=True)
+    device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+    _mtcnn = MTCNN(keep_all=True, device=device)
 
-        for i, box in enumerate(boxes):
-            x1, y1, x2, y2 = [int(b) for b in box]
-            x1 = max(0, x1 - margin)
-            y1 = max(0, y1 - margin)
-            x2 = min(img.width, x2 + margin)
-            y2 = min(img.height, y2 + margin)
 
-            face_crop = img.crop((x1, y1, x2, y2)).resize((image_size, image_size))
-            base_name = os.path.splitext(os.path.basename(frame_path))[0]
-            face_crop.save(os.path.join(output_dir, f"{base_name}_face_{i}.jpg"))
+def crop_faces(img, boxes, frame_path, faces_root, margin=20, image_size=224):
+    """
+    Save the detected face(s) of one frame.
+    Returns the saved crop paths.
+    """
+    if boxes is None:
+        return []
+
+    # Determine label
+    label = "fake" if "fake" in frame_path.lower() else "real"
+    # Include method name to avoid collisions
+    method_name = os.path.basename(os.path.dirname(os.path.dirname(frame_path)))
+    video_name = os.path.basename(os.path.dirname(frame_path))
+    unique_video_id = f"{method_name}_{video_name}"
+    output_dir = os.path.join(faces_root, label, unique_video_id)
+    os.makedirs(output_dir, exist_ok=True)
+
+    saved = []
+    for i, box in enumerate(boxes):
+        x1, y1, x2, y2 = [int(b) for b in box]
+        x1 = max(0, x1 - margin)
+        y1 = max(0, y1 - margin)
+        x2 = min(img.width, x2 + margin)
+        y2 = min(img.height, y2 + margin)
+
+        face_crop = img.crop((x1, y1, x2, y2)).resize((image_size, image_size))
+        base_name = os.path.splitext(os.path.basename(frame_path))[0]
+        out_path = os.path.join(output_dir, f"{base_name}_face_{i}.jpg")
+        face_crop.save(out_path)
+        saved.append(out_path)
+
+    return saved
 
-        return len(boxes)
 
+def detect_and_crop_face(frame_path, faces_root, margin=20, image_size=224):
+    """
+    Detect faces in a single frame and save cropped face(s).
+    Returns the saved crop paths, or None if the frame failed.
+    """
+    try:
+        img = Image.open(frame_path).convert("RGB")
+        boxes, _ = _mtcnn.detect(img)
+        return crop_faces(img, boxes, frame_path, faces_root, margin, image_size)
     except Exception as e:
         print(f"ERROR PROCESSING {frame_path}: {e}")
-        return 0
+        return None
 
 
-def process_frame(args):
-    frame_path, faces_root = args
-    return detect_and_crop_face(frame_path, faces_root)
+def process_chunk(args):
+    """
+    Detect faces on a chunk of frames from one video with a single batched
+    MTCNN call (frames of a video share a size, which batching requires).
+    Falls back to frame-by-frame if the batch fails.
+    """
+    frame_paths, faces_root = args
+    try:
+        images = [Image.open(fp).convert("RGB") for fp in frame_paths]
+        batch_boxes, _ = _mtcnn.detect(images)
+    except Exception:
+        return [(fp, detect_and_crop_face(fp, faces_root)) for fp in frame_paths]
+
+    results = []
+    for fp, img, boxes in zip(frame_paths, images, batch_boxes):
+        try:
+            results.append((fp, crop_faces(img, boxes, fp, faces_root)))
+        except Exception as e:
+            print(f"ERROR PROCESSING {fp}: {e}")
+            results.append((fp, None))
+    return results
+
+
+def chunk_by_video(frame_paths, chunk_size):
+    """Group frames by their video folder and split each group into chunks."""
+    by_video = defaultdict(list)
+    for fp in frame_paths:
+        by_video[os.path.dirname(fp)].append(fp)
+    chunks = []
+    for frames in by_video.values():
+        frames.sort()
+        for i in range(0, len(frames), chunk_size):
+            chunks.append(frames[i:i + chunk_size])
+    return chunks
 
 
 def detect_faces_from_frames(frames_root="data/intermediate/frames",
                              faces_root="data/intermediate/faces",
-                             num_workers=None):
+                             num_workers=None, manifest_path=None, force=False, chunk_size=16):
     frame_paths = []
     for root, _, files in os.walk(frames_root):
         for file in files:
@@ -64,22 +115,42 @@ def detect_faces_from_frames(frames_root="data/intermediate/frames",
     print(f"FOUND {len(frame_paths)} FRAMES FOR FACE DETECTION.")
     os.makedirs(faces_root, exist_ok=True)
 
-    num_workers = num_workers or max(1, cpu_count() - 2)
-    print(f"USING {num_workers} CPU CORES FOR FACE DETECTION.\n")
+    # Only frames that are new, re-extracted, failed or detected with other settings are redone
+    manifest = Manifest(manifest_path or default_manifest_path(faces_root))
+    phash = params_hash(detector="mtcnn", margin=20, image_size=224, faces_root=os.path.abspath(faces_root))
+    items = {os.path.relpath(fp, frames_root): file_signature(fp) for fp in frame_paths}
+    # Frames that disappeared (video re-extracted or removed) take their crops with them
+    todo = manifest.reconcile("faces", items, phash, force)
+    print(f"{len(items) - len(todo)} FRAMES UP TO DATE; {len(todo)} TO PROCESS")
+    if not todo:
+        manifest.close()
+        return
 
-    with Pool(num_workers) as pool:
-        list(
-            tqdm(
-                pool.imap_unordered(
-                    process_frame,
-                    [(fp, faces_root) for fp in frame_paths]
-                ),
-                total=len(frame_paths),
-                desc="DETECTING FACES"
-            )
-        )
+    num_workers = num_workers or max(1, cpu_count() - 2)
+    chunks = chunk_by_video([os.path.join(frames_root, item) for item in todo], max(1, chunk_size))
+    print(f"USING {num_workers} CPU CORES FOR FACE DETECTION ({len(chunks)} CHUNKS OF UP TO {chunk_size} FRAMES).\n")
 
-    print("\nFACE DETECTION & CROPPING COMPLETED.")
+    t0 = time.perf_counter()
+    errors = crops = 0
+    try:
+        with Pool(num_workers, initializer=_init_worker) as pool, tqdm(total=len(todo), desc="DETECTING FACES") as bar:
+            for results in pool.imap_unordered(process_chunk, [(chunk, faces_root) for chunk in chunks]):
+                for frame_path, saved in results:
+                    item = os.path.relpath(frame_path, frames_root)
+                    if saved is None:
+                        errors += 1
+                        manifest.mark("faces", item, "error", items[item], phash, error="detection failed")
+                    else:
+                        crops += len(saved)
+                        manifest.mark("faces", item, "done", items[item], phash, outputs=saved)
+                bar.update(len(results))
+    finally:
+        # Also on Ctrl-C, so finished items are not redone next run
+        manifest.close()
+
+    wall = time.perf_counter() - t0
+    print(f"\nFACE DETECTION & CROPPING COMPLETED: {len(todo)} FRAMES, {crops} CROPS, {errors} ERRORS "
+          f"IN {wall:.1f}s ({len(todo) / wall:.1f} FRAMES/s, {crops / wall:.1f} CROPS/s).")
 
 
 if __name__ == "__main__":
@@ -92,9 +163,16 @@ if __name__ == "__main__":
                         help="Where to save cropped faces")
     parser.add_argument("--workers", type=int, default=None,
                         help="Number of CPU cores for multiprocessing")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Work manifest for resuming (default: manifest.db next to faces_root)")
+    parser.add_argument("--force", action="store_true",
+                        help="Ignore the manifest and reprocess every frame")
+    parser.add_argument("--chunk_size", type=int, default=16,
+                        help="Frames of one video per batched MTCNN call")
     args = parser.parse_args()
 
-    detect_faces_from_frames(args.frames_root, args.faces_root, args.workers)
+    detect_faces_from_frames(args.frames_root, args.faces_root, args.workers, args.manifest, args.force,
+                             args.chunk_size)
 
 
-# python scripts/detect_faces.py   --frames_root ~/DF-SCAN/data/intermediate_100/frames   --faces_root ~/DF-SCAN/data/intermediate_100/faces   --workers 6
\ No newline at end of file
+# python scripts/detect_faces.py   --frames_root ~/DF-SCAN/data/intermediate_100/frames   --faces_root ~/DF-SCAN/data/intermediate_100/faces   --workers 6   --chunk_size 32
\ No newline at end of file
@@ -3,23 +3,25 @@ import cv2
 from PIL import Image
 from tqdm import tqdm
 from multiprocessing import Pool, cpu_count
+from manifest import Manifest, params_hash, file_signature, default_manifest_path
 import face_recognition
 
 
 def detect_and_crop_face(frame_path, faces_root, margin=20, image_size=224):
     """
     Detect faces in a frame using face_recognition and save cropped face(s).
+    Returns the saved crop paths, or None if the frame failed.
     """
     try:
         img = cv2.imread(frame_path)
         if img is None:
-            return 0
+            return None
 
         rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
         boxes = face_recognition.face_locations(rgb_img, model='hog')  # fast on CPU
 
         if not boxes:
-            return 0
+            return []
 
         # Determine label (real/fake)
         label = "fake" if "fake" in frame_path.lower() else "real"
@@ -31,7 +33,7 @@ def detect_and_crop_face(frame_path, faces_root, margin=20, image_size=224):
         output_dir = os.path.join(faces_root, label, unique_video_id)
         os.makedirs(output_dir, exist_ok=True)
 
-        count = 0
+        saved = []
         for (top, right, bottom, left) in boxes:
             # Add margin
             top = max(0, top - margin)
@@ -45,24 +47,25 @@ def detect_and_crop_face(frame_path, faces_root, margin=20, image_size=224):
 
             face_crop = cv2.resize(face_crop, (image_size, image_size))
             base_name = os.path.splitext(os.path.basename(frame_path))[0]
-            cv2.imwrite(os.path.join(output_dir, f"{base_name}_face_{count}.jpg"), face_crop)
-            count += 1
+            out_path = os.path.join(output_dir, f"{base_name}_face_{len(saved)}.jpg")
+            cv2.imwrite(out_path, face_crop)
+            saved.append(out_path)
 
-        return count
+        return saved
 
     except Exception as e:
         print(f"ERROR PROCESSING {frame_path}: {e}")
-        return 0
+        return None
 
 
 def process_frame(args):
     frame_path, faces_root = args
-    return detect_and_crop_face(frame_path, faces_root)
+    return frame_path, detect_and_crop_face(frame_path, faces_root)
 
 
 def detect_faces_from_frames(frames_root="data/intermediate/frames",
                              faces_root="data/intermediate/faces",
-                             num_workers=None):
+                             num_workers=None, manifest_path=None, force=False):
     frame_paths = []
     for root, _, files in os.walk(frames_root):
         for file in files:
@@ -72,22 +75,42 @@ def detect_faces_from_frames(frames_root="data/intermediate/frames",
     print(f"FOUND {len(frame_paths)} FRAMES FOR FACE DETECTION.")
     os.makedirs(faces_root, exist_ok=True)
 
+    # Only frames that are new, re-extracted, failed or detected with other settings are redone
+    manifest = Manifest(manifest_path or default_manifest_path(faces_root))
+    phash = params_hash(detector="hog", margin=20, image_size=224, faces_root=os.path.abspath(faces_root))
+    items = {os.path.relpath(fp, frames_root): file_signature(fp) for fp in frame_paths}
+    # Frames that disappeared (video re-extracted or removed) take their crops with them
+    todo = manifest.reconcile("faces", items, phash, force)
+    print(f"{len(items) - len(todo)} FRAMES UP TO DATE; {len(todo)} TO PROCESS")
+    if not todo:
+        manifest.close()
+        return
+
     num_workers = num_workers or max(1, cpu_count() - 2)
     print(f"USING {num_workers} CPU CORES FOR FACE DETECTION.\n")
 
-    with Pool(num_workers) as pool:
-        list(
-            tqdm(
+    errors = 0
+    try:
+        with Pool(num_workers) as pool:
+            for frame_path, saved in tqdm(
                 pool.imap_unordered(
                     process_frame,
-                    [(fp, faces_root) for fp in frame_paths]
+                    [(os.path.join(frames_root, item), faces_root) for item in todo]
                 ),
-                total=len(frame_paths),
+                total=len(todo),
                 desc="DETECTING FACES"
-            )
-        )
+            ):
+                item = os.path.relpath(frame_path, frames_root)
+                if saved is None:
+                    errors += 1
+                    manifest.mark("faces", item, "error", items[item], phash, error="detection failed")
+                else:
+                    manifest.mark("faces", item, "done", items[item], phash, outputs=saved)
+    finally:
+        # Also on Ctrl-C, so finished items are not redone next run
+        manifest.close()
 
-    print("\nFACE DETECTION & CROPPING COMPLETED.")
+    print(f"\nFACE DETECTION & CROPPING COMPLETED ({errors} ERRORS).")
 
 
 if __name__ == "__main__":
@@ -100,9 +123,13 @@ if __name__ == "__main__":
                         help="Where to save cropped faces")
     parser.add_argument("--workers", type=int, default=None,
                         help="Number of CPU cores for multiprocessing")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Work manifest for resuming (default: manifest.db next to faces_root)")
+    parser.add_argument("--force", action="store_true",
+                        help="Ignore the manifest and reprocess every frame")
     args = parser.parse_args()
 
-    detect_faces_from_frames(args.frames_root, args.faces_root, args.workers)
+    detect_faces_from_frames(args.frames_root, args.faces_root, args.workers, args.manifest, args.force)
 
 
 # python scripts/detect_faces_v2.py \
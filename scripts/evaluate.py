@@ -0,0 +1,319 @@
+"""
+evaluate.py — Offline evaluation and calibration sweeps for VideoResNetLSTM
+
+The expensive part (the ResNet backbone over every crop of a split) runs
+once and is cached on disk as memory-mapped arrays:
+
+    cache_dir/embeddings.npy    float32 [N, 512]  backbone features per crop
+    cache_dir/crop_logits.npy   float32 [N, 2]    logits of each crop as a length-1 sequence
+    cache_dir/index.json        per-video label, method, offset, frame numbers
+
+The cache is reused only while the checkpoint and the split's content (crop
+lists and folder mtimes, or packed index and shards) are unchanged.
+
+Sweeps then only run the LSTM head over cached features: sequence length
+(seconds of video at the sampling fps, or all crops like the API), then
+temperature and FAKE threshold on the resulting logits. Reports accuracy,
+ROC-AUC, per-class F1, Brier score and per-method accuracy as in the
+README tables.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+
+import numpy as np
+import torch
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+
+DEFAULT_WEIGHTS = os.path.join(os.path.abspath(BACKEND_DIR), "models", "production1000_temporal_model.pth")
+INDEX_FILENAME = "index.json"
+
+
+def _signature(path):
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def dataset_digest(dataset):
+    """Digest of what a split contains: packed index and shard files, or every video's folder and crop list."""
+    h = hashlib.sha1()
+    if hasattr(dataset, "index"):
+        h.update(_signature(os.path.join(dataset.dir, INDEX_FILENAME)).encode())
+        for shard in dataset.index["shards"]:
+            h.update(_signature(os.path.join(dataset.dir, shard)).encode())
+    else:
+        # Re-extraction recreates a video's folder, so its mtime changes even if the crop names do not
+        for v in dataset.videos:
+            h.update(json.dumps([v["label"], v["video_id"], _signature(v["folder"]), v["frames"]]).encode())
+    return h.hexdigest()
+
+
+def head_logits(model, feats):
+    """LSTM + classifier of VideoResNetLSTM over backbone features [B, T, 512]."""
+    _, (h_n, _) = model.lstm(feats)
+    final_feat = torch.cat((h_n[-2], h_n[-1]), dim=1) if model.lstm.bidirectional else h_n[-1]
+    return model.classifier(final_feat)
+
+
+def build_cache(model, device, dataset, cache_dir, batch_size=64, workers=None):
+    """Run the backbone once per crop of `dataset` and write embeddings, crop logits and the index."""
+    from sequence_loader import ClipNormalizer
+    from torch.utils.data import DataLoader
+
+    workers = max(1, (os.cpu_count() or 2) - 2) if workers is None else workers
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=workers,
+                        pin_memory=torch.device(device).type == "cuda")
+    n = len(dataset)
+    os.makedirs(cache_dir, exist_ok=True)
+    emb = np.lib.format.open_memmap(os.path.join(cache_dir, "embeddings.npy"), mode="w+", dtype=np.float32,
+                                    shape=(n, model.feature_dim))
+    crop_logits = np.lib.format.open_memmap(os.path.join(cache_dir, "crop_logits.npy"), mode="w+",
+                                            dtype=np.float32, shape=(n, 2))
+
+    normalizer = ClipNormalizer(device)
+    t0 = time.perf_counter()
+    i = 0
+    with torch.no_grad():
+        for clips, _ in loader:
+            x = normalizer(clips)  # [B, 1, 3, 224, 224]
+            feats = model.feature_extractor(x.flatten(0, 1)).flatten(1)
+            emb[i:i + len(feats)] = feats.cpu().numpy()
+            crop_logits[i:i + len(feats)] = head_logits(model, feats.unsqueeze(1)).cpu().numpy()
+            i += len(feats)
+            print(f"\rEMBEDDED {i}/{n} CROPS ({i / (time.perf_counter() - t0):.0f}/s)", end="", flush=True)
+    print()
+    emb.flush()
+    crop_logits.flush()
+
+    videos, start = [], 0
+    for idx in range(n):
+        info = dataset.sample_info(idx)
+        if not videos or videos[-1]["video_id"] != info["video_id"] or videos[-1]["label"] != info["label"]:
+            videos.append({"video_id": info["video_id"], "label": info["label"], "method": info["method"],
+                           "start": idx, "count": 0, "frames": []})
+        videos[-1]["count"] += 1
+        videos[-1]["frames"].extend(info["frames"])
+    return videos
+
+
+def load_or_build_cache(model, device, root, split, cache_dir, weights, rebuild=False, **kwargs):
+    from sequence_loader import make_dataset
+
+    path = os.path.join(cache_dir, INDEX_FILENAME)
+    # seq_len=1, stride=1 windows visit every crop, video by video in time order
+    dataset = make_dataset(root, split, seq_len=1, stride=1)
+    key = {"root": os.path.abspath(root), "split": split, "weights": _signature(weights),
+           "data": dataset_digest(dataset)}
+    if not rebuild and os.path.exists(path):
+        with open(path) as f:
+            index = json.load(f)
+        if index.get("key") == key:
+            print(f"USING CACHED EMBEDDINGS IN {cache_dir}")
+            return index
+    print(f"BUILDING EMBEDDING CACHE FOR {root} [{split}]")
+    videos = build_cache(model, device, dataset, cache_dir, **kwargs)
+    index = {"key": key, "videos": videos}
+    # Written last: a cache without a matching index.json is rebuilt
+    with open(path + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(path + ".tmp", path)
+    return index
+
+
+def roc_auc(y, score):
+    """ROC-AUC via the Mann-Whitney U statistic (ties get average ranks)."""
+    y = np.asarray(y, dtype=bool)
+    pos, neg = y.sum(), (~y).sum()
+    if pos == 0 or neg == 0:
+        return float("nan")
+    order = np.argsort(score, kind="mergesort")
+    sorted_scores = np.asarray(score)[order]
+    ranks = np.empty(len(score), dtype=np.float64)
+    i = 0
+    while i < len(sorted_scores):
+        j = i
+        while j + 1 < len(sorted_scores) and sorted_scores[j + 1] == sorted_scores[i]:
+            j += 1
+        ranks[order[i:j + 1]] = (i + j) / 2.0 + 1
+        i = j + 1
+    return float((ranks[y].sum() - pos * (pos + 1) / 2) / (pos * neg))
+
+
+def _f1(tp, fp, fn):
+    return 2 * tp / (2 * tp + fp + fn) if tp else 0.0
+
+
+def metrics_for(y, p_fake, threshold, methods=None):
+    """y: 1 = fake. Accuracy, per-class F1, Brier score and (optionally) per-method accuracy."""
+    pred = p_fake >= threshold
+    y = y.astype(bool)
+    tp, tn = int((pred & y).sum()), int((~pred & ~y).sum())
+    fp, fn = int((pred & ~y).sum()), int((~pred & y).sum())
+    out = {
+        "accuracy": (tp + tn) / len(y),
+        "real_f1": _f1(tn, fn, fp),
+        "fake_f1": _f1(tp, fp, fn),
+        "brier": float(np.mean((p_fake - y) ** 2)),
+    }
+    if methods is not None:
+        per = {}
+        for m in sorted(set(methods)):
+            mask = methods == m
+            per[m] = float((pred[mask] == y[mask]).mean())
+        out["per_method"] = per
+    return out
+
+
+def video_logits(model, device, emb, videos, seq_len, batch_size=256):
+    """Logits per video over `seq_len` evenly spaced crops (None: all crops, as the API does)."""
+    groups = {}
+    for vi, v in enumerate(videos):
+        t = v["count"] if seq_len is None else min(seq_len, v["count"])
+        idx = v["start"] + np.linspace(0, v["count"] - 1, t).round().astype(int)
+        groups.setdefault(t, []).append((vi, idx))
+    out = np.zeros((len(videos), 2), dtype=np.float32)
+    with torch.no_grad():
+        # Videos with the same sequence length run through the LSTM together
+        for t, items in groups.items():
+            for i in range(0, len(items), batch_size):
+                chunk = items[i:i + batch_size]
+                feats = torch.from_numpy(np.stack([emb[idx] for _, idx in chunk])).to(device)
+                logits = head_logits(model, feats).cpu().numpy()
+                for (vi, _), l in zip(chunk, logits):
+                    out[vi] = l
+    return out
+
+
+def p_fake_from_logits(logits, temperature):
+    z = logits / temperature
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e[:, 1] / e.sum(axis=1)
+
+
+def sweep(model, device, cache_dir, index, seq_options, temperatures, thresholds):
+    emb = np.load(os.path.join(cache_dir, "embeddings.npy"), mmap_mode="r")
+    videos = [v for v in index["videos"] if v["count"]]
+    y = np.array([v["label"] == "fake" for v in videos])
+    methods = np.array([v["method"] if v["label"] == "fake" else "REAL" for v in videos])
+
+    results = []
+    for name, seq_len in seq_options:
+        t0 = time.perf_counter()
+        logits = video_logits(model, device, emb, videos, seq_len)
+        auc = roc_auc(y, logits[:, 1] - logits[:, 0])  # temperature doesn't change the ranking
+        for temp in temperatures:
+            p = p_fake_from_logits(logits, temp)
+            for thr in thresholds:
+                results.append({"seq": name, "temperature": temp, "threshold": round(float(thr), 4),
+                                "roc_auc": auc, **metrics_for(y, p, thr, methods)})
+        print(f"SEQ {name}: {len(temperatures) * len(thresholds)} SETTINGS IN {time.perf_counter() - t0:.2f}s")
+
+    # Per-crop scoring (what the live preview shows), judged against the video's label
+    crop_logits = np.load(os.path.join(cache_dir, "crop_logits.npy"), mmap_mode="r")
+    crop_y = np.concatenate([np.full(v["count"], v["label"] == "fake") for v in videos])
+    crop_idx = np.concatenate([np.arange(v["start"], v["start"] + v["count"]) for v in videos])
+    crop_l = np.asarray(crop_logits[crop_idx])
+    crop_auc = roc_auc(crop_y, crop_l[:, 1] - crop_l[:, 0])
+    for temp in temperatures:
+        p = p_fake_from_logits(crop_l, temp)
+        for thr in thresholds:
+            results.append({"seq": "crop", "temperature": temp, "threshold": round(float(thr), 4),
+                            "roc_auc": crop_auc, **metrics_for(crop_y, p, thr)})
+    return results
+
+
+def _parse_floats(spec):
+    """'1,1.58,2' or 'start:stop:step' (inclusive)."""
+    if ":" in spec:
+        start, stop, step = (float(x) for x in spec.split(":"))
+        return [round(x, 6) for x in np.arange(start, stop + step / 2, step)]
+    return [float(x) for x in spec.split(",") if x]
+
+
+def _best(rows):
+    return max(rows, key=lambda r: (r["accuracy"], r["fake_f1"] + r["real_f1"], -r["brier"]))
+
+
+def print_report(results, current):
+    print("\n| Seq | Best T | Best threshold | Accuracy | ROC-AUC | REAL F1 | FAKE F1 | Brier | Accuracy @ current |")
+    print("|-----|-------:|---------------:|---------:|--------:|--------:|--------:|------:|-------------------:|")
+    for seq in dict.fromkeys(r["seq"] for r in results):
+        rows = [r for r in results if r["seq"] == seq]
+        b = _best(rows)
+        cur = [r for r in rows if r["temperature"] == current[0] and r["threshold"] == current[1]]
+        cur_acc = f"{cur[0]['accuracy']:.4f}" if cur else "-"
+        print(f"| {seq} | {b['temperature']:g} | {b['threshold']:g} | {b['accuracy']:.4f} | {b['roc_auc']:.4f} | "
+              f"{b['real_f1']:.4f} | {b['fake_f1']:.4f} | {b['brier']:.4f} | {cur_acc} |")
+
+    video_rows = [r for r in results if r["seq"] != "crop"]
+    if not video_rows:
+        return
+    b = _best(video_rows)
+    print(f"\nACCURACY BY TYPE (SEQ {b['seq']}, T = {b['temperature']:g}, THRESHOLD = {b['threshold']:g})\n")
+    print("| Deepfake Type | Accuracy |")
+    print("|---------------|---------:|")
+    for m, acc in b["per_method"].items():
+        print(f"| {m} | {acc * 100:.2f} % |")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Evaluate VideoResNetLSTM with cached embeddings and sweep calibration")
+    parser.add_argument("--root", type=str, default="data/processed",
+                        help="Organized dataset or packed root (see sequence_loader.py)")
+    parser.add_argument("--split", type=str, default="test")
+    parser.add_argument("--weights", type=str, default=DEFAULT_WEIGHTS)
+    parser.add_argument("--cache_dir", type=str, default=None, help="Default: <root>/eval_cache/<split>")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute embeddings even if cached")
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--batch_size", type=int, default=64, help="Crops per backbone batch while caching")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--fps", type=float, default=5, help="Crop sampling rate used in preprocessing")
+    parser.add_argument("--seconds", type=str, default="1,2,4,all",
+                        help="Sequence lengths in seconds of video ('all' = every crop, as the API)")
+    parser.add_argument("--temperatures", type=str, default="1,1.25,1.58,2,2.5")
+    parser.add_argument("--thresholds", type=str, default="0.30:0.80:0.02")
+    parser.add_argument("--output", type=str, default=None, help="Write every swept setting as JSON")
+    args = parser.parse_args()
+
+    from model import load_model
+    from utils.inference import TEMPERATURE, FAKE_THRESHOLD
+
+    root = os.path.expanduser(args.root)
+    cache_dir = args.cache_dir or os.path.join(root, "eval_cache", args.split)
+    model = load_model(args.weights, args.device)
+
+    index = load_or_build_cache(model, args.device, root, args.split, cache_dir, args.weights, args.rebuild,
+                                batch_size=args.batch_size, workers=args.workers)
+    seq_options = []
+    for s in args.seconds.split(","):
+        if s == "all":
+            seq_options.append(("all", None))
+        elif s:
+            seq_options.append((f"{s}s", max(1, int(round(float(s) * args.fps)))))
+    temperatures = sorted(set(_parse_floats(args.temperatures)) | {TEMPERATURE})
+    thresholds = sorted(set(round(t, 4) for t in _parse_floats(args.thresholds)) | {FAKE_THRESHOLD})
+
+    results = sweep(model, args.device, cache_dir, index, seq_options, temperatures, thresholds)
+    print_report(results, (TEMPERATURE, FAKE_THRESHOLD))
+    print(f"\nCURRENT CALIBRATION: T = {TEMPERATURE:g}, THRESHOLD = {FAKE_THRESHOLD:g} "
+          f"(override with MODEL_TEMPERATURE / FAKE_THRESHOLD)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+        print(f"WROTE {len(results)} SETTINGS TO {args.output}")
+
+
+if __name__ == "__main__":
+    main()
+
+
+# python scripts/evaluate.py --root ~/DF-SCAN/data/processed_1000 --split test
+# python scripts/evaluate.py --root ~/DF-SCAN/data/packed_1000 --split val --seconds 1,2,all --output sweep.json
@@ -0,0 +1,213 @@
+"""
+extract_faces.py — Fused per-video preprocessing: decode -> detect -> crop
+
+Replaces extract_frames.py + detect_faces*.py for building the dataset.
+Each worker decodes the sampled frames of one video in memory, detects
+faces and writes only the 224x224 crops, so the full-resolution frames are
+never written to (or read back from) disk. Crops keep the layout and names
+produced by the two-pass pipeline:
+
+    faces_root/<label>/<label>_<method>_<video>/frame_0001_face_0.jpg
+
+Progress is recorded per video in the work manifest, so reruns only process
+new or changed videos.
+"""
+
+import os
+import shutil
+import time
+from multiprocessing import Pool, cpu_count
+
+import cv2
+from PIL import Image
+from tqdm import tqdm
+
+from extract_frames import detect_label_from_path
+from manifest import Manifest, params_hash, file_signature, default_manifest_path
+
+VIDEO_EXTS = (".mp4", ".avi", ".mov", ".mkv")
+
+# Per-worker detector, built once by _init_worker
+_detector = {}
+
+
+def _init_worker(detector, chunk_size):
+    _detector["name"] = detector
+    _detector["chunk_size"] = chunk_size
+    if detector == "mtcnn":
+        import torch
+        from facenet_pytorch import MTCNN
+
+        device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+        _detector["mtcnn"] = MTCNN(keep_all=True, device=device)
+    else:
+        import face_recognition
+
+        _detector["face_recognition"] = face_recognition
+
+
+def iter_sampled_frames(video_path, fps=5):
+    """Yield (index, rgb) for frames sampled at ~fps; index is 1-based like ffmpeg's frame_%04d."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"cannot open {video_path}")
+    src_fps = cap.get(cv2.CAP_PROP_FPS) or 0
+    step = max(1, round(src_fps / fps)) if src_fps > 0 and fps > 0 else 1
+    i = n = 0
+    try:
+        while True:
+            # grab() skips colour conversion for frames we don't keep
+            if not cap.grab():
+                break
+            if i % step == 0:
+                ok, bgr = cap.retrieve()
+                if not ok:
+                    break
+                n += 1
+                yield n, cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+            i += 1
+    finally:
+        cap.release()
+
+
+def _chunks(it, size):
+    chunk = []
+    for x in it:
+        chunk.append(x)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _detect(frames):
+    """Boxes as (x1, y1, x2, y2) per frame, using the worker's detector."""
+    if _detector["name"] == "mtcnn":
+        images = [Image.fromarray(rgb) for _, rgb in frames]
+        boxes, _ = _detector["mtcnn"].detect(images)
+        return [[tuple(int(v) for v in b) for b in bs] if bs is not None else [] for bs in boxes]
+    fr = _detector["face_recognition"]
+    out = []
+    for _, rgb in frames:
+        out.append([(left, top, right, bottom) for top, right, bottom, left in fr.face_locations(rgb, model="hog")])
+    return out
+
+
+def faces_dir_for(video_path, faces_root):
+    label = detect_label_from_path(video_path)
+    method_name = os.path.basename(os.path.dirname(video_path))
+    video_name = os.path.splitext(os.path.basename(video_path))[0]
+    # detect_faces*.py prefix the label (the frames' parent folder), keep the same ids
+    return os.path.join(faces_root, label, f"{label}_{method_name}_{video_name}")
+
+
+def process_video(args):
+    video_path, faces_root, fps, margin, image_size = args
+    output_dir = faces_dir_for(video_path, faces_root)
+    shutil.rmtree(output_dir, ignore_errors=True)
+    saved = []
+    frames = 0
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        for chunk in _chunks(iter_sampled_frames(video_path, fps), _detector["chunk_size"]):
+            frames += len(chunk)
+            for (n, rgb), boxes in zip(chunk, _detect(chunk)):
+                h, w = rgb.shape[:2]
+                for i, (x1, y1, x2, y2) in enumerate(boxes):
+                    x1, y1 = max(0, x1 - margin), max(0, y1 - margin)
+                    x2, y2 = min(w, x2 + margin), min(h, y2 + margin)
+                    if x2 <= x1 or y2 <= y1:
+                        continue
+                    crop = cv2.resize(rgb[y1:y2, x1:x2], (image_size, image_size), interpolation=cv2.INTER_AREA)
+                    out_path = os.path.join(output_dir, f"frame_{n:04d}_face_{i}.jpg")
+                    cv2.imwrite(out_path, cv2.cvtColor(crop, cv2.COLOR_RGB2BGR))
+                    saved.append(out_path)
+    except Exception as e:
+        return video_path, frames, None, f"{type(e).__name__}: {e}"
+    return video_path, frames, saved, None
+
+
+def extract_faces_from_videos(input_dir, faces_root, fps=5, detector="mtcnn", num_workers=None,
+                              chunk_size=16, margin=20, image_size=224, manifest_path=None, force=False):
+    video_paths = []
+    for root, _, files in os.walk(input_dir):
+        for file in files:
+            if file.lower().endswith(VIDEO_EXTS):
+                video_paths.append(os.path.join(root, file))
+
+    print(f"FOUND {len(video_paths)} VIDEOS IN {input_dir}")
+    os.makedirs(faces_root, exist_ok=True)
+
+    manifest = Manifest(manifest_path or default_manifest_path(faces_root))
+    phash = params_hash(fps=fps, detector=detector, margin=margin, image_size=image_size,
+                        faces_root=os.path.abspath(faces_root))
+    items = {os.path.relpath(vp, input_dir): file_signature(vp) for vp in video_paths}
+    if force:
+        manifest.forget("fused")
+    todo = [item for item, _ in manifest.pending("fused", items, phash)]
+    print(f"{len(items) - len(todo)} VIDEOS UP TO DATE; {len(todo)} TO PROCESS")
+    if not todo:
+        manifest.close()
+        return
+
+    num_workers = num_workers or max(1, cpu_count() - 2)
+    print(f"USING {num_workers} WORKERS ({detector.upper()}, CHUNKS OF {chunk_size} FRAMES)\n")
+
+    t0 = time.perf_counter()
+    frames = crops = errors = 0
+    try:
+        with Pool(num_workers, initializer=_init_worker, initargs=(detector, chunk_size)) as pool:
+            for video_path, n_frames, saved, error in tqdm(
+                pool.imap_unordered(
+                    process_video,
+                    [(os.path.join(input_dir, item), faces_root, fps, margin, image_size) for item in todo]
+                ),
+                total=len(todo),
+                desc="EXTRACTING FACES"
+            ):
+                item = os.path.relpath(video_path, input_dir)
+                frames += n_frames
+                if error:
+                    errors += 1
+                    print(f"ERROR PROCESSING {video_path}: {error}")
+                    manifest.mark("fused", item, "error", items[item], phash, error=error)
+                else:
+                    crops += len(saved)
+                    manifest.mark("fused", item, "done", items[item], phash, outputs=saved)
+    finally:
+        # Also on Ctrl-C, so finished items are not redone next run
+        manifest.close()
+
+    wall = time.perf_counter() - t0
+    print(f"\nFACE EXTRACTION COMPLETED: {len(todo)} VIDEOS, {frames} FRAMES, {crops} CROPS, {errors} ERRORS "
+          f"IN {wall:.1f}s ({frames / wall:.1f} FRAMES/s)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Decode, detect and crop faces per video in one pass")
+    parser.add_argument("--input_dir", type=str, default="data/raw/ff-c23/FaceForensics++_C23",
+                        help="Path to FaceForensics++ dataset root")
+    parser.add_argument("--faces_root", type=str, default="data/intermediate/faces",
+                        help="Where to save cropped faces")
+    parser.add_argument("--fps", type=int, default=5, help="Frames per second to sample from each video")
+    parser.add_argument("--detector", type=str, choices=["mtcnn", "hog"], default="mtcnn",
+                        help="mtcnn (detect_faces.py) or hog (detect_faces_v2.py)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all but 2)")
+    parser.add_argument("--chunk_size", type=int, default=16, help="Frames per detector call")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="Work manifest for resuming (default: manifest.db next to faces_root)")
+    parser.add_argument("--force", action="store_true", help="Ignore the manifest and reprocess every video")
+    args = parser.parse_args()
+
+    extract_faces_from_videos(os.path.expanduser(args.input_dir), os.path.expanduser(args.faces_root), args.fps,
+                              args.detector, args.workers, args.chunk_size, manifest_path=args.manifest,
+                              force=args.force)
+
+
+# python scripts/extract_faces.py \
+#   --input_dir ~/DF-SCAN/data/experiment_100/ff-c23/FaceForensics++_C23 \
+#   --faces_root ~/DF-SCAN/data/intermediate_100/faces \
+#   --workers 6
@@ -1,12 +1,15 @@
 import os
+import shutil
 import subprocess
 from multiprocessing import Pool, cpu_count
 from tqdm import tqdm
+from manifest import Manifest, params_hash, file_signature, default_manifest_path
 
 def extract_frames(video_path: str, output_dir: str, fps: int = 5):
     """
     Extract frames from a single video using FFmpeg.
     Saves frames in output_dir/frame_0001.jpg, frame_0002.jpg, ...
+    Returns FFmpeg's error output, or None on success.
     """
     os.makedirs(output_dir, exist_ok=True)
 
@@ -20,7 +23,10 @@ def extract_frames(video_path: str, output_dir: str, fps: int = 5):
         "-loglevel", "error"
     ]
 
-    subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        return result.stderr.decode(errors="replace").strip() or f"ffmpeg exited with {result.returncode}"
+    return None
 
 
 def detect_label_from_path(video_path: str) -> str:
@@ -38,19 +44,26 @@ def detect_label_from_path(video_path: str) -> str:
     return "real"
 
 
-def process_video(args):
-    video_path, frames_root, fps = args
+def frames_dir_for(video_path: str, frames_root: str) -> str:
     label = detect_label_from_path(video_path)
     # Include method name to avoid collisions
     method_name = os.path.basename(os.path.dirname(video_path))
     video_name = os.path.splitext(os.path.basename(video_path))[0]
     unique_video_id = f"{method_name}_{video_name}"
-    output_dir = os.path.join(frames_root, label, unique_video_id)
-    extract_frames(video_path, output_dir, fps)
-    return video_path
+    return os.path.join(frames_root, label, unique_video_id)
 
 
-def extract_frames_from_videos(input_dir: str, output_dir: str, fps: int = 5, num_workers: int = None):
+def process_video(args):
+    video_path, frames_root, fps = args
+    output_dir = frames_dir_for(video_path, frames_root)
+    # Start clean so a rerun never mixes frames from an interrupted or older extraction
+    shutil.rmtree(output_dir, ignore_errors=True)
+    error = extract_frames(video_path, output_dir, fps)
+    return video_path, output_dir, error
+
+
+def extract_frames_from_videos(input_dir: str, output_dir: str, fps: int = 5, num_workers: int = None,
+                               manifest_path: str = None, force: bool = False):
     video_paths = []
     for root, _, files in os.walk(input_dir):
         for file in files:
@@ -60,22 +73,43 @@ def extract_frames_from_videos(input_dir: str, output_dir: str, fps: int = 5, nu
     print(f"FOUND {len(video_paths)} VIDEOS IN {input_dir}")
     os.makedirs(output_dir, exist_ok=True)
 
+    # Only videos that are new, changed, failed or extracted with another fps are redone
+    manifest = Manifest(manifest_path or default_manifest_path(output_dir))
+    phash = params_hash(fps=fps, output_dir=os.path.abspath(output_dir))
+    items = {os.path.relpath(vp, input_dir): file_signature(vp) for vp in video_paths}
+    if force:
+        manifest.forget("frames")
+    todo = [item for item, _ in manifest.pending("frames", items, phash)]
+    print(f"{len(items) - len(todo)} VIDEOS UP TO DATE; {len(todo)} TO EXTRACT")
+    if not todo:
+        manifest.close()
+        return
+
     num_workers = num_workers or max(1, cpu_count() - 2)
     print(f"USING {num_workers} CPU CORES FOR PARALLEL EXTRACTION\n")
 
-    with Pool(num_workers) as pool:
-        list(
-            tqdm(
+    errors = 0
+    try:
+        with Pool(num_workers) as pool:
+            for video_path, frames_dir, error in tqdm(
                 pool.imap_unordered(
                     process_video,
-                    [(vp, output_dir, fps) for vp in video_paths]
+                    [(os.path.join(input_dir, item), output_dir, fps) for item in todo]
                 ),
-                total=len(video_paths),
+                total=len(todo),
                 desc="EXTRACTING FRAMES"
-            )
-        )
+            ):
+                item = os.path.relpath(video_path, input_dir)
+                if error:
+                    errors += 1
+                    manifest.mark("frames", item, "error", items[item], phash, error=error)
+                else:
+                    manifest.mark("frames", item, "done", items[item], phash, outputs=[frames_dir])
+    finally:
+        # Also on Ctrl-C, so finished items are not redone next run
+        manifest.close()
 
-    print("\nFRAME EXTRACTION COMPLETED.")
+    print(f"\nFRAME EXTRACTION COMPLETED ({errors} ERRORS).")
 
 
 if __name__ == "__main__":
@@ -90,11 +124,15 @@ if __name__ == "__main__":
                         help="FRAMES PER SECOND TO EXTRACT FROM EACH VIDEO")
     parser.add_argument("--workers", type=int, default=None,
                         help="NUMBER OF CPU CORES TO USE (DEFAULT: ALL BUT 2)")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help="WORK MANIFEST FOR RESUMING (DEFAULT: manifest.db NEXT TO OUTPUT_DIR)")
+    parser.add_argument("--force", action="store_true",
+                        help="IGNORE THE MANIFEST AND RE-EXTRACT EVERY VIDEO")
     args = parser.parse_args()
 
     args.input_dir = os.path.expanduser(args.input_dir)
     args.output_dir = os.path.expanduser(args.output_dir)
 
-    extract_frames_from_videos(args.input_dir, args.output_dir, args.fps, args.workers)
+    extract_frames_from_videos(args.input_dir, args.output_dir, args.fps, args.workers, args.manifest, args.force)
 
 # python scripts/extract_frames.py   --input_dir ~/DF-SCAN/data/experiment_100/ff-c23/FaceForensics++_C23   --output_dir ~/DF-SCAN/data/intermediate_100/frames   --fps 5
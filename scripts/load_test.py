@@ -0,0 +1,309 @@
+"""
+load_test.py — HTTP load generator for the DF-SCAN API
+
+Each simulated user runs the real client flow:
+  /upload -> /scan -> /stream (SSE consumed until done) -> /status -> /clear
+
+Users arrive as a Poisson process at --rate per second (or all at once with
+--rate 0), with at most --users in flight. While the test runs a probe thread
+measures /health latency (an event-loop lag proxy: the loop cannot answer
+while a scan blocks it) and scrapes /metrics for the server's RSS and, on
+servers that export it, the dfscan_event_loop_lag_seconds gauge.
+
+Stdlib only, so it runs anywhere the repo does.
+"""
+
+import os
+import json
+import time
+import uuid
+import random
+import threading
+import http.client
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    s = sorted(values)
+    k = (len(s) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+class Client:
+    def __init__(self, base_url, timeout=600.0):
+        u = urlsplit(base_url)
+        self.host = u.hostname
+        self.port = u.port or (443 if u.scheme == "https" else 80)
+        self.https = u.scheme == "https"
+        self.timeout = timeout
+
+    def _conn(self, timeout=None):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=timeout or self.timeout)
+
+    def request(self, method, path, body=None, headers=None, timeout=None):
+        conn = self._conn(timeout)
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            resp = conn.getresponse()
+            data = resp.read()
+            return resp.status, dict(resp.getheaders()), data
+        finally:
+            conn.close()
+
+    def upload(self, video_path):
+        boundary = uuid.uuid4().hex
+        with open(video_path, "rb") as f:
+            content = f.read()
+        name = os.path.basename(video_path)
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{name}\"\r\n"
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+        return self.request("POST", "/upload", body, {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+
+    def stream(self, session_id, t_start, timeout):
+        """Consume SSE until a done event. Returns (first_event_s, verdict_s, events, prediction, status)."""
+        conn = self._conn(timeout)
+        first = verdict = None
+        events = 0
+        prediction = status = None
+        try:
+            conn.request("GET", f"/stream/{session_id}", headers={"Accept": "text/event-stream"})
+            resp = conn.getresponse()
+            if resp.status != 200:
+                return None, None, 0, None, f"http {resp.status}"
+            while True:
+                line = resp.readline()
+                if not line:
+                    break
+                if not line.startswith(b"data:"):
+                    continue
+                events += 1
+                now = time.perf_counter() - t_start
+                if first is None:
+                    first = now
+                try:
+                    payload = json.loads(line[5:].strip())
+                except ValueError:
+                    continue
+                status = payload.get("status")
+                if payload.get("prediction") and verdict is None:
+                    verdict = now
+                    prediction = payload["prediction"]
+                if payload.get("done"):
+                    break
+        finally:
+            conn.close()
+        return first, verdict, events, prediction, status
+
+
+def simulate_user(client, video_path, scan_query, timeout):
+    rec = {"ok": False, "error": None}
+    t0 = time.perf_counter()
+    try:
+        code, _, body = client.upload(video_path)
+        rec["upload_s"] = time.perf_counter() - t0
+        if code != 200:
+            rec["error"] = f"upload {code}"
+            return rec
+        sid = json.loads(body)["session_id"]
+        rec["session_id"] = sid
+
+        t_scan = time.perf_counter()
+        code, headers, _ = client.request("POST", f"/scan/{sid}{scan_query}")
+        if code == 429:
+            rec["error"] = "rejected 429"
+            rec["retry_after"] = headers.get("Retry-After")
+            client.request("POST", f"/clear/{sid}")
+            return rec
+        if code != 200:
+            rec["error"] = f"scan {code}"
+            return rec
+
+        first, verdict, events, prediction, status = client.stream(sid, t_scan, timeout)
+        rec.update(first_event_s=first, verdict_s=verdict, events=events, prediction=prediction)
+
+        code, _, body = client.request("GET", f"/status/{sid}")
+        meta = json.loads(body) if code == 200 else {}
+        rec["final_status"] = meta.get("status")
+        if meta.get("status") == "error":
+            rec["error"] = str(meta.get("error") or status)
+            rec["timeout"] = "timeout" in rec["error"].lower()
+        elif verdict is None:
+            rec["error"] = f"no verdict ({status})"
+        else:
+            rec["ok"] = True
+        client.request("POST", f"/clear/{sid}")
+    except Exception as e:
+        rec["error"] = f"{type(e).__name__}: {e}"
+        rec["timeout"] = isinstance(e, TimeoutError)
+    finally:
+        rec["total_s"] = time.perf_counter() - t0
+    return rec
+
+
+def parse_metrics(text):
+    """Return {metric_name: value} for unlabelled samples of a Prometheus text page."""
+    out = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#") or "{" in line:
+            continue
+        parts = line.split()
+        if len(parts) >= 2:
+            try:
+                out[parts[0]] = float(parts[1])
+            except ValueError:
+                pass
+    return out
+
+
+class Probe(threading.Thread):
+    """Samples /health latency and server metrics until stopped."""
+
+    def __init__(self, client, interval=0.5):
+        super().__init__(daemon=True)
+        self.client = client
+        self.interval = interval
+        self.health_latency = []
+        self.health_failures = 0
+        self.rss = []
+        self.server_lag = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            t0 = time.perf_counter()
+            try:
+                code, _, _ = self.client.request("GET", "/health", timeout=30)
+                self.health_latency.append(time.perf_counter() - t0)
+                if code != 200:
+                    self.health_failures += 1
+            except Exception:
+                self.health_failures += 1
+            try:
+                code, _, body = self.client.request("GET", "/metrics", timeout=30)
+                if code == 200:
+                    m = parse_metrics(body.decode(errors="replace"))
+                    if "process_resident_memory_bytes" in m:
+                        self.rss.append(m["process_resident_memory_bytes"])
+                    # Only exported by servers with the loop watchdog; older ones report "not exported"
+                    if "dfscan_event_loop_lag_seconds" in m:
+                        self.server_lag.append(m["dfscan_event_loop_lag_seconds"])
+            except Exception:
+                pass
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_load_test(base_url, videos, total=20, users=4, rate=0.0, scan_query="", timeout=600.0, seed=0):
+    client = Client(base_url, timeout=timeout)
+    rng = random.Random(seed)
+    probe = Probe(client)
+    probe.start()
+
+    print(f"RUNNING {total} SESSIONS, MAX {users} CONCURRENT, ARRIVAL RATE {rate or 'ALL AT ONCE'}/s AGAINST {base_url}")
+    t0 = time.perf_counter()
+    futures = []
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        for i in range(total):
+            if rate > 0 and i:
+                time.sleep(rng.expovariate(rate))
+            futures.append(pool.submit(simulate_user, client, videos[i % len(videos)], scan_query, timeout))
+        records = [f.result() for f in futures]
+    wall = time.perf_counter() - t0
+    probe.stop()
+
+    ok = [r for r in records if r["ok"]]
+    report = {
+        "config": {"base_url": base_url, "total": total, "users": users, "rate": rate,
+                   "videos": videos, "scan_query": scan_query},
+        "wall_seconds": wall,
+        "throughput_scans_per_min": len(ok) / wall * 60.0 if wall > 0 else None,
+        "ok": len(ok),
+        "errors": len(records) - len(ok),
+        "error_rate": (len(records) - len(ok)) / len(records) if records else 0.0,
+        "timeouts": sum(1 for r in records if r.get("timeout")),
+        "rejected_429": sum(1 for r in records if r.get("error") == "rejected 429"),
+        "time_to_first_event_s": summarize([r["first_event_s"] for r in records if r.get("first_event_s") is not None]),
+        "time_to_verdict_s": summarize([r["verdict_s"] for r in ok]),
+        "upload_s": summarize([r["upload_s"] for r in records if "upload_s" in r]),
+        "health_latency_s": summarize(probe.health_latency),
+        "health_failures": probe.health_failures,
+        "server_event_loop_lag_s": summarize(probe.server_lag) if probe.server_lag else None,
+        "server_rss_mb": {
+            "max": max(probe.rss) / 2 ** 20 if probe.rss else None,
+            "last": probe.rss[-1] / 2 ** 20 if probe.rss else None,
+        },
+        "error_samples": sorted({r["error"] for r in records if r.get("error")})[:10],
+        "sessions": records,
+    }
+    return report
+
+
+def print_report(report):
+    def fmt(s):
+        if not s or not s.get("count"):
+            return "n/a"
+        return f"p50 {s['p50']:.3f}s  p95 {s['p95']:.3f}s  p99 {s['p99']:.3f}s  (n={s['count']})"
+
+    print(f"\nWALL TIME            {report['wall_seconds']:.1f}s")
+    print(f"OK / ERRORS          {report['ok']} / {report['errors']} (error rate {report['error_rate']:.1%}, "
+          f"timeouts {report['timeouts']}, 429 {report['rejected_429']})")
+    if report["throughput_scans_per_min"] is not None:
+        print(f"THROUGHPUT           {report['throughput_scans_per_min']:.2f} scans/min")
+    print(f"TIME TO FIRST EVENT  {fmt(report['time_to_first_event_s'])}")
+    print(f"TIME TO VERDICT      {fmt(report['time_to_verdict_s'])}")
+    print(f"/health LATENCY      {fmt(report['health_latency_s'])} (failures {report['health_failures']})")
+    lag = report["server_event_loop_lag_s"]
+    print(f"SERVER LOOP LAG      {fmt(lag) if lag is not None else 'not exported by this server'}")
+    rss = report["server_rss_mb"]
+    if rss["max"] is not None:
+        print(f"SERVER RSS           max {rss['max']:.0f} MB, last {rss['last']:.0f} MB")
+    for e in report["error_samples"]:
+        print(f"  ERROR: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load test the DF-SCAN HTTP API")
+    parser.add_argument("--base_url", type=str, default="http://127.0.0.1:8000")
+    parser.add_argument("--video", type=str, action="append", required=True,
+                        help="Video to upload (repeat for a mix; used round-robin)")
+    parser.add_argument("--total", type=int, default=20, help="Total simulated sessions")
+    parser.add_argument("--users", type=int, default=4, help="Max concurrent simulated users")
+    parser.add_argument("--rate", type=float, default=0.0, help="Poisson arrival rate per second (0 = all at once)")
+    parser.add_argument("--scan_query", type=str, default="", help="Query string appended to /scan, e.g. '?priority=1'")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Per-request socket timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON report path")
+    args = parser.parse_args()
+
+    report = run_load_test(args.base_url, args.video, args.total, args.users, args.rate,
+                           args.scan_query, args.timeout, args.seed)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nREPORT WRITTEN TO {args.output}")
+
+
+# python scripts/load_test.py --video sample.mp4 --total 50 --users 10 --rate 0.5 --output load_report.json
@@ -0,0 +1,156 @@
+"""
+manifest.py — Work manifest for resumable preprocessing
+
+One SQLite row per (stage, item) records whether the item is done, the
+input file signature (size + mtime) and a hash of the parameters it was
+produced with, plus its output paths. Stages ask for `pending()` work
+and only redo items that are new, failed, changed on disk, produced with
+different parameters or whose outputs have gone missing.
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+
+
+def params_hash(**params):
+    """Stable short hash of the parameters that shape a stage's output."""
+    blob = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode()).hexdigest()[:16]
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def _remove_files(paths):
+    for p in paths:
+        if os.path.exists(p):
+            os.remove(p)
+
+
+def default_manifest_path(output_root):
+    """Manifest next to a stage's output folder, e.g. data/intermediate/manifest.db."""
+    return os.path.join(os.path.dirname(os.path.abspath(os.path.expanduser(output_root))), "manifest.db")
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS work (
+                stage TEXT NOT NULL,
+                item TEXT NOT NULL,
+                status TEXT NOT NULL,
+                input_sig TEXT,
+                params_hash TEXT,
+                outputs TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (stage, item)
+            )
+            """
+        )
+        self._pending_writes = []
+
+    def rows(self, stage):
+        cur = self.conn.execute(
+            "SELECT item, status, input_sig, params_hash, outputs FROM work WHERE stage = ?", (stage,)
+        )
+        return {item: {"status": status, "input_sig": sig, "params_hash": ph, "outputs": json.loads(out or "[]")}
+                for item, status, sig, ph, out in cur}
+
+    def pending(self, stage, items, phash, check_outputs=True):
+        """
+        Filter `items` ({item: input_sig}) down to the ones that need (re)work.
+        Returns [(item, previous_outputs)] so callers can remove stale outputs first.
+        """
+        known = self.rows(stage)
+        todo = []
+        for item, sig in items.items():
+            row = known.get(item)
+            if (
+                row is None
+                or row["status"] != "done"
+                or row["input_sig"] != sig
+                or row["params_hash"] != phash
+                or (check_outputs and not all(os.path.exists(p) for p in row["outputs"]))
+            ):
+                todo.append((item, row["outputs"] if row else []))
+        return todo
+
+    def reconcile(self, stage, items, phash, force=False):
+        """
+        Like pending(), for stages with one output set per input file: items that
+        disappeared (e.g. a re-extracted video's old frames) lose their outputs
+        and rows, and items to redo have their previous outputs removed.
+        Returns the items to (re)process; force redoes all of them.
+        """
+        if force:
+            self.forget(stage)
+        gone = {item: row for item, row in self.rows(stage).items() if item not in items}
+        for row in gone.values():
+            _remove_files(row["outputs"])
+        self.forget(stage, list(gone))
+        todo = []
+        for item, stale in self.pending(stage, items, phash):
+            _remove_files(stale)
+            todo.append(item)
+        return todo
+
+    def mark(self, stage, item, status, input_sig=None, phash=None, outputs=None, error=None):
+        """Queue a result; written in batches by flush() (and every 500 marks).
+
+        Callers close() the manifest in a `finally`, so an interrupted run keeps
+        the results queued so far.
+        """
+        self._pending_writes.append(
+            (stage, item, status, input_sig, phash, json.dumps(outputs or []), error, time.time())
+        )
+        if len(self._pending_writes) >= 500:
+            self.flush()
+
+    def flush(self):
+        if not self._pending_writes:
+            return
+        self.conn.execute("BEGIN")
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO work(stage, item, status, input_sig, params_hash, outputs, error, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            self._pending_writes,
+        )
+        self.conn.execute("COMMIT")
+        self._pending_writes = []
+
+    def forget(self, stage, items=None):
+        """Drop a stage's rows (all of them, or just `items`) so they are redone."""
+        self.flush()
+        if items is None:
+            self.conn.execute("DELETE FROM work WHERE stage = ?", (stage,))
+        else:
+            self.conn.executemany("DELETE FROM work WHERE stage = ? AND item = ?", [(stage, i) for i in items])
+
+    def fingerprint(self, stage):
+        """Changes whenever any item of `stage` is redone; lets later stages detect new input."""
+        self.flush()
+        n, last = self.conn.execute(
+            "SELECT COUNT(*), MAX(updated_at) FROM work WHERE stage = ? AND status = 'done'", (stage,)
+        ).fetchone()
+        return f"{n}:{last or 0}"
+
+    def summary(self, stage):
+        self.flush()
+        cur = self.conn.execute("SELECT status, COUNT(*) FROM work WHERE stage = ? GROUP BY status", (stage,))
+        return dict(cur.fetchall())
+
+    def close(self):
+        self.flush()
+        self.conn.close()
@@ -1,48 +1,182 @@
 import os
+import json
 import random
 import shutil
 from tqdm import tqdm
 
+SPLITS_FILENAME = "splits.json"
+MODES = ["copy", "hardlink", "symlink", "move", "manifest"]
+
 def create_dir(path):
     if not os.path.exists(path):
         os.makedirs(path)
 
+def assign_splits(videos, train_ratio, val_ratio, rng):
+    """Shuffle and cut at the ratios. Sorted first so the split no longer depends on listdir order."""
+    videos = sorted(videos)
+    rng.shuffle(videos)
+    train_end = int(train_ratio * len(videos))
+    val_end = int((train_ratio + val_ratio) * len(videos))
+    return {
+        "train": videos[:train_end],
+        "val": videos[train_end:val_end],
+        "test": videos[val_end:]
+    }
+
+def assign_new_videos(videos, counts, ratios, rng):
+    """
+    Spread videos added since the last run over the existing splits: each one
+    (shuffled) goes to the split furthest below its target share of the
+    growing total, so small increments keep the overall ratios.
+    """
+    videos = sorted(videos)
+    rng.shuffle(videos)
+    counts = dict(counts)
+    out = {split: [] for split in counts}
+    for vid in videos:
+        total = sum(counts.values()) + 1
+        split = max(counts, key=lambda s: ratios[s] * total - counts[s])
+        counts[split] += 1
+        out[split].append(vid)
+    return out
+
+def _up_to_date(src, dst):
+    """copy2 and hardlinks keep the source mtime, so a changed source shows up as a size or mtime mismatch."""
+    try:
+        s, d = os.stat(src), os.stat(dst)
+    except OSError:
+        return False
+    return s.st_size == d.st_size and abs(s.st_mtime - d.st_mtime) < 1
+
+def _link_files(src_dir, dst_dir, link):
+    """Copy or hardlink every file of a video folder, skipping files already in place."""
+    create_dir(dst_dir)
+    for name in os.listdir(src_dir):
+        src, dst = os.path.join(src_dir, name), os.path.join(dst_dir, name)
+        if _up_to_date(src, dst):
+            continue
+        if os.path.exists(dst):
+            os.remove(dst)
+        if link:
+            os.link(src, dst)
+        else:
+            shutil.copy2(src, dst)
+
+def place_video(src_dir, dst_dir, mode):
+    """Materialize one video folder in its split. Safe to call again after an interrupted run."""
+    if mode == "manifest":
+        return
+    if mode == "symlink":
+        if not os.path.islink(dst_dir):
+            create_dir(os.path.dirname(dst_dir))
+            os.symlink(os.path.abspath(src_dir), dst_dir, target_is_directory=True)
+    elif mode == "move":
+        if os.path.isdir(src_dir) and not os.path.exists(dst_dir):
+            create_dir(os.path.dirname(dst_dir))
+            shutil.move(src_dir, dst_dir)
+    else:
+        _link_files(src_dir, dst_dir, link=(mode == "hardlink"))
+
+def _load_splits(output_root):
+    path = os.path.join(output_root, SPLITS_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def _save_splits(output_root, data):
+    path = os.path.join(output_root, SPLITS_FILENAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+def _undo(faces_root, output_root, previous):
+    """Remove a previous split (moving folders back in move mode) before re-splitting."""
+    for split, by_cls in previous["splits"].items():
+        for cls, vids in by_cls.items():
+            for vid in vids:
+                dst_dir = os.path.join(output_root, split, cls, vid)
+                if previous["mode"] == "move":
+                    src_dir = os.path.join(faces_root, cls, vid)
+                    if os.path.isdir(dst_dir) and not os.path.exists(src_dir):
+                        shutil.move(dst_dir, src_dir)
+                elif os.path.islink(dst_dir):
+                    os.unlink(dst_dir)
+                elif os.path.isdir(dst_dir):
+                    shutil.rmtree(dst_dir)
+
 def split_dataset_by_video(faces_root, output_root,
-                           train_ratio=0.7, val_ratio=0.15, test_ratio=0.15, seed=42):
-    random.seed(seed)
-    
+                           train_ratio=0.7, val_ratio=0.15, test_ratio=0.15, seed=42,
+                           mode="copy", force=False):
+    """
+    Split video folders into train/val/test and materialize them with `mode`:
+    copy, hardlink (per file), symlink (per video folder), move, or manifest
+    (only write output_root/splits.json). The assignment is saved to
+    splits.json and reused on reruns, so any mode can resume and rerunning
+    is a no-op. Videos added later go to the splits furthest below their
+    target ratio (see assign_new_videos).
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
     classes = ["real", "fake"]
     splits = ["train", "val", "test"]
-    
+    params = {"train_ratio": train_ratio, "val_ratio": val_ratio, "test_ratio": test_ratio, "seed": seed}
+    create_dir(output_root)
+
+    previous = _load_splits(output_root)
+    if previous and (previous["params"] != params or previous["mode"] != mode):
+        if not force:
+            raise SystemExit(f"{output_root} WAS SPLIT WITH {previous['mode']} {previous['params']}; "
+                             f"USE --force TO RE-SPLIT OR PICK ANOTHER OUTPUT_ROOT.")
+        print("PARAMETERS CHANGED, UNDOING PREVIOUS SPLIT.")
+        _undo(faces_root, output_root, previous)
+        previous = None
+    if previous is None and mode != "manifest" and any(
+        os.path.isdir(os.path.join(output_root, s, c)) and os.listdir(os.path.join(output_root, s, c))
+        for s in splits for c in classes
+    ):
+        # Splits from before splits.json existed can't be matched; adding to them could leak videos across splits
+        raise SystemExit(f"{output_root} ALREADY HOLDS A SPLIT WITHOUT {SPLITS_FILENAME}; PICK ANOTHER OUTPUT_ROOT.")
+    assigned = previous["splits"] if previous else {s: {c: [] for c in classes} for s in splits}
+    # One generator for both classes, like random.seed(seed) followed by a shuffle per class
+    rng = random.Random(seed)
+
     # CREATE SPLIT DIRECTORIES
-    for split in splits:
-        for cls in classes:
-            create_dir(os.path.join(output_root, split, cls))
-    
+    if mode != "manifest":
+        for split in splits:
+            for cls in classes:
+                create_dir(os.path.join(output_root, split, cls))
+
     for cls in classes:
         class_dir = os.path.join(faces_root, cls)
         videos = [d for d in os.listdir(class_dir)
-                  if os.path.isdir(os.path.join(class_dir, d))]
-        
-        print(f"\nFOUND {len(videos)} {cls.upper()} VIDEOS.")
-        random.shuffle(videos)
-
-        train_end = int(train_ratio * len(videos))
-        val_end = int((train_ratio + val_ratio) * len(videos))
-        
-        split_videos = {
-            "train": videos[:train_end],
-            "val": videos[train_end:val_end],
-            "test": videos[val_end:]
-        }
-        
-        for split, vid_list in split_videos.items():
-            for vid in tqdm(vid_list, desc=f"COPYING {cls} → {split}", leave=False):
+                  if os.path.isdir(os.path.join(class_dir, d))] if os.path.isdir(class_dir) else []
+        known = {v for s in splits for v in assigned[s][cls]}
+        new = [v for v in videos if v not in known]
+
+        print(f"\nFOUND {len(videos)} {cls.upper()} VIDEOS ({len(new)} NEW).")
+        if new:
+            if known:
+                counts = {s: len(assigned[s][cls]) for s in splits}
+                ratios = {"train": train_ratio, "val": val_ratio, "test": test_ratio}
+                placed = assign_new_videos(new, counts, ratios, rng)
+            else:
+                placed = assign_splits(new, train_ratio, val_ratio, rng)
+            for split, vid_list in placed.items():
+                assigned[split][cls].extend(vid_list)
+        # Record the assignment before touching files so an interrupted run resumes with the same split
+        _save_splits(output_root, {"params": params, "mode": mode, "faces_root": os.path.abspath(faces_root),
+                                   "splits": assigned})
+
+        if mode == "manifest":
+            continue
+        for split in splits:
+            for vid in tqdm(assigned[split][cls], desc=f"{mode.upper()} {cls} → {split}", leave=False):
                 src_dir = os.path.join(class_dir, vid)
                 dst_dir = os.path.join(output_root, split, cls, vid)
-                shutil.copytree(src_dir, dst_dir)
-    
-    print("\nDATASET ORGANIZED SUCCESSFULLY.")
+                place_video(src_dir, dst_dir, mode)
+
+    print(f"\nDATASET ORGANIZED SUCCESSFULLY ({mode.upper()}; SPLITS IN {os.path.join(output_root, SPLITS_FILENAME)}).")
 
 if __name__ == "__main__":
     import argparse
@@ -55,10 +189,16 @@ if __name__ == "__main__":
     parser.add_argument("--val_ratio", type=float, default=0.15)
     parser.add_argument("--test_ratio", type=float, default=0.15)
     parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mode", type=str, choices=MODES, default="copy",
+                        help="copy, hardlink, symlink, move, or manifest (splits.json only)")
+    parser.add_argument("--force", action="store_true",
+                        help="Undo an existing split made with other parameters and re-split")
     args = parser.parse_args()
-    
+
     split_dataset_by_video(args.faces_root, args.output_root,
-                           args.train_ratio, args.val_ratio, args.test_ratio, args.seed)
+                           args.train_ratio, args.val_ratio, args.test_ratio, args.seed,
+                           args.mode, args.force)
 
 
 # python3 scripts/organize_dataset.py   --faces_root data/intermediate_100/faces   --output_root data/processed_100
+# python3 scripts/organize_dataset.py   --faces_root data/intermediate_100/faces   --output_root data/processed_100   --mode hardlink
@@ -0,0 +1,250 @@
+"""
+packed_dataset.py — Packed, sharded face-crop dataset
+
+Packs an organized dataset (split/label/video/*.jpg, or the splits.json
+written by organize_dataset.py --mode manifest) into a few large
+uint8 arrays per split, so copying, listing and loading no longer touch
+millions of small JPEGs:
+
+    packed_root/<split>/shard_00000.npy   uint8 [N, 224, 224, 3] (.npy, memory-mappable)
+    packed_root/<split>/index.json        per-video label, method, shard, offset, frame numbers
+
+A video's crops are contiguous in one shard, so PackedSequenceDataset can
+hand out [T, 3, 224, 224] sequences for VideoResNetLSTM as views into the
+memory map without copying or decoding anything.
+"""
+
+import os
+import re
+import json
+import time
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import Dataset
+from tqdm import tqdm
+
+from organize_dataset import SPLITS_FILENAME
+
+SPLITS = ["train", "val", "test"]
+CLASSES = ["real", "fake"]
+INDEX_FILENAME = "index.json"
+IMAGE_SIZE = 224
+# Same normalization as val_transform in backend/utils/inference.py
+MEAN = (0.485, 0.456, 0.406)
+STD = (0.229, 0.224, 0.225)
+
+_CROP_NAME = re.compile(r"frame_(\d+)(?:_face_(\d+))?")
+
+
+def _crop_key(name):
+    m = _CROP_NAME.search(name)
+    return (int(m.group(1)), int(m.group(2) or 0)) if m else (0, 0)
+
+
+def _method_of(video_id, label):
+    # Crop folders are named <label>_<method>_<video> by detect_faces*.py / extract_faces.py
+    parts = video_id.split("_")
+    if len(parts) >= 3 and parts[0] == label:
+        return parts[1]
+    return parts[0] if len(parts) >= 2 else "unknown"
+
+
+def _load_video(args):
+    video_dir, image_size = args
+    names = sorted((f for f in os.listdir(video_dir) if f.lower().endswith(".jpg")), key=_crop_key)
+    arr = np.empty((len(names), image_size, image_size, 3), dtype=np.uint8)
+    for i, name in enumerate(names):
+        img = Image.open(os.path.join(video_dir, name)).convert("RGB")
+        if img.size != (image_size, image_size):
+            img = img.resize((image_size, image_size))
+        arr[i] = np.asarray(img)
+    return video_dir, [_crop_key(n) for n in names], arr
+
+
+def list_split_videos(data_root, split):
+    """(label, video_id, folder) for a split, from split folders or a manifest-mode splits.json."""
+    manifest = os.path.join(data_root, SPLITS_FILENAME)
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            splits = json.load(f)
+        if splits["mode"] == "manifest":
+            return [(label, vid, os.path.join(splits["faces_root"], label, vid))
+                    for label in CLASSES for vid in sorted(splits["splits"][split].get(label, []))]
+    videos = []
+    for label in CLASSES:
+        label_dir = os.path.join(data_root, split, label)
+        if not os.path.isdir(label_dir):
+            continue
+        for vid in sorted(os.listdir(label_dir)):
+            if os.path.isdir(os.path.join(label_dir, vid)):
+                videos.append((label, vid, os.path.join(label_dir, vid)))
+    return videos
+
+
+def pack_split(videos, out_dir, shard_size=8192, image_size=IMAGE_SIZE, num_workers=None, name=""):
+    """Pack (label, video_id, folder) entries into shards + index.json in out_dir."""
+    if not videos:
+        raise ValueError(f"No videos to pack for {out_dir}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Count crops first so every shard can be allocated at its final size
+    counts = [sum(1 for f in os.listdir(d) if f.lower().endswith(".jpg")) for _, _, d in videos]
+    layout, shard_sizes = [], [0]
+    for n in counts:
+        if shard_sizes[-1] and shard_sizes[-1] + n > shard_size:
+            shard_sizes.append(0)  # videos never straddle shards
+        layout.append((len(shard_sizes) - 1, shard_sizes[-1]))
+        shard_sizes[-1] += n
+
+    shard_names = [f"shard_{i:05d}.npy" for i in range(len(shard_sizes))]
+    shards = [
+        np.lib.format.open_memmap(os.path.join(out_dir, name + ".tmp"), mode="w+", dtype=np.uint8,
+                                  shape=(size, image_size, image_size, 3))
+        for name, size in zip(shard_names, shard_sizes)
+    ]
+
+    entries = []
+    num_workers = num_workers or max(1, cpu_count() - 2)
+    with Pool(num_workers) as pool:
+        jobs = [(d, image_size) for _, _, d in videos]
+        for (label, vid, _), (shard, start), (_, keys, arr) in tqdm(
+            zip(videos, layout, pool.imap(_load_video, jobs, chunksize=4)),
+            total=len(videos), desc=f"PACKING {name}"
+        ):
+            shards[shard][start:start + len(arr)] = arr
+            entries.append({
+                "video_id": vid,
+                "label": label,
+                "method": _method_of(vid, label),
+                "shard": shard,
+                "start": start,
+                "count": len(arr),
+                "frames": [k[0] for k in keys],
+                "faces": [k[1] for k in keys],
+            })
+
+    for name, arr in zip(shard_names, shards):
+        arr.flush()
+        os.replace(os.path.join(out_dir, name + ".tmp"), os.path.join(out_dir, name))
+    index = {
+        "image_size": image_size,
+        "classes": CLASSES,
+        "shards": shard_names,
+        "num_crops": int(sum(counts)),
+        "videos": entries,
+    }
+    # The index is written last: a split without index.json is incomplete and gets repacked
+    with open(os.path.join(out_dir, INDEX_FILENAME + ".tmp"), "w") as f:
+        json.dump(index, f)
+    os.replace(os.path.join(out_dir, INDEX_FILENAME + ".tmp"), os.path.join(out_dir, INDEX_FILENAME))
+    return index
+
+
+def pack_dataset(data_root, packed_root, shard_size=8192, num_workers=None, force=False):
+    os.makedirs(packed_root, exist_ok=True)
+    for split in SPLITS:
+        videos = list_split_videos(data_root, split)
+        if not videos:
+            continue
+        out_dir = os.path.join(packed_root, split)
+        if not force and os.path.exists(os.path.join(out_dir, INDEX_FILENAME)):
+            print(f"{split.upper()} ALREADY PACKED, SKIPPING (USE --force TO REPACK).")
+            continue
+        t0 = time.perf_counter()
+        index = pack_split(videos, out_dir, shard_size, num_workers=num_workers, name=split)
+        wall = time.perf_counter() - t0
+        print(f"PACKED {split.upper()}: {len(index['videos'])} VIDEOS, {index['num_crops']} CROPS "
+              f"IN {len(index['shards'])} SHARDS ({index['num_crops'] / max(wall, 1e-9):.0f} CROPS/s)")
+
+
+def normalize_batch(x):
+    """uint8 [..., 3, H, W] -> float, normalized like val_transform (do it on the GPU after .to(device))."""
+    mean = torch.tensor(MEAN, device=x.device).view(3, 1, 1)
+    std = torch.tensor(STD, device=x.device).view(3, 1, 1)
+    return (x.float().div_(255.0) - mean) / std
+
+
+class PackedSequenceDataset(Dataset):
+    """
+    Sequences of `seq_len` consecutive crops per video from a packed split.
+
+    Each item is (frames, label) with frames [T, 3, 224, 224]. With
+    normalize=False frames is a uint8 view into the memory-mapped shard
+    (zero-copy; call normalize_batch after moving the batch to the device).
+    Videos are cut into windows every `stride` crops; videos shorter than
+    seq_len repeat their last crop.
+    """
+
+    def __init__(self, packed_root, split, seq_len=10, stride=None, normalize=True, labels=None):
+        self.dir = os.path.join(packed_root, split)
+        with open(os.path.join(self.dir, INDEX_FILENAME)) as f:
+            self.index = json.load(f)
+        self.seq_len = seq_len
+        self.stride = stride or seq_len
+        self.normalize = normalize
+        self.class_to_idx = {c: i for i, c in enumerate(self.index["classes"])}
+        self.videos = [v for v in self.index["videos"] if v["count"] and (labels is None or v["label"] in labels)]
+        self.samples = []
+        for vi, v in enumerate(self.videos):
+            last = max(0, v["count"] - seq_len)
+            for off in range(0, last + 1, self.stride):
+                self.samples.append((vi, off))
+        self._shards = None
+
+    def _shard(self, i):
+        # Opened lazily so every DataLoader worker maps the files itself
+        if self._shards is None:
+            self._shards = [None] * len(self.index["shards"])
+        if self._shards[i] is None:
+            # mmap_mode="c" maps copy-on-write, so torch gets a writable view without copying
+            self._shards[i] = np.load(os.path.join(self.dir, self.index["shards"][i]), mmap_mode="c")
+        return self._shards[i]
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, idx):
+        vi, off = self.samples[idx]
+        v = self.videos[vi]
+        shard = self._shard(v["shard"])
+        start = v["start"] + off
+        if v["count"] >= self.seq_len:
+            frames = shard[start:start + self.seq_len]
+        else:
+            pad = np.minimum(np.arange(self.seq_len), v["count"] - 1)
+            frames = shard[v["start"] + pad]
+        x = torch.from_numpy(frames).permute(0, 3, 1, 2)  # [T,H,W,3] -> [T,3,H,W]
+        if self.normalize:
+            x = normalize_batch(x)
+        return x, self.class_to_idx[v["label"]]
+
+    def sample_info(self, idx):
+        """Video id, method and frame numbers behind a sample (for per-method metrics)."""
+        vi, off = self.samples[idx]
+        v = self.videos[vi]
+        return {"video_id": v["video_id"], "label": v["label"], "method": v["method"],
+                "frames": v["frames"][off:off + self.seq_len]}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pack an organized dataset into memory-mappable shards")
+    parser.add_argument("--data_root", type=str, default="data/processed",
+                        help="Organized dataset (train/val/test/<label>/<video>/*.jpg)")
+    parser.add_argument("--packed_root", type=str, default="data/packed",
+                        help="Where to write the shards and indexes")
+    parser.add_argument("--shard_size", type=int, default=8192,
+                        help="Max crops per shard (8192 crops ~ 1.2 GB)")
+    parser.add_argument("--workers", type=int, default=None, help="Processes decoding JPEGs")
+    parser.add_argument("--force", action="store_true", help="Repack splits that already have an index")
+    args = parser.parse_args()
+
+    pack_dataset(os.path.expanduser(args.data_root), os.path.expanduser(args.packed_root),
+                 args.shard_size, args.workers, args.force)
+
+
+# python scripts/packed_dataset.py --data_root ~/DF-SCAN/data/processed_100 --packed_root ~/DF-SCAN/data/packed_100
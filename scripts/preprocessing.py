@@ -4,11 +4,20 @@ Steps:
 1. Extract frames from videos
 2. Detect and crop faces
 3. Organize dataset into train/val/test splits
+
+Progress is kept in a work manifest (manifest.db next to frames_root), so a
+rerun only extracts new or changed videos, detects faces on new frames and
+reorganizes the splits when the set of crops changed. Interrupted runs
+resume where they stopped.
+
+With --fused, steps 1 and 2 run as one per-video pass (extract_faces.py)
+that keeps frames in memory and writes only the face crops.
 """
 
 import os
 import subprocess
 import argparse
+from manifest import Manifest, params_hash, default_manifest_path
 
 def run_script(script_path, args_dict):
     """Run a Python script with arguments."""
@@ -33,34 +42,72 @@ def main():
     parser.add_argument("--skip_frames", action="store_true", help="SKIP FRAME EXTRACTION")
     parser.add_argument("--skip_faces", action="store_true", help="SKIP FACE DETECTION")
     parser.add_argument("--skip_split", action="store_true", help="SKIP DATASET ORGANIZATION")
+    parser.add_argument("--split_mode", type=str, choices=["copy", "hardlink", "symlink", "manifest"], default="copy",
+                        help="HOW organize_dataset.py MATERIALIZES THE SPLITS")
+    parser.add_argument("--fused", action="store_true", help="DECODE, DETECT AND CROP IN ONE PASS WITHOUT WRITING FRAMES")
+    parser.add_argument("--manifest", type=str, default=None, help="WORK MANIFEST (DEFAULT: manifest.db NEXT TO FRAMES_ROOT)")
+    parser.add_argument("--force", action="store_true", help="IGNORE THE MANIFEST AND REDO EVERY STAGE")
 
     args = parser.parse_args()
+    manifest_path = args.manifest or default_manifest_path(args.frames_root)
+    resume = {"manifest": manifest_path}
+    if args.force:
+        resume["force"] = None
+
+    # PIPELINE 1+2 FUSED: FACES STRAIGHT FROM VIDEOS
+    if args.fused:
+        if not args.skip_faces:
+            run_script("scripts/extract_faces.py", {
+                "input_dir": args.raw_root,
+                "faces_root": args.faces_root,
+                "workers": args.workers,
+                **resume
+            })
+        else:
+            print("SKIPPING FACE EXTRACTION.")
 
     # PIPELINE 1: FRAME EXTRACTION
-    if not args.skip_frames:
+    elif not args.skip_frames:
         run_script("scripts/extract_frames.py", {
-            "input_root": args.raw_root,
-            "output_root": args.frames_root
+            "input_dir": args.raw_root,
+            "output_dir": args.frames_root,
+            "workers": args.workers,
+            **resume
         })
     else:
         print("SKIPPING FRAME EXTRACTION.")
 
-    # PIPELINE 2: FACE DETECTION
-    if not args.skip_faces:
-        run_script("scripts/detect_faces.py", {
-            "frames_root": args.frames_root,
-            "faces_root": args.faces_root,
-            "workers": args.workers
-        })
-    else:
-        print("SKIPPING FACE DETECTION.")
+    # PIPELINE 2: FACE DETECTION (ALREADY DONE BY THE FUSED PASS)
+    if not args.fused:
+        if not args.skip_faces:
+            run_script("scripts/detect_faces.py", {
+                "frames_root": args.frames_root,
+                "faces_root": args.faces_root,
+                "workers": args.workers,
+                **resume
+            })
+        else:
+            print("SKIPPING FACE DETECTION.")
 
     # PIPELINE 3: DATASET ORGANIZATION
     if not args.skip_split:
-        run_script("scripts/organize_dataset.py", {
-            "faces_root": args.faces_root,
-            "output_root": args.output_root
-        })
+        # The splits are derived from all crops at once, so redo them only when the crops changed
+        manifest = Manifest(manifest_path)
+        phash = params_hash(faces_root=os.path.abspath(args.faces_root), output_root=os.path.abspath(args.output_root),
+                            mode=args.split_mode)
+        crops_sig = manifest.fingerprint("fused" if args.fused else "faces")
+        if args.force or manifest.pending("split", {"dataset": crops_sig}, phash):
+            # organize_dataset.py keeps its assignment in splits.json and only adds new videos
+            run_script("scripts/organize_dataset.py", {
+                "faces_root": args.faces_root,
+                "output_root": args.output_root,
+                "mode": args.split_mode,
+                **({"force": None} if args.force else {})
+            })
+            manifest.mark("split", "dataset", "done", crops_sig, phash, outputs=[args.output_root])
+        else:
+            print("DATASET SPLITS UP TO DATE.")
+        manifest.close()
     else:
         print("SKIPPING DATASET ORGANIZATION.")
 
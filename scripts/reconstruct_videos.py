@@ -1,43 +1,130 @@
 import os
 import cv2
+import time
+import shutil
 import argparse
+import subprocess
+from multiprocessing import Pool, cpu_count
 from tqdm import tqdm
 
-def reconstruct_video_from_frames(frames_dir, output_path, fps=25):
+CODECS = ["libx264", "libx265", "libvpx-vp9", "mpeg4", "mp4v"]
+PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"]
+
+
+def _ffmpeg_command(output_path, width, height, fps, codec, crf, preset):
+    cmd = [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+        "-c:v", codec, "-pix_fmt", "yuv420p",
+    ]
+    if codec in ("libx264", "libx265"):
+        cmd += ["-crf", str(crf), "-preset", preset]
+    elif codec == "libvpx-vp9":
+        cmd += ["-crf", str(crf), "-b:v", "0"]
+    else:
+        # mpeg4 has no CRF; map 0-51 onto its 1-31 quantizer scale
+        cmd += ["-q:v", str(max(1, min(31, round(crf * 31 / 51))))]
+    return cmd + ["-f", "mp4", output_path]
+
+
+def reconstruct_video_from_frames(frames_dir, output_path, fps=25, codec="libx264", crf=23, preset="medium"):
+    """
+    Encode the frames of one folder into a video, streaming raw frames into ffmpeg
+    (or cv2.VideoWriter for codec="mp4v"). Frames whose size differs from the
+    first one are resized to it. Returns the number of frames written.
+    """
     frame_files = sorted([
         f for f in os.listdir(frames_dir)
         if f.endswith(('.jpg', '.png'))
     ])
-    
+
     if not frame_files:
         print(f"[WARN] No frames found in {frames_dir}, skipping.")
-        return
+        return 0
 
     first_frame_path = os.path.join(frames_dir, frame_files[0])
     frame = cv2.imread(first_frame_path)
+    if frame is None:
+        raise IOError(f"cannot read {first_frame_path}")
     height, width, _ = frame.shape
+    # yuv420p needs even dimensions
+    width, height = width - width % 2 or 2, height - height % 2 or 2
 
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    video_writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+    # Encode to a temp file so an interrupted run never leaves a truncated video that looks up to date
+    tmp_path = os.path.splitext(output_path)[0] + ".part.mp4"
+    if codec == "mp4v":
+        writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+        proc = None
+    else:
+        proc = subprocess.Popen(_ffmpeg_command(tmp_path, width, height, fps, codec, crf, preset),
+                                stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+    written = 0
+    try:
+        try:
+            for frame_file in frame_files:
+                frame = cv2.imread(os.path.join(frames_dir, frame_file))
+                if frame is None:
+                    continue
+                if frame.shape[:2] != (height, width):
+                    frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+                if proc is None:
+                    writer.write(frame)
+                else:
+                    proc.stdin.write(frame.tobytes())
+                written += 1
+        finally:
+            if proc is None:
+                writer.release()
+            else:
+                # ffmpeg may already have exited (bad codec, full disk); its stderr says why
+                try:
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+                err = proc.stderr.read().decode(errors="replace").strip()
+                if proc.wait() != 0:
+                    raise RuntimeError(f"ffmpeg failed: {err}")
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
 
-    for frame_file in frame_files:
-        frame_path = os.path.join(frames_dir, frame_file)
-        frame = cv2.imread(frame_path)
-        if frame is not None:
-            video_writer.write(frame)
 
-    video_writer.release()
+def is_up_to_date(frames_dir, output_path):
+    """The output is newer than every frame and than the folder itself (which changes when frames are added/removed)."""
+    if not os.path.exists(output_path):
+        return False
+    out_mtime = os.path.getmtime(output_path)
+    if os.path.getmtime(frames_dir) > out_mtime:
+        return False
+    with os.scandir(frames_dir) as it:
+        return all(e.stat().st_mtime <= out_mtime for e in it if e.name.endswith(('.jpg', '.png')))
 
 
-def main(faces_root, output_root, fps=25):
+def process_video(args):
+    frames_dir, output_path, fps, codec, crf, preset = args
+    t0 = time.perf_counter()
+    try:
+        frames = reconstruct_video_from_frames(frames_dir, output_path, fps, codec, crf, preset)
+        return frames_dir, frames, time.perf_counter() - t0, None
+    except Exception as e:
+        return frames_dir, 0, time.perf_counter() - t0, f"{type(e).__name__}: {e}"
+
+
+def main(faces_root, output_root, fps=25, codec="libx264", crf=23, preset="medium", workers=None, force=False):
     os.makedirs(output_root, exist_ok=True)
+    if codec != "mp4v" and shutil.which("ffmpeg") is None:
+        raise SystemExit("ffmpeg not found on PATH (install it or use --codec mp4v)")
 
-    for method in os.listdir(faces_root):
+    jobs, skipped = [], 0
+    for method in sorted(os.listdir(faces_root)):
         method_path = os.path.join(faces_root, method)
         if not os.path.isdir(method_path):
             continue
 
-        for video_dir in tqdm(os.listdir(method_path), desc=f"Reconstructing {method}"):
+        for video_dir in sorted(os.listdir(method_path)):
             video_path = os.path.join(method_path, video_dir)
             if not os.path.isdir(video_path):
                 continue
@@ -45,8 +132,30 @@ def main(faces_root, output_root, fps=25):
             output_subdir = os.path.join(output_root, method)
             os.makedirs(output_subdir, exist_ok=True)
             output_path = os.path.join(output_subdir, f"{video_dir}.mp4")
+            if not force and is_up_to_date(video_path, output_path):
+                skipped += 1
+                continue
+            jobs.append((video_path, output_path, fps, codec, crf, preset))
+
+    print(f"{len(jobs) + skipped} VIDEOS; {skipped} UP TO DATE; {len(jobs)} TO ENCODE")
+    if not jobs:
+        return
+
+    # ffmpeg encoders are multithreaded themselves, so a few processes saturate the CPU
+    workers = workers or max(1, cpu_count() // 4)
+    print(f"USING {workers} WORKERS ({codec}, CRF {crf}, PRESET {preset})\n")
 
-            reconstruct_video_from_frames(video_path, output_path, fps=fps)
+    t0 = time.perf_counter()
+    frames = errors = 0
+    with Pool(workers) as pool:
+        for frames_dir, n, _, error in tqdm(pool.imap_unordered(process_video, jobs), total=len(jobs), desc="Reconstructing"):
+            frames += n
+            if error:
+                errors += 1
+                print(f"[ERROR] {frames_dir}: {error}")
+    wall = time.perf_counter() - t0
+    print(f"\nENCODED {len(jobs) - errors} VIDEOS ({frames} FRAMES) IN {wall:.1f}s: "
+          f"{(len(jobs) - errors) / wall:.2f} VIDEOS/s, {frames / wall:.0f} FRAMES/s; {errors} ERRORS")
 
 
 if __name__ == "__main__":
@@ -54,6 +163,12 @@ if __name__ == "__main__":
     parser.add_argument("--faces_root", type=str, required=True, help="Path to cropped face frames directory")
     parser.add_argument("--output_root", type=str, required=True, help="Path to save reconstructed videos")
     parser.add_argument("--fps", type=int, default=25, help="Frame rate for reconstructed video")
+    parser.add_argument("--codec", type=str, choices=CODECS, default="libx264",
+                        help="ffmpeg encoder, or mp4v for the old cv2.VideoWriter path")
+    parser.add_argument("--crf", type=int, default=23, help="Quality (lower is better; x264/x265/vp9)")
+    parser.add_argument("--preset", type=str, choices=PRESETS, default="medium", help="x264/x265 speed preset")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel encodes (default: cores / 4)")
+    parser.add_argument("--force", action="store_true", help="Re-encode videos that are up to date")
 
     args = parser.parse_args()
-    main(args.faces_root, args.output_root, args.fps)
+    main(args.faces_root, args.output_root, args.fps, args.codec, args.crf, args.preset, args.workers, args.force)
@@ -0,0 +1,187 @@
+"""
+sequence_loader.py — Clip DataLoader for training and evaluating VideoResNetLSTM
+
+Reads the organized dataset (split/label/video/*.jpg, or a manifest-mode
+splits.json) or packed shards (packed_dataset.py) and yields batches of
+time-ordered clips [B, T, 3, 224, 224] with labels.
+
+Workers only decode JPEGs into uint8 (cv2, no PIL/ToTensor float work on
+the CPU); batches are pinned, copied to the device asynchronously and
+normalized there by ClipNormalizer, which reuses its mean/std and output
+buffers across batches.
+"""
+
+import os
+import time
+
+import cv2
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+from packed_dataset import (CLASSES, IMAGE_SIZE, MEAN, STD, PackedSequenceDataset,
+                            list_split_videos, _crop_key, _method_of)
+
+
+def clip_offsets(count, seq_len, stride=None, sampling="windows"):
+    """
+    Start offsets (windows) or index lists (uniform) of the clips taken from a video with `count` crops.
+    windows: consecutive crops every `stride`; uniform: one clip of seq_len evenly spaced crops.
+    """
+    if sampling == "uniform":
+        return [np.linspace(0, count - 1, seq_len).round().astype(int).tolist()]
+    stride = stride or seq_len
+    return [list(range(off, off + seq_len)) for off in range(0, max(0, count - seq_len) + 1, stride)]
+
+
+class FolderSequenceDataset(Dataset):
+    """
+    Clips of `seq_len` time-ordered crops per video, decoded from JPEG.
+
+    Items are (uint8 [T, 3, 224, 224], label). Videos with fewer than
+    seq_len crops repeat their last crop.
+    """
+
+    def __init__(self, data_root, split, seq_len=10, stride=None, sampling="windows", labels=None):
+        self.seq_len = seq_len
+        self.class_to_idx = {c: i for i, c in enumerate(CLASSES)}
+        self.videos = []
+        for label, vid, folder in list_split_videos(data_root, split):
+            if labels is not None and label not in labels:
+                continue
+            frames = sorted((f for f in os.listdir(folder) if f.lower().endswith(".jpg")), key=_crop_key)
+            if frames:
+                self.videos.append({"video_id": vid, "label": label, "method": _method_of(vid, label),
+                                    "folder": folder, "frames": frames})
+        self.samples = []
+        for vi, v in enumerate(self.videos):
+            for idx in clip_offsets(len(v["frames"]), seq_len, stride, sampling):
+                self.samples.append((vi, [min(i, len(v["frames"]) - 1) for i in idx]))
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, idx):
+        vi, frame_idx = self.samples[idx]
+        v = self.videos[vi]
+        clip = np.empty((self.seq_len, IMAGE_SIZE, IMAGE_SIZE, 3), dtype=np.uint8)
+        for t, i in enumerate(frame_idx):
+            img = cv2.imread(os.path.join(v["folder"], v["frames"][i]))
+            if img is None:
+                raise IOError(f"cannot read {os.path.join(v['folder'], v['frames'][i])}")
+            if img.shape[:2] != (IMAGE_SIZE, IMAGE_SIZE):
+                img = cv2.resize(img, (IMAGE_SIZE, IMAGE_SIZE), interpolation=cv2.INTER_LINEAR)
+            cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=clip[t])
+        return torch.from_numpy(clip).permute(0, 3, 1, 2), self.class_to_idx[v["label"]]
+
+    def sample_info(self, idx):
+        vi, frame_idx = self.samples[idx]
+        v = self.videos[vi]
+        return {"video_id": v["video_id"], "label": v["label"], "method": v["method"],
+                "frames": [_crop_key(v["frames"][i])[0] for i in frame_idx]}
+
+
+class ClipNormalizer:
+    """
+    uint8 [B, T, 3, H, W] -> float normalized like val_transform, on the device.
+    Mean/std and the float output buffer are allocated once and reused; with
+    `flip` each clip is mirrored horizontally with probability 0.5 (train aug).
+    The returned tensor is overwritten by the next call.
+    """
+
+    def __init__(self, device, flip=False):
+        self.device = torch.device(device)
+        self.flip = flip
+        self.scale = (1.0 / (255.0 * torch.tensor(STD, device=self.device))).view(1, 1, 3, 1, 1)
+        self.shift = (-torch.tensor(MEAN, device=self.device) / torch.tensor(STD, device=self.device)).view(1, 1, 3, 1, 1)
+        self._out = None
+
+    def __call__(self, clips):
+        clips = clips.to(self.device, non_blocking=True)
+        if self._out is None or self._out.shape != clips.shape:
+            self._out = torch.empty(clips.shape, dtype=torch.float32, device=self.device)
+        out = self._out
+        out.copy_(clips)
+        out.mul_(self.scale).add_(self.shift)
+        if self.flip:
+            mask = torch.rand(out.shape[0], device=self.device) < 0.5
+            if mask.any():
+                out[mask] = out[mask].flip(-1)
+        return out
+
+
+def make_dataset(root, split, seq_len=10, stride=None, sampling="windows", packed=None, labels=None):
+    """Packed shards if `root/split/index.json` exists (or packed=True), otherwise JPEG folders."""
+    if packed is None:
+        packed = os.path.exists(os.path.join(root, split, "index.json"))
+    if packed:
+        if sampling != "windows":
+            raise ValueError("packed shards only support windows sampling")
+        return PackedSequenceDataset(root, split, seq_len, stride, normalize=False, labels=labels)
+    return FolderSequenceDataset(root, split, seq_len, stride, sampling, labels)
+
+
+def make_loader(root, split, seq_len=10, batch_size=8, workers=None, shuffle=None, stride=None,
+                sampling="windows", packed=None, pin_memory=None, prefetch_factor=4):
+    dataset = make_dataset(root, split, seq_len, stride, sampling, packed)
+    workers = max(1, (os.cpu_count() or 2) - 2) if workers is None else workers
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=(split == "train") if shuffle is None else shuffle,
+        num_workers=workers,
+        pin_memory=torch.cuda.is_available() if pin_memory is None else pin_memory,
+        persistent_workers=workers > 0,
+        prefetch_factor=prefetch_factor if workers > 0 else None,
+        drop_last=False,
+    )
+
+
+def measure_throughput(loader, device="cpu", max_batches=None, warmup=2, normalizer=None):
+    """Iterate the loader (decode + transfer + normalize) and return samples/sec after warmup batches."""
+    normalizer = normalizer or ClipNormalizer(device)
+    samples, t0, x = 0, None, None
+    for i, (clips, _) in enumerate(loader):
+        x = normalizer(clips)
+        if i + 1 == warmup:
+            if x.is_cuda:
+                torch.cuda.synchronize()
+            t0 = time.perf_counter()
+        elif i >= warmup:
+            samples += x.shape[0]
+        if max_batches and i + 1 >= max_batches:
+            break
+    if x is not None and x.is_cuda:
+        torch.cuda.synchronize()
+    if t0 is None or not samples:
+        return 0.0
+    return samples / (time.perf_counter() - t0)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure clip loading throughput")
+    parser.add_argument("--root", type=str, default="data/processed",
+                        help="Organized dataset (or packed root with index.json per split)")
+    parser.add_argument("--split", type=str, default="train")
+    parser.add_argument("--seq_len", type=int, default=10)
+    parser.add_argument("--stride", type=int, default=None)
+    parser.add_argument("--sampling", type=str, choices=["windows", "uniform"], default="windows")
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batches", type=int, default=50, help="Batches to time")
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    loader = make_loader(os.path.expanduser(args.root), args.split, args.seq_len, args.batch_size, args.workers,
+                         stride=args.stride, sampling=args.sampling)
+    kind = type(loader.dataset).__name__
+    print(f"{kind}: {len(loader.dataset)} CLIPS OF {args.seq_len} FROM {len(loader.dataset.videos)} VIDEOS, "
+          f"{loader.num_workers} WORKERS, PIN_MEMORY={loader.pin_memory}")
+    rate = measure_throughput(loader, args.device, args.batches)
+    print(f"{rate:.1f} SAMPLES/s ({rate * args.seq_len:.0f} FRAMES/s)")
+
+
+# python scripts/sequence_loader.py --root ~/DF-SCAN/data/processed_100 --split val --seq_len 10 --workers 6
+# python scripts/sequence_loader.py --root ~/DF-SCAN/data/packed_100 --split train --batch_size 16
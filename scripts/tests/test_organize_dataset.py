@@ -0,0 +1,112 @@
+import contextlib
+import importlib.util
+import io
+import os
+import random
+import tempfile
+import unittest
+
+
+@unittest.skipUnless(importlib.util.find_spec("tqdm"), "needs tqdm")
+class OrganizeDatasetTest(unittest.TestCase):
+    """Run from scripts/: python -m unittest discover tests"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.faces = os.path.join(self.tmp.name, "faces")
+        self.out = os.path.join(self.tmp.name, "processed")
+        for cls in ("real", "fake"):
+            for i in range(10):
+                self._add_video(cls, f"{cls}_{i:02d}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _add_video(self, cls, vid, crops=2):
+        d = os.path.join(self.faces, cls, vid)
+        os.makedirs(d, exist_ok=True)
+        for n in range(crops):
+            with open(os.path.join(d, f"frame_{n:04d}_face_0.jpg"), "wb") as f:
+                f.write(vid.encode())
+
+    def _split(self, **kwargs):
+        from organize_dataset import _load_splits, split_dataset_by_video
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            split_dataset_by_video(self.faces, self.out, **kwargs)
+        return _load_splits(self.out)
+
+    def test_new_videos_keep_the_ratios(self):
+        from organize_dataset import assign_new_videos
+
+        counts = {"train": 70, "val": 15, "test": 15}
+        ratios = {"train": 0.7, "val": 0.15, "test": 0.15}
+        placed = assign_new_videos([f"v{i}" for i in range(20)], counts, ratios, random.Random(0))
+        self.assertEqual({s: counts[s] + len(v) for s, v in placed.items()}, {"train": 84, "val": 18, "test": 18})
+
+    def test_rerun_only_adds_new_videos(self):
+        first = self._split(mode="copy")
+        self._add_video("real", "real_new")
+        second = self._split(mode="copy")
+        for split, by_cls in first["splits"].items():
+            self.assertEqual(second["splits"][split]["real"][:len(by_cls["real"])], by_cls["real"])
+        placed = [s for s in second["splits"] if "real_new" in second["splits"][s]["real"]]
+        self.assertEqual(len(placed), 1)
+        self.assertTrue(os.path.isdir(os.path.join(self.out, placed[0], "real", "real_new")))
+
+    def test_changed_files_are_recopied(self):
+        splits = self._split(mode="copy")
+        split = next(s for s in splits["splits"] if "real_00" in splits["splits"][s]["real"])
+        src = os.path.join(self.faces, "real", "real_00", "frame_0000_face_0.jpg")
+        dst = os.path.join(self.out, split, "real", "real_00", "frame_0000_face_0.jpg")
+        with open(src, "wb") as f:
+            f.write(b"re-extracted crop")
+        self._split(mode="copy")
+        with open(dst, "rb") as f:
+            self.assertEqual(f.read(), b"re-extracted crop")
+
+    def test_replaced_files_are_relinked(self):
+        splits = self._split(mode="hardlink")
+        split = next(s for s in splits["splits"] if "fake_03" in splits["splits"][s]["fake"])
+        src = os.path.join(self.faces, "fake", "fake_03", "frame_0001_face_0.jpg")
+        dst = os.path.join(self.out, split, "fake", "fake_03", "frame_0001_face_0.jpg")
+        self.assertTrue(os.path.samefile(src, dst))
+        # Re-extraction writes a new file, which breaks the link
+        with open(src + ".tmp", "wb") as f:
+            f.write(b"new crop, other size")
+        os.replace(src + ".tmp", src)
+        self.assertFalse(os.path.samefile(src, dst))
+        self._split(mode="hardlink")
+        self.assertTrue(os.path.samefile(src, dst))
+
+    def test_undo_moves_folders_back(self):
+        from organize_dataset import _load_splits, _undo
+
+        self._split(mode="move")
+        self.assertEqual(os.listdir(os.path.join(self.faces, "real")), [])
+        _undo(self.faces, self.out, _load_splits(self.out))
+        self.assertEqual(len(os.listdir(os.path.join(self.faces, "real"))), 10)
+        for split in ("train", "val", "test"):
+            self.assertEqual(os.listdir(os.path.join(self.out, split, "real")), [])
+
+    def test_undo_symlinks_keeps_sources(self):
+        from organize_dataset import _load_splits, _undo
+
+        self._split(mode="symlink")
+        _undo(self.faces, self.out, _load_splits(self.out))
+        self.assertEqual(len(os.listdir(os.path.join(self.faces, "fake", "fake_00"))), 2)
+        for split in ("train", "val", "test"):
+            self.assertEqual(os.listdir(os.path.join(self.out, split, "fake")), [])
+
+    def test_changed_parameters_need_force(self):
+        self._split(mode="copy")
+        with self.assertRaises(SystemExit):
+            self._split(mode="copy", seed=7)
+        splits = self._split(mode="copy", seed=7, force=True)
+        self.assertEqual(splits["params"]["seed"], 7)
+        on_disk = sum(len(os.listdir(os.path.join(self.out, s, "real"))) for s in ("train", "val", "test"))
+        self.assertEqual(on_disk, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()